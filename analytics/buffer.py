@@ -0,0 +1,195 @@
+"""
+Write-behind buffer for ``SiteVisit`` rows.
+
+``AnalyticsMiddleware`` used to check the table and ``INSERT`` a visit on
+every request, which doubled the database work of each page and, on SQLite,
+serialized all requests on the write lock. Instead, the middleware puts the
+visit's fields on a bounded queue kept by each worker process, and a
+background thread writes them with ``bulk_create`` as soon as
+``ANALYTICS_FLUSH_SIZE`` visits are waiting or ``ANALYTICS_FLUSH_INTERVAL``
+milliseconds have passed. Pending visits are also written when the process
+exits, but only to the database they were recorded against: visits from a
+test run are dropped once the test runner destroyed its database.
+``ANALYTICS_BUFFER_AUTOFLUSH = False`` (the default under ``manage.py test``)
+starts no background thread, so tests write visits with ``flush_visits``
+inside their own transaction.
+
+When the queue already holds ``ANALYTICS_BUFFER_SIZE`` visits (the database
+cannot keep up), new visits are dropped and counted rather than slowing
+requests down. A batch that cannot be written is logged and dropped too.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from core.counters import database_name
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement when flushing
+INSERT_BATCH_SIZE = 500
+
+
+def max_size():
+    return getattr(settings, 'ANALYTICS_BUFFER_SIZE', 10000)
+
+
+def flush_size():
+    return getattr(settings, 'ANALYTICS_FLUSH_SIZE', 500)
+
+
+def flush_interval():
+    """Seconds between flushes of a partly filled buffer."""
+    return getattr(settings, 'ANALYTICS_FLUSH_INTERVAL', 1000) / 1000
+
+
+def autoflush_enabled():
+    return getattr(settings, 'ANALYTICS_BUFFER_AUTOFLUSH', True)
+
+
+def _site_visit_database():
+    from .models import SiteVisit
+    return database_name(SiteVisit)
+
+
+class VisitBuffer:
+    """
+    In-process queue of pending ``(database name, SiteVisit field dict)`` pairs.
+
+    ``add`` only touches memory and never blocks for longer than a lock.
+    ``flush`` swaps the pending visits out under the lock and writes them
+    outside it. With ``autoflush=False`` no background thread is started and
+    the caller is responsible for calling ``flush``.
+    """
+
+    def __init__(self, autoflush=True):
+        self.autoflush = autoflush
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flusher = None
+        self._flusher_pid = None
+        self._stopped = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def add(self, **fields):
+        """Queue one visit. Returns False if the buffer is full and the visit was dropped."""
+        database = _site_visit_database()
+        with self._lock:
+            if len(self._pending) >= max_size():
+                self.dropped += 1
+                return False
+            self._pending.append((database, fields))
+            if len(self._pending) >= flush_size():
+                self._wakeup.notify()
+        if self.autoflush and autoflush_enabled():
+            self._ensure_flusher()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+    def flush(self):
+        """Write all pending visits. Returns the number of rows inserted."""
+        from core.schema import tables_ready
+        from .models import SiteVisit
+
+        with self._lock:
+            queued, self._pending = self._pending, []
+        database = database_name(SiteVisit)
+        pending = [fields for name, fields in queued if name == database]
+        if len(pending) < len(queued):
+            logger.debug(f"Dropping {len(queued) - len(pending)} site visits recorded against another database")
+        if not pending:
+            return 0
+        # Before migrations have run there is nowhere to write them
+        if not tables_ready(SiteVisit):
+            with self._lock:
+                self.dropped += len(pending)
+            return 0
+        try:
+            SiteVisit.objects.bulk_create(
+                [SiteVisit(**fields) for fields in pending], batch_size=INSERT_BATCH_SIZE
+            )
+        except Exception as e:
+            logger.error(f"Error writing {len(pending)} site visits: {e}")
+            with self._lock:
+                self.failed += len(pending)
+            return 0
+        with self._lock:
+            self.written += len(pending)
+        return len(pending)
+
+    def _ensure_flusher(self):
+        # Threads don't survive fork(), so each worker starts its own
+        pid = os.getpid()
+        if self._flusher_pid == pid and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher_pid == pid and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(
+                target=self._run, name='visit-flusher', daemon=True
+            )
+            self._flusher_pid = pid
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._wakeup:
+                self._wakeup.wait_for(
+                    lambda: len(self._pending) >= flush_size() or self._stopped.is_set(),
+                    timeout=flush_interval(),
+                )
+            if self._stopped.is_set():
+                return
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error in site visit flusher: {e}")
+            finally:
+                # The thread's connection would otherwise stay open forever
+                connections.close_all()
+
+    def stop(self):
+        """Stop the background thread and write what is left."""
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify()
+        if self._flusher is not None and self._flusher_pid == os.getpid():
+            self._flusher.join(timeout=5)
+        self.flush()
+
+
+visit_buffer = VisitBuffer()
+
+
+def record_visit(**fields):
+    """Queue a ``SiteVisit`` with these field values."""
+    return visit_buffer.add(**fields)
+
+
+def flush_visits():
+    """Write the pending visits of this process immediately."""
+    return visit_buffer.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        visit_buffer.stop()
+    except Exception as e:
+        logger.error(f"Error flushing site visits at exit: {e}")
@@ -0,0 +1,244 @@
+"""
+Streaming analytics exports.
+
+Each report is a header plus a generator of rows, so an export never holds
+more than one chunk of rows in memory however long its period is:
+
+* large row-level reports (visits, reviews) are read in keyset-paginated
+  chunks of ``ANALYTICS_EXPORT_CHUNK_SIZE`` rows; every chunk is its own
+  short query, so SQLite's read lock is not held while a slow client
+  downloads the file,
+* per-tour and per-user reports are read from the rollup tables (see
+  analytics.rollups) with ``iterator(chunk_size=...)``.
+
+``csv_stream`` turns the rows into CSV text for a ``StreamingHttpResponse``.
+``xlsx_file`` writes them with openpyxl's write-only mode, which spools the
+sheet to disk instead of building it in memory, and returns a temporary
+file to send with ``FileResponse``.
+"""
+import csv
+import logging
+import tempfile
+from collections import namedtuple
+
+import openpyxl
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from django.conf import settings
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from reviews.models import Review
+from tour.models import Tour
+from .models import (
+    BookingRollup, CustomerRollup, RevenueRollup, ReviewRollup, SiteVisit, TourViewRollup,
+    UserRollup, VisitRollup,
+)
+from .rollups import date_range_q
+
+logger = logging.getLogger(__name__)
+
+# Rows an Excel worksheet can hold; longer exports continue on a new sheet
+XLSX_MAX_ROWS = 1048576
+
+# Characters of CSV collected before they are sent as one chunk
+CSV_CHUNK_CHARS = 64 * 1024
+
+
+def chunk_size():
+    return getattr(settings, 'ANALYTICS_EXPORT_CHUNK_SIZE', 2000)
+
+
+def chunked(queryset, descending=False):
+    """
+    Rows of ``queryset``, a ``values_list`` starting with the primary key,
+    in key order and read one chunk per query (keyset pagination), so
+    neither the rows nor an open cursor pile up.
+    """
+    size = chunk_size()
+    queryset = queryset.order_by('-pk' if descending else 'pk')
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(pk__lt=last) if descending else page.filter(pk__gt=last)
+        rows = list(page[:size])
+        yield from rows
+        if len(rows) < size:
+            return
+        last = rows[-1][0]
+
+
+def _day(value):
+    return value.strftime('%Y-%m-%d')
+
+
+def _tour_total(model, expression, start_date, end_date):
+    """Subquery of one rollup total per tour, so several totals don't multiply each other's joins."""
+    totals = model.objects.filter(
+        tour=OuterRef('pk'), date__range=[start_date, end_date]
+    ).values('tour').annotate(total=Sum(expression)).values('total')
+    return Subquery(totals)
+
+
+def revenue_rows(start_date, end_date):
+    daily = RevenueRollup.objects.filter(
+        date__range=[start_date, end_date]
+    ).values('date').annotate(
+        total=Sum('amount'), booking_count=Sum('payments')
+    ).order_by('date')
+    for item in daily.iterator(chunk_size=chunk_size()):
+        avg_value = item['total'] / item['booking_count'] if item['booking_count'] else 0
+        yield [_day(item['date']), float(item['total']), item['booking_count'], float(avg_value)]
+
+
+def tour_rows(start_date, end_date):
+    tours = Tour.objects.annotate(
+        booking_count=Coalesce(_tour_total(BookingRollup, 'bookings', start_date, end_date), 0),
+        revenue=_tour_total(RevenueRollup, 'amount', start_date, end_date),
+        analytics_view_count=Coalesce(_tour_total(TourViewRollup, 'views', start_date, end_date), 0),
+        stars=_tour_total(ReviewRollup, F('rating') * F('reviews'), start_date, end_date),
+        review_count=_tour_total(ReviewRollup, 'reviews', start_date, end_date),
+    ).order_by('-booking_count').values_list(
+        'name', 'booking_count', 'revenue', 'analytics_view_count', 'stars', 'review_count'
+    )
+    for name, booking_count, revenue, views, stars, review_count in tours.iterator(chunk_size=chunk_size()):
+        avg_rating = stars / review_count if review_count else 0
+        yield [str(name), booking_count, float(revenue or 0), views, float(avg_rating)]
+
+
+def user_rows(start_date, end_date):
+    users = CustomerRollup.objects.filter(
+        date__range=[start_date, end_date]
+    ).values('user').annotate(
+        booking_count=Sum('bookings'), total_spent=Sum('spent'), review_count=Sum('reviews')
+    ).filter(
+        Q(booking_count__gt=0) | Q(review_count__gt=0)
+    ).order_by('-booking_count').values_list(
+        'user__username', 'user__email', 'user__date_joined', 'booking_count', 'total_spent', 'review_count'
+    )
+    for username, email, date_joined, booking_count, total_spent, review_count in users.iterator(
+        chunk_size=chunk_size()
+    ):
+        yield [str(username), str(email), _day(date_joined), booking_count, float(total_spent or 0), review_count]
+
+
+def review_rows(start_date, end_date):
+    reviews = Review.objects.filter(
+        date_range_q('created_at', start_date, end_date)
+    ).values_list('pk', 'tour__name', 'user__username', 'rating', 'created_at', 'comment')
+    # Newest first, like the reviews page (IDs grow with created_at)
+    for _pk, tour_name, username, rating, created_at, comment in chunked(reviews, descending=True):
+        yield [str(tour_name), str(username), rating, _day(created_at), str(comment)]
+
+
+def visit_rows(start_date, end_date):
+    visits = SiteVisit.objects.filter(
+        date_range_q('timestamp', start_date, end_date)
+    ).values_list('pk', 'timestamp', 'path', 'country', 'city', 'referer')
+    tz = timezone.get_current_timezone()
+    for _pk, timestamp, path, country, city, referer in chunked(visits):
+        yield [timestamp.astimezone(tz).strftime('%Y-%m-%d %H:%M:%S'), path, country or '', city or '', referer or '']
+
+
+def dashboard_rows(start_date, end_date):
+    period_range = [start_date, end_date]
+    bookings = BookingRollup.objects.filter(date__range=period_range)
+    reviews = ReviewRollup.objects.filter(date__range=period_range).aggregate(
+        stars=Sum(F('rating') * F('reviews')), count=Sum('reviews')
+    )
+    period = f"{_day(start_date)} to {_day(end_date)}"
+    yield ['Total Revenue', float(RevenueRollup.objects.filter(
+        date__range=period_range
+    ).aggregate(total=Sum('amount'))['total'] or 0), period]
+    yield ['Total Bookings', bookings.aggregate(total=Sum('bookings'))['total'] or 0, period]
+    yield ['Confirmed Bookings', bookings.filter(
+        status='confirmed'
+    ).aggregate(total=Sum('bookings'))['total'] or 0, period]
+    yield ['New Users', UserRollup.objects.filter(
+        date__range=period_range
+    ).aggregate(total=Sum('new_users'))['total'] or 0, period]
+    yield ['Site Visits', VisitRollup.objects.filter(
+        date_range_q('hour', start_date, end_date)
+    ).aggregate(total=Sum('visits'))['total'] or 0, period]
+    yield ['Review Count', reviews['count'] or 0, period]
+    yield ['Average Rating', float(reviews['stars'] / reviews['count'] if reviews['count'] else 0), period]
+
+
+Report = namedtuple('Report', ['title', 'header', 'rows'])
+
+REPORTS = {
+    'revenue': Report('Revenue', ['Date', 'Total Revenue', 'Number of Bookings', 'Average Booking Value'],
+                      revenue_rows),
+    'tours': Report('Tours', ['Tour Name', 'Bookings', 'Revenue', 'Views', 'Average Rating'], tour_rows),
+    'users': Report('Users', ['Username', 'Email', 'Date Joined', 'Bookings', 'Total Spent', 'Reviews'],
+                    user_rows),
+    'reviews': Report('Reviews', ['Tour', 'User', 'Rating', 'Date', 'Comment'], review_rows),
+    'visits': Report('Visits', ['Time', 'Path', 'Country', 'City', 'Referer'], visit_rows),
+    'dashboard': Report('Summary', ['Metric', 'Value', 'Period'], dashboard_rows),
+}
+
+
+def _guarded(report_type, rows):
+    """
+    Rows of a report, ending with an error row if reading fails part way;
+    the response status has been sent by then, so that is all we can do.
+    """
+    try:
+        yield from rows
+    except Exception as e:
+        logger.error(f"Error generating {report_type} export: {e}")
+        yield [f'Error generating {report_type} report', str(e)]
+
+
+class Echo:
+    """File-like object whose ``write`` hands the text back, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(report_type, start_date, end_date):
+    """CSV text of a report, in chunks of about ``CSV_CHUNK_CHARS`` characters."""
+    report = REPORTS[report_type]
+    writer = csv.writer(Echo(), quoting=csv.QUOTE_ALL)
+    # BOM, so Excel opens the file as UTF-8
+    chunk = ['\ufeff', writer.writerow(report.header)]
+    size = 0
+    for row in _guarded(report_type, report.rows(start_date, end_date)):
+        line = writer.writerow(row)
+        chunk.append(line)
+        size += len(line)
+        if size >= CSV_CHUNK_CHARS:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    yield ''.join(chunk)
+
+
+def _xlsx_value(value):
+    # Control characters are not allowed in the sheet XML
+    return ILLEGAL_CHARACTERS_RE.sub('', value) if isinstance(value, str) else value
+
+
+def xlsx_file(report_type, start_date, end_date):
+    """A temporary file, positioned at the start, holding the report as an XLSX workbook."""
+    report = REPORTS[report_type]
+    workbook = openpyxl.Workbook(write_only=True)
+    sheets = 0
+    rows_left = 0
+    sheet = None
+    for row in _guarded(report_type, report.rows(start_date, end_date)):
+        if not rows_left:
+            sheets += 1
+            sheet = workbook.create_sheet(report.title if sheets == 1 else f'{report.title} ({sheets})')
+            sheet.append(report.header)
+            rows_left = XLSX_MAX_ROWS - 1
+        sheet.append([_xlsx_value(value) for value in row])
+        rows_left -= 1
+    if sheet is None:
+        workbook.create_sheet(report.title).append(report.header)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,111 @@
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from analytics import views
+from analytics.models import SiteVisit
+
+PATHS = ['/en/', '/en/tours/', '/en/tours/nile-cruise/', '/en/destinations/', '/en/booking/', '/en/contact/']
+COUNTRIES = [None, 'Egypt', 'Germany', 'United Kingdom', 'United States', 'Italy']
+
+# Visits inserted per statement while seeding
+SEED_BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    """Raised to undo the synthetic rows once the exports have been measured."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Export a synthetic year of site visits (a million rows by default) as CSV and XLSX '
+        'and fail if an export allocates more than --max-memory MB. Memory is traced with '
+        'tracemalloc, which also makes the exports several times slower than in production'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Synthetic visits to export')
+        parser.add_argument('--format', choices=['csv', 'xlsx', 'both'], default='both')
+        parser.add_argument('--max-memory', type=float, default=64.0,
+                            help='Peak Python memory, in MB, an export may allocate')
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'])
+                name = f'export-benchmark-{time.time_ns()}'
+                staff = get_user_model().objects.create_user(
+                    username=name, email=f'{name}@example.com', is_staff=True
+                )
+                formats = ['csv', 'xlsx'] if options['format'] == 'both' else [options['format']]
+                for export_format in formats:
+                    results.append(self.measure(export_format, staff, options['rows']))
+                raise Rollback
+        except Rollback:
+            pass
+
+        failed = [result for result in results if result['peak_mb'] > options['max_memory']]
+        for result in results:
+            style = self.style.ERROR if result in failed else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{result["format"]}: {result["rows"]} rows, {result["bytes"] / 2 ** 20:.1f} MB in '
+                f'{result["seconds"]:.1f}s ({result["rows"] / result["seconds"]:.0f} rows/s), '
+                f'peak memory {result["peak_mb"]:.1f} MB (limit {options["max_memory"]:.0f} MB)'
+            ))
+        if failed:
+            raise CommandError('An export went over the memory limit')
+
+    def seed(self, rows):
+        """Insert ``rows`` visits spread over the past year, a batch at a time."""
+        started = time.perf_counter()
+        now = timezone.now()
+        made = 0
+        while made < rows:
+            batch = min(SEED_BATCH_SIZE, rows - made)
+            SiteVisit.objects.bulk_create([
+                SiteVisit(
+                    path=random.choice(PATHS),
+                    country=random.choice(COUNTRIES),
+                    timestamp=now - timedelta(seconds=random.randint(0, 364 * 86400)),
+                    user_agent='Mozilla/5.0 (export benchmark)',
+                )
+                for _ in range(batch)
+            ])
+            made += batch
+        self.stdout.write(f'Seeded {rows} visits in {time.perf_counter() - started:.1f}s')
+
+    def measure(self, export_format, staff, rows):
+        today = timezone.now().date()
+        request = RequestFactory().get('/', {
+            'start_date': (today - timedelta(days=365)).isoformat(), 'end_date': today.isoformat(),
+        })
+        request.user = staff
+        view = views.export_csv if export_format == 'csv' else views.export_xlsx
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            response = view(request, 'visits')
+            size = lines = 0
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+            # Not response.close(): its request_finished signal would close the
+            # connection, and with it the transaction holding the synthetic rows
+            if getattr(response, 'file_to_stream', None) is not None:
+                response.file_to_stream.close()
+            seconds = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        if export_format == 'csv' and lines != rows + 1:
+            raise CommandError(f'The CSV export has {lines - 1} rows instead of {rows}')
+        return {'format': export_format, 'rows': rows, 'bytes': size, 'seconds': seconds, 'peak_mb': peak / 2 ** 20}
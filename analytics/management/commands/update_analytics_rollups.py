@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from analytics.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Update the pre-aggregated analytics tables read by the analytics dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every rollup from scratch (needed after deleting rows)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and pick up new rows every --interval seconds')
+        parser.add_argument('--interval', type=float,
+                            default=getattr(settings, 'ANALYTICS_ROLLUP_INTERVAL', 300),
+                            help='Seconds between updates with --loop')
+
+    def handle(self, *args, **options):
+        rebuild = options['rebuild']
+        while True:
+            try:
+                close_old_connections()
+                updated = update_rollups(rebuild=rebuild)
+                rebuild = False
+                if updated or not options['loop']:
+                    summary = ', '.join(f'{name} {buckets}' for name, buckets in updated.items()) or 'nothing new'
+                    self.stdout.write(f'Updated analytics rollups: {summary}')
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Error updating analytics rollups: {e}'))
+                if not options['loop']:
+                    raise
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -1,12 +1,40 @@
 import logging
+from django.contrib.auth import SESSION_KEY
 from django.utils import timezone
-from django.db import DatabaseError
-from .models import SiteVisit
+from django.utils.functional import empty
+from .buffer import record_visit
 
 logger = logging.getLogger(__name__)
 
+
+def visitor_id(request):
+    """
+    ID of the logged-in user, without a database query: taken from
+    ``request.user`` or the session only if the view already loaded them.
+    """
+    user = getattr(request, 'user', None)
+    wrapped = getattr(user, '_wrapped', user)
+    if wrapped is not empty and wrapped is not None:
+        return wrapped.pk if wrapped.is_authenticated else None
+    session = getattr(request, 'session', None)
+    cached = getattr(session, '_session_cache', None)
+    if cached:
+        user_id = cached.get(SESSION_KEY)
+        if user_id is not None:
+            try:
+                return int(user_id)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
 class AnalyticsMiddleware:
-    """Middleware to track site visits"""
+    """
+    Middleware to track site visits.
+
+    Visits are queued in memory and written in batches by
+    ``analytics.buffer``, so requests do no database work for analytics.
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
@@ -22,23 +50,10 @@ class AnalyticsMiddleware:
             return response
 
         try:
-            # Check if the SiteVisit model is ready (table exists)
-            try:
-                from django.db import connection
-                with connection.cursor() as cursor:
-                    cursor.execute("SELECT 1 FROM analytics_sitevisit LIMIT 1")
-                table_exists = True
-            except Exception:
-                table_exists = False
-
-            if not table_exists:
-                # Skip tracking if the table doesn't exist yet
-                return response
-
             # Get IP address
             x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
             if x_forwarded_for:
-                ip_address = x_forwarded_for.split(',')[0]
+                ip_address = x_forwarded_for.split(',')[0].strip()
             else:
                 ip_address = request.META.get('REMOTE_ADDR')
 
@@ -47,18 +62,17 @@ class AnalyticsMiddleware:
             if hasattr(request, 'session') and request.session.session_key:
                 session_key = request.session.session_key
 
-            # Create site visit record
-            SiteVisit.objects.create(
-                user=request.user if request.user.is_authenticated else None,
+            # Queue the site visit record
+            record_visit(
+                user_id=visitor_id(request),
                 session_key=session_key,
-                ip_address=ip_address,
+                ip_address=ip_address or None,
                 user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                path=request.path,
-                referer=request.META.get('HTTP_REFERER', ''),
+                path=request.path[:255],
+                referer=request.META.get('HTTP_REFERER', '')[:200] or None,
+                timestamp=timezone.now(),
                 # Geolocation data would be added by a background task
             )
-        except DatabaseError as e:
-            logger.error(f"Database error tracking site visit: {e}")
         except Exception as e:
             logger.error(f"Error tracking site visit: {e}")
 
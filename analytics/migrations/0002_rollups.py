@@ -0,0 +1,138 @@
+# Generated by Django 5.2 on 2026-10-18 03:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('tour', '0009_tourdate_availability_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50, unique=True, verbose_name='Source')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Last ID')),
+                ('last_updated', models.DateTimeField(blank=True, null=True, verbose_name='Last Updated')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Rollup Watermark',
+                'verbose_name_plural': 'Rollup Watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Date')),
+                ('new_users', models.PositiveIntegerField(default=0, verbose_name='New Users')),
+            ],
+            options={
+                'verbose_name': 'User Rollup',
+                'verbose_name_plural': 'User Rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('path', models.CharField(max_length=255, verbose_name='Path')),
+                ('country', models.CharField(blank=True, default='', max_length=100, verbose_name='Country')),
+                ('visits', models.PositiveIntegerField(default=0, verbose_name='Visits')),
+            ],
+            options={
+                'verbose_name': 'Visit Rollup',
+                'verbose_name_plural': 'Visit Rollups',
+                'indexes': [models.Index(fields=['hour'], name='analytics_v_hour_716ba8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'path', 'country'), name='unique_visit_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('status', models.CharField(max_length=20, verbose_name='Status')),
+                ('bookings', models.PositiveIntegerField(default=0, verbose_name='Bookings')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_rollups', to='tour.tour')),
+            ],
+            options={
+                'verbose_name': 'Booking Rollup',
+                'verbose_name_plural': 'Booking Rollups',
+                'indexes': [models.Index(fields=['date', 'status'], name='analytics_b_date_bb588f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'tour', 'status'), name='unique_booking_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('bookings', models.PositiveIntegerField(default=0, verbose_name='Bookings')),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Spent')),
+                ('reviews', models.PositiveIntegerField(default=0, verbose_name='Reviews')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Customer Rollup',
+                'verbose_name_plural': 'Customer Rollups',
+                'constraints': [models.UniqueConstraint(fields=('date', 'user'), name='unique_customer_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('payment_method', models.CharField(max_length=50, verbose_name='Payment Method')),
+                ('payments', models.PositiveIntegerField(default=0, verbose_name='Payments')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Amount')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='tour.tour')),
+            ],
+            options={
+                'verbose_name': 'Revenue Rollup',
+                'verbose_name_plural': 'Revenue Rollups',
+                'indexes': [models.Index(fields=['date'], name='analytics_r_date_79bef1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'tour', 'payment_method'), name='unique_revenue_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('rating', models.PositiveSmallIntegerField(verbose_name='Rating')),
+                ('reviews', models.PositiveIntegerField(default=0, verbose_name='Reviews')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_rollups', to='tour.tour')),
+            ],
+            options={
+                'verbose_name': 'Review Rollup',
+                'verbose_name_plural': 'Review Rollups',
+                'indexes': [models.Index(fields=['date'], name='analytics_r_date_b091c3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'tour', 'rating'), name='unique_review_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TourViewRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Views')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_rollups', to='tour.tour')),
+            ],
+            options={
+                'verbose_name': 'Tour View Rollup',
+                'verbose_name_plural': 'Tour View Rollups',
+                'constraints': [models.UniqueConstraint(fields=('date', 'tour'), name='unique_tour_view_rollup')],
+            },
+        ),
+    ]
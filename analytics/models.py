@@ -77,3 +77,134 @@ class TourView(models.Model):
     
     def __str__(self):
         return f"{self.tour.name} - {self.timestamp}"
+
+
+class RollupWatermark(models.Model):
+    """
+    How far ``analytics.rollups`` has read a source table: the last row ID
+    for append-only tables, the last ``updated_at`` for tables whose rows change.
+    """
+    source = models.CharField(_("Source"), max_length=50, unique=True)
+    last_id = models.BigIntegerField(_("Last ID"), default=0)
+    last_updated = models.DateTimeField(_("Last Updated"), null=True, blank=True)
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Rollup Watermark")
+        verbose_name_plural = _("Rollup Watermarks")
+
+    def __str__(self):
+        return f"{self.source}: {self.last_updated or self.last_id}"
+
+
+class VisitRollup(models.Model):
+    """Site visits per hour, path and country."""
+    hour = models.DateTimeField(_("Hour"))
+    path = models.CharField(_("Path"), max_length=255)
+    country = models.CharField(_("Country"), max_length=100, blank=True, default='')
+    visits = models.PositiveIntegerField(_("Visits"), default=0)
+
+    class Meta:
+        verbose_name = _("Visit Rollup")
+        verbose_name_plural = _("Visit Rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'path', 'country'], name='unique_visit_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+
+class TourViewRollup(models.Model):
+    """Tour page views per day and tour."""
+    date = models.DateField(_("Date"))
+    tour = models.ForeignKey('tour.Tour', on_delete=models.CASCADE, related_name='view_rollups')
+    views = models.PositiveIntegerField(_("Views"), default=0)
+
+    class Meta:
+        verbose_name = _("Tour View Rollup")
+        verbose_name_plural = _("Tour View Rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'tour'], name='unique_tour_view_rollup'),
+        ]
+
+
+class BookingRollup(models.Model):
+    """Bookings created per day, tour and current status."""
+    date = models.DateField(_("Date"))
+    tour = models.ForeignKey('tour.Tour', on_delete=models.CASCADE, related_name='booking_rollups')
+    status = models.CharField(_("Status"), max_length=20)
+    bookings = models.PositiveIntegerField(_("Bookings"), default=0)
+
+    class Meta:
+        verbose_name = _("Booking Rollup")
+        verbose_name_plural = _("Booking Rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'tour', 'status'], name='unique_booking_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'status']),
+        ]
+
+
+class RevenueRollup(models.Model):
+    """Completed payments per day, tour and payment method."""
+    date = models.DateField(_("Date"))
+    tour = models.ForeignKey('tour.Tour', on_delete=models.CASCADE, related_name='revenue_rollups')
+    payment_method = models.CharField(_("Payment Method"), max_length=50)
+    payments = models.PositiveIntegerField(_("Payments"), default=0)
+    amount = models.DecimalField(_("Amount"), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("Revenue Rollup")
+        verbose_name_plural = _("Revenue Rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'tour', 'payment_method'], name='unique_revenue_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+
+class ReviewRollup(models.Model):
+    """Reviews per day, tour and rating."""
+    date = models.DateField(_("Date"))
+    tour = models.ForeignKey('tour.Tour', on_delete=models.CASCADE, related_name='review_rollups')
+    rating = models.PositiveSmallIntegerField(_("Rating"))
+    reviews = models.PositiveIntegerField(_("Reviews"), default=0)
+
+    class Meta:
+        verbose_name = _("Review Rollup")
+        verbose_name_plural = _("Review Rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'tour', 'rating'], name='unique_review_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+
+class UserRollup(models.Model):
+    """New users per day."""
+    date = models.DateField(_("Date"), unique=True)
+    new_users = models.PositiveIntegerField(_("New Users"), default=0)
+
+    class Meta:
+        verbose_name = _("User Rollup")
+        verbose_name_plural = _("User Rollups")
+
+
+class CustomerRollup(models.Model):
+    """Bookings made, completed payments and reviews written per day and user."""
+    date = models.DateField(_("Date"))
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='customer_rollups')
+    bookings = models.PositiveIntegerField(_("Bookings"), default=0)
+    spent = models.DecimalField(_("Spent"), max_digits=14, decimal_places=2, default=0)
+    reviews = models.PositiveIntegerField(_("Reviews"), default=0)
+
+    class Meta:
+        verbose_name = _("Customer Rollup")
+        verbose_name_plural = _("Customer Rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user'], name='unique_customer_rollup'),
+        ]
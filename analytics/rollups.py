@@ -0,0 +1,261 @@
+"""
+Pre-aggregated analytics.
+
+The analytics views used to aggregate raw visits, bookings, payments and
+reviews on every page load, so they got slower as history grew. They now
+read rollup tables instead: visits per hour, path and country, and per day
+tour views, bookings (by tour and status), completed payments (by tour and
+method), reviews (by tour and rating), new users and per-customer activity.
+
+``update_rollups`` keeps them current incrementally. For every source table
+it reads only the rows added or changed since the ``RollupWatermark`` of
+the previous run (by ID for append-only tables, by ``updated_at`` for the
+others), collects the hours or days those rows fall in, and recomputes just
+those buckets from the raw rows. Recomputing replaces a bucket, so runs are
+idempotent and a row whose status changed moves between buckets correctly.
+Changed rows are re-read for ``ANALYTICS_ROLLUP_OVERLAP`` seconds after
+their ``updated_at`` to catch transactions that committed late.
+
+Deleted rows are not detected; ``python manage.py update_analytics_rollups
+--rebuild`` recomputes everything.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncHour
+from django.utils import timezone
+
+from booking.models import Booking
+from payments.models import Payment
+from reviews.models import Review
+from .models import (
+    BookingRollup, CustomerRollup, RevenueRollup, ReviewRollup, RollupWatermark, SiteVisit,
+    TourView, TourViewRollup, UserRollup, VisitRollup,
+)
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Rows per INSERT statement when replacing buckets
+INSERT_BATCH_SIZE = 500
+
+
+def overlap():
+    return timedelta(seconds=getattr(settings, 'ANALYTICS_ROLLUP_OVERLAP', 60))
+
+
+def _start(bucket):
+    """Aware datetime at which an hour (datetime) or day (date) bucket starts."""
+    if isinstance(bucket, datetime):
+        return bucket
+    return timezone.make_aware(datetime.combine(bucket, time.min))
+
+
+def _in_buckets(field, buckets, width):
+    """``Q`` matching ``field`` inside the buckets, with adjacent buckets merged into one range."""
+    spans = []
+    for bucket in sorted(buckets):
+        start = _start(bucket)
+        if spans and spans[-1][1] == start:
+            spans[-1][1] = start + width
+        else:
+            spans.append([start, start + width])
+    query = Q(pk__in=[])
+    for start, end in spans:
+        query |= Q(**{f'{field}__gte': start, f'{field}__lt': end})
+    return query
+
+
+def _rows(model, field, buckets, width):
+    # No Meta.ordering: its columns would join the GROUP BY of the aggregations
+    # and split each bucket into one row per timestamp
+    queryset = model.objects.order_by()
+    if buckets is not None:
+        queryset = queryset.filter(_in_buckets(field, buckets, width))
+    return queryset
+
+
+# Recomputed rows of each rollup for a set of buckets (None: all of them)
+
+def _visit_rows(hours):
+    rows = _rows(SiteVisit, 'timestamp', hours, HOUR).annotate(
+        bucket=TruncHour('timestamp'), country_key=Coalesce('country', Value(''))
+    ).values('bucket', 'path', 'country_key').annotate(visits=Count('id'))
+    return [
+        VisitRollup(hour=row['bucket'], path=row['path'][:255], country=row['country_key'][:100],
+                    visits=row['visits'])
+        for row in rows
+    ]
+
+
+def _tour_view_rows(days):
+    rows = _rows(TourView, 'timestamp', days, DAY).annotate(
+        bucket=TruncDate('timestamp')
+    ).values('bucket', 'tour_id').annotate(views=Count('id'))
+    return [TourViewRollup(date=row['bucket'], tour_id=row['tour_id'], views=row['views']) for row in rows]
+
+
+def _user_rows(days):
+    rows = _rows(get_user_model(), 'date_joined', days, DAY).annotate(
+        bucket=TruncDate('date_joined')
+    ).values('bucket').annotate(new_users=Count('id'))
+    return [UserRollup(date=row['bucket'], new_users=row['new_users']) for row in rows]
+
+
+def _booking_rows(days):
+    rows = _rows(Booking, 'created_at', days, DAY).annotate(
+        bucket=TruncDate('created_at')
+    ).values('bucket', 'tour_id', 'status').annotate(bookings=Count('id'))
+    return [
+        BookingRollup(date=row['bucket'], tour_id=row['tour_id'], status=row['status'], bookings=row['bookings'])
+        for row in rows
+    ]
+
+
+def _revenue_rows(days):
+    rows = _rows(Payment, 'created_at', days, DAY).filter(status='completed').annotate(
+        bucket=TruncDate('created_at'), tour_key=F('booking__tour_id')
+    ).values('bucket', 'tour_key', 'payment_method').annotate(payments=Count('id'), amount=Sum('amount'))
+    return [
+        RevenueRollup(date=row['bucket'], tour_id=row['tour_key'], payment_method=row['payment_method'],
+                      payments=row['payments'], amount=row['amount'] or 0)
+        for row in rows
+    ]
+
+
+def _review_rows(days):
+    rows = _rows(Review, 'created_at', days, DAY).annotate(
+        bucket=TruncDate('created_at')
+    ).values('bucket', 'tour_id', 'rating').annotate(reviews=Count('id'))
+    return [
+        ReviewRollup(date=row['bucket'], tour_id=row['tour_id'], rating=row['rating'], reviews=row['reviews'])
+        for row in rows
+    ]
+
+
+def _customer_rows(days):
+    customers = defaultdict(lambda: {'bookings': 0, 'spent': 0, 'reviews': 0})
+    bookings = _rows(Booking, 'created_at', days, DAY).annotate(
+        bucket=TruncDate('created_at')
+    ).values('bucket', 'user_id').annotate(total=Count('id'))
+    for row in bookings:
+        customers[(row['bucket'], row['user_id'])]['bookings'] = row['total']
+    spent = _rows(Payment, 'created_at', days, DAY).filter(status='completed').annotate(
+        bucket=TruncDate('created_at'), user_key=F('booking__user_id')
+    ).values('bucket', 'user_key').annotate(total=Sum('amount'))
+    for row in spent:
+        customers[(row['bucket'], row['user_key'])]['spent'] = row['total'] or 0
+    reviews = _rows(Review, 'created_at', days, DAY).annotate(
+        bucket=TruncDate('created_at')
+    ).values('bucket', 'user_id').annotate(total=Count('id'))
+    for row in reviews:
+        customers[(row['bucket'], row['user_id'])]['reviews'] = row['total']
+    return [
+        CustomerRollup(date=date, user_id=user_id, **totals)
+        for (date, user_id), totals in customers.items()
+    ]
+
+
+Rollup = namedtuple('Rollup', ['model', 'bucket_field', 'compute'])
+
+ROLLUPS = {
+    'visits': Rollup(VisitRollup, 'hour', _visit_rows),
+    'tour_views': Rollup(TourViewRollup, 'date', _tour_view_rows),
+    'users': Rollup(UserRollup, 'date', _user_rows),
+    'bookings': Rollup(BookingRollup, 'date', _booking_rows),
+    'revenue': Rollup(RevenueRollup, 'date', _revenue_rows),
+    'reviews': Rollup(ReviewRollup, 'date', _review_rows),
+    'customers': Rollup(CustomerRollup, 'date', _customer_rows),
+}
+
+# name, model, how new rows are found ('id' or 'updated_at'), the field
+# and width of the buckets, and the rollups fed by it
+Source = namedtuple('Source', ['name', 'model', 'watermark', 'bucket_field', 'width', 'rollups'])
+
+SOURCES = (
+    Source('site_visits', SiteVisit, 'id', 'timestamp', HOUR, ('visits',)),
+    Source('tour_views', TourView, 'id', 'timestamp', DAY, ('tour_views',)),
+    Source('users', get_user_model(), 'id', 'date_joined', DAY, ('users',)),
+    Source('bookings', Booking, 'updated_at', 'created_at', DAY, ('bookings', 'customers')),
+    Source('payments', Payment, 'updated_at', 'created_at', DAY, ('revenue', 'customers')),
+    Source('reviews', Review, 'updated_at', 'created_at', DAY, ('reviews', 'customers')),
+)
+
+
+def _changes(source, watermark):
+    """
+    ``(buckets, watermark values)`` for the rows of ``source`` added or
+    changed since ``watermark``: the hours or days to recompute, and the
+    ``last_id``/``last_updated`` to store afterwards.
+    """
+    model = source.model
+    if source.watermark == 'id':
+        changed = model.objects.filter(pk__gt=watermark.last_id)
+        last = changed.aggregate(last=Max('pk'))['last']
+        if last is None:
+            return set(), {}
+        changed = changed.filter(pk__lte=last)
+        marks = {'last_id': last}
+    else:
+        changed = model.objects.all()
+        if watermark.last_updated is not None:
+            changed = changed.filter(updated_at__gt=watermark.last_updated - overlap())
+        last = changed.aggregate(last=Max('updated_at'))['last']
+        if last is None:
+            return set(), {}
+        changed = changed.filter(updated_at__lte=last)
+        marks = {'last_updated': last}
+
+    trunc = TruncHour if source.width == HOUR else TruncDate
+    buckets = set(
+        changed.order_by().annotate(bucket=trunc(source.bucket_field)).values_list('bucket', flat=True).distinct()
+    )
+    return buckets, marks
+
+
+def update_rollups(rebuild=False):
+    """
+    Bring the rollup tables up to date with the source tables; with
+    ``rebuild`` recompute them entirely. Returns ``{rollup: buckets recomputed}``.
+    """
+    watermarks = {mark.source: mark for mark in RollupWatermark.objects.all()}
+    dirty = defaultdict(set)
+    marks = {}
+    for source in SOURCES:
+        watermark = RollupWatermark(source=source.name) if rebuild else (
+            watermarks.get(source.name) or RollupWatermark(source=source.name)
+        )
+        buckets, marks[source.name] = _changes(source, watermark)
+        for name in source.rollups:
+            dirty[name] |= buckets
+
+    # Aggregate first, then swap the buckets in one short write transaction
+    replacements = {}
+    for name, rollup in ROLLUPS.items():
+        if rebuild:
+            replacements[name] = (None, rollup.compute(None))
+        elif dirty[name]:
+            replacements[name] = (dirty[name], rollup.compute(dirty[name]))
+
+    with transaction.atomic():
+        for name, (buckets, rows) in replacements.items():
+            rollup = ROLLUPS[name]
+            existing = rollup.model.objects.all()
+            if buckets is not None:
+                existing = existing.filter(**{f'{rollup.bucket_field}__in': list(buckets)})
+            existing.delete()
+            rollup.model.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
+        for source_name, values in marks.items():
+            if values:
+                RollupWatermark.objects.update_or_create(source=source_name, defaults=values)
+
+    return {name: (len(buckets) if buckets is not None else 'all') for name, (buckets, _rows) in replacements.items()}
+
+
+def date_range_q(field, start_date, end_date):
+    """``Q`` for ``field`` (an hour) falling on the days from ``start_date`` to ``end_date``."""
+    return Q(**{f'{field}__gte': _start(start_date), f'{field}__lt': _start(end_date + DAY)})
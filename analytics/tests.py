@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .buffer import VisitBuffer
+from .models import SiteVisit
+
+
+class VisitBufferTests(TestCase):
+    """Buffered visits are only written to the database they were recorded against."""
+
+    def visit(self, buffer):
+        buffer.add(path='/tours/', user_agent='test', timestamp=timezone.now())
+
+    @override_settings(ANALYTICS_BUFFER_AUTOFLUSH=False)
+    def test_no_flusher_without_autoflush(self):
+        buffer = VisitBuffer()
+        self.visit(buffer)
+        self.assertIsNone(buffer._flusher)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertTrue(SiteVisit.objects.filter(path='/tours/').exists())
+
+    def test_dropped_when_database_changed(self):
+        buffer = VisitBuffer(autoflush=False)
+        self.visit(buffer)
+        # As after the test runner destroyed the test database at exit
+        with mock.patch.dict(connection.settings_dict, NAME='another-database'):
+            with self.assertNumQueries(0):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertFalse(SiteVisit.objects.exists())
@@ -10,4 +10,5 @@ urlpatterns = [
     path('users/', views.user_analytics, name='users'),
     path('reviews/', views.review_analytics, name='reviews'),
     path('export/csv/<str:report_type>/', views.export_csv, name='export_csv'),
+    path('export/xlsx/<str:report_type>/', views.export_xlsx, name='export_xlsx'),
 ]
@@ -1,21 +1,30 @@
-import csv
 import json
 from datetime import datetime, timedelta
 from collections import defaultdict
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Count, Sum, Avg, F, Q, Case, When, Value, IntegerField
-from django.db.models.functions import TruncDate, TruncMonth, TruncWeek, ExtractMonth
+from django.db.models import Sum, F, Q, Case, When, Value, IntegerField
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek, ExtractMonth
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from booking.models import Booking
-from payments.models import Payment
 from tour.models import Tour, Destination, Category
 from reviews.models import Review
 from users.models import CustomUser
-from .models import SiteVisit, TourView
+from .models import TourView, BookingRollup, RevenueRollup, ReviewRollup, UserRollup, VisitRollup
+from .exports import REPORTS, csv_stream, xlsx_file
+from .rollups import date_range_q
+
+# The report pages below read only the rollup tables kept up to date by
+# ``python manage.py update_analytics_rollups`` (see analytics.rollups), so
+# their cost does not grow with the number of visits, bookings and reviews.
+
+
+def _average_rating(reviews):
+    """Average rating of a ``ReviewRollup`` queryset."""
+    totals = reviews.aggregate(stars=Sum(F('rating') * F('reviews')), count=Sum('reviews'))
+    return totals['stars'] / totals['count'] if totals['count'] else 0
 
 
 @staff_member_required
@@ -34,60 +43,51 @@ def analytics_dashboard(request):
     if end_date_param:
         end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
 
+    period = [start_date, end_date]
+
     # Revenue statistics
-    total_revenue = Payment.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
+    total_revenue = RevenueRollup.objects.filter(
+        date__range=period
     ).aggregate(total=Sum('amount'))['total'] or 0
 
     # Booking statistics
-    total_bookings = Booking.objects.filter(
-        created_at__date__range=[start_date, end_date]
-    ).count()
+    bookings = BookingRollup.objects.filter(date__range=period)
+    total_bookings = bookings.aggregate(total=Sum('bookings'))['total'] or 0
 
-    confirmed_bookings = Booking.objects.filter(
-        status='confirmed',
-        created_at__date__range=[start_date, end_date]
-    ).count()
+    confirmed_bookings = bookings.filter(
+        status='confirmed'
+    ).aggregate(total=Sum('bookings'))['total'] or 0
 
     # User statistics
-    new_users = CustomUser.objects.filter(
-        date_joined__date__range=[start_date, end_date]
-    ).count()
+    new_users = UserRollup.objects.filter(
+        date__range=period
+    ).aggregate(total=Sum('new_users'))['total'] or 0
 
     # Tour statistics
-    popular_tours = Tour.objects.annotate(
-        booking_count=Count('bookings', filter=Q(
-            bookings__created_at__date__range=[start_date, end_date]
-        ))
+    popular_tours = Tour.objects.select_related('destination').annotate(
+        booking_count=Coalesce(Sum('booking_rollups__bookings', filter=Q(
+            booking_rollups__date__range=period
+        )), 0)
     ).order_by('-booking_count')[:5]
 
     # Review statistics
-    review_count = Review.objects.filter(
-        created_at__date__range=[start_date, end_date]
-    ).count()
+    reviews = ReviewRollup.objects.filter(date__range=period)
+    review_count = reviews.aggregate(total=Sum('reviews'))['total'] or 0
 
-    avg_rating = Review.objects.filter(
-        created_at__date__range=[start_date, end_date]
-    ).aggregate(avg=Avg('rating'))['avg'] or 0
+    avg_rating = _average_rating(reviews)
 
     # Visit statistics
-    visit_count = SiteVisit.objects.filter(
-        timestamp__date__range=[start_date, end_date]
-    ).count()
+    visits = VisitRollup.objects.filter(date_range_q('hour', start_date, end_date))
+    visit_count = visits.aggregate(total=Sum('visits'))['total'] or 0
 
     # Country statistics
-    country_visits = SiteVisit.objects.filter(
-        timestamp__date__range=[start_date, end_date],
-        country__isnull=False
-    ).values('country').annotate(count=Count('id')).order_by('-count')[:10]
+    country_visits = visits.exclude(
+        country=''
+    ).values('country').annotate(count=Sum('visits')).order_by('-count')[:10]
 
     # Daily revenue chart data
-    daily_revenue = Payment.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
-    ).annotate(
-        date=TruncDate('created_at')
+    daily_revenue = RevenueRollup.objects.filter(
+        date__range=period
     ).values('date').annotate(
         total=Sum('amount')
     ).order_by('date')
@@ -98,12 +98,8 @@ def analytics_dashboard(request):
     }
 
     # Daily bookings chart data
-    daily_bookings = Booking.objects.filter(
-        created_at__date__range=[start_date, end_date]
-    ).annotate(
-        date=TruncDate('created_at')
-    ).values('date').annotate(
-        count=Count('id')
+    daily_bookings = bookings.values('date').annotate(
+        count=Sum('bookings')
     ).order_by('date')
 
     bookings_chart_data = {
@@ -147,40 +143,32 @@ def revenue_analytics(request):
     if end_date_param:
         end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
 
+    revenue = RevenueRollup.objects.filter(date__range=[start_date, end_date])
+
     # Revenue by payment method
-    revenue_by_method = Payment.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
-    ).values('payment_method').annotate(
+    revenue_by_method = revenue.values('payment_method').annotate(
         total=Sum('amount')
     ).order_by('-total')
 
     # Revenue by tour
-    revenue_by_tour = Payment.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
-    ).values(
-        'booking__tour__name'
+    revenue_by_tour = revenue.values(
+        'tour__name'
     ).annotate(
         total=Sum('amount')
     ).order_by('-total')[:10]
 
     # Revenue by destination
-    revenue_by_destination = Payment.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date, end_date]
-    ).values(
-        'booking__tour__destination__name'
+    revenue_by_destination = revenue.values(
+        'tour__destination__name'
     ).annotate(
         total=Sum('amount')
     ).order_by('-total')[:10]
 
     # Monthly revenue trend
-    monthly_revenue = Payment.objects.filter(
-        status='completed',
-        created_at__date__range=[start_date - timedelta(days=365), end_date]
+    monthly_revenue = RevenueRollup.objects.filter(
+        date__range=[start_date - timedelta(days=365), end_date]
     ).annotate(
-        month=TruncMonth('created_at')
+        month=TruncMonth('date')
     ).values('month').annotate(
         total=Sum('amount')
     ).order_by('month')
@@ -219,39 +207,41 @@ def tour_analytics(request):
     if end_date_param:
         end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
 
+    period = [start_date, end_date]
+
     # Most booked tours
-    most_booked_tours = Tour.objects.annotate(
-        booking_count=Count('bookings', filter=Q(
-            bookings__created_at__date__range=[start_date, end_date]
-        ))
+    most_booked_tours = Tour.objects.select_related('destination').annotate(
+        booking_count=Coalesce(Sum('booking_rollups__bookings', filter=Q(
+            booking_rollups__date__range=period
+        )), 0)
     ).order_by('-booking_count')[:10]
 
     # Most viewed tours
-    most_viewed_tours = Tour.objects.annotate(
-        analytics_view_count=Count('analytics_views', filter=Q(
-            analytics_views__timestamp__date__range=[start_date, end_date]
-        ))
+    most_viewed_tours = Tour.objects.select_related('destination').annotate(
+        analytics_view_count=Coalesce(Sum('view_rollups__views', filter=Q(
+            view_rollups__date__range=period
+        )), 0)
     ).order_by('-analytics_view_count')[:10]
 
-    # Best rated tours
-    best_rated_tours = Tour.objects.annotate(
-        avg_rating=Avg('tour_reviews__rating', filter=Q(
-            tour_reviews__created_at__date__range=[start_date, end_date]
-        ))
-    ).filter(avg_rating__isnull=False).order_by('-avg_rating')[:10]
+    # Best rated tours (all-time, from the materialized rating summaries)
+    best_rated_tours = Tour.objects.filter(
+        rating_summary__review_count__gt=0
+    ).select_related('destination').annotate(
+        avg_rating=F('rating_summary__average_rating')
+    ).order_by('-rating_summary__average_rating', '-rating_summary__review_count')[:10]
 
     # Popular destinations
     popular_destinations = Destination.objects.annotate(
-        booking_count=Count('tours__bookings', filter=Q(
-            tours__bookings__created_at__date__range=[start_date, end_date]
-        ))
+        booking_count=Coalesce(Sum('tours__booking_rollups__bookings', filter=Q(
+            tours__booking_rollups__date__range=period
+        )), 0)
     ).order_by('-booking_count')[:10]
 
     # Popular categories
     popular_categories = Category.objects.annotate(
-        booking_count=Count('tours__bookings', filter=Q(
-            tours__bookings__created_at__date__range=[start_date, end_date]
-        ))
+        booking_count=Coalesce(Sum('tours__booking_rollups__bookings', filter=Q(
+            tours__booking_rollups__date__range=period
+        )), 0)
     ).order_by('-booking_count')[:10]
 
     context = {
@@ -284,40 +274,31 @@ def user_analytics(request):
     if end_date_param:
         end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
 
+    period = Q(customer_rollups__date__range=[start_date, end_date])
+
     # New users over time
-    new_users_by_day = CustomUser.objects.filter(
-        date_joined__date__range=[start_date, end_date]
-    ).annotate(
-        date=TruncDate('date_joined')
-    ).values('date').annotate(
-        count=Count('id')
+    new_users_by_day = UserRollup.objects.filter(
+        date__range=[start_date, end_date]
     ).order_by('date')
 
     new_users_chart_data = {
-        'labels': [item['date'].strftime('%Y-%m-%d') for item in new_users_by_day],
-        'data': [item['count'] for item in new_users_by_day]
+        'labels': [item.date.strftime('%Y-%m-%d') for item in new_users_by_day],
+        'data': [item.new_users for item in new_users_by_day]
     }
 
     # Top customers by booking count
     top_customers_by_bookings = CustomUser.objects.annotate(
-        booking_count=Count('bookings', filter=Q(
-            bookings__created_at__date__range=[start_date, end_date]
-        ))
+        booking_count=Sum('customer_rollups__bookings', filter=period)
     ).filter(booking_count__gt=0).order_by('-booking_count')[:10]
 
     # Top customers by spending
     top_customers_by_spending = CustomUser.objects.annotate(
-        total_spent=Sum('bookings__payment__amount', filter=Q(
-            bookings__payment__status='completed',
-            bookings__payment__created_at__date__range=[start_date, end_date]
-        ))
-    ).filter(total_spent__isnull=False).order_by('-total_spent')[:10]
+        total_spent=Sum('customer_rollups__spent', filter=period)
+    ).filter(total_spent__gt=0).order_by('-total_spent')[:10]
 
     # Most active reviewers
     most_active_reviewers = CustomUser.objects.annotate(
-        review_count=Count('tour_reviews', filter=Q(
-            tour_reviews__created_at__date__range=[start_date, end_date]
-        ))
+        review_count=Sum('customer_rollups__reviews', filter=period)
     ).filter(review_count__gt=0).order_by('-review_count')[:10]
 
     context = {
@@ -350,10 +331,10 @@ def review_analytics(request):
         end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
 
     # Rating distribution
-    rating_distribution = Review.objects.filter(
-        created_at__date__range=[start_date, end_date]
+    rating_distribution = ReviewRollup.objects.filter(
+        date__range=[start_date, end_date]
     ).values('rating').annotate(
-        count=Count('id')
+        count=Sum('reviews')
     ).order_by('rating')
 
     rating_chart_data = {
@@ -361,6 +342,8 @@ def review_analytics(request):
         'data': [item['count'] for item in rating_distribution]
     }
 
+    # The latest reviews are rows rather than totals, so they still come
+    # from the reviews table (ten of each)
     # Positive reviews (4-5 stars)
     positive_reviews = Review.objects.filter(
         created_at__date__range=[start_date, end_date],
@@ -374,17 +357,18 @@ def review_analytics(request):
     ).order_by('-created_at')[:10]
 
     # Average rating over time
-    avg_rating_by_week = Review.objects.filter(
-        created_at__date__range=[start_date - timedelta(days=90), end_date]
+    avg_rating_by_week = ReviewRollup.objects.filter(
+        date__range=[start_date - timedelta(days=90), end_date]
     ).annotate(
-        week=TruncWeek('created_at')
+        week=TruncWeek('date')
     ).values('week').annotate(
-        avg_rating=Avg('rating')
+        stars=Sum(F('rating') * F('reviews')),
+        count=Sum('reviews')
     ).order_by('week')
 
     rating_trend_data = {
         'labels': [item['week'].strftime('%b %d, %Y') for item in avg_rating_by_week],
-        'data': [float(item['avg_rating']) for item in avg_rating_by_week]
+        'data': [item['stars'] / item['count'] for item in avg_rating_by_week]
     }
 
     context = {
@@ -400,243 +384,42 @@ def review_analytics(request):
     return render(request, 'analytics/reviews.html', context)
 
 
+def _export_period(request):
+    """Report period of an export request, the last 30 days unless given."""
+    end_date = timezone.now().date()
+    try:
+        if request.GET.get('end_date'):
+            end_date = datetime.strptime(request.GET['end_date'], '%Y-%m-%d').date()
+        if request.GET.get('start_date'):
+            return datetime.strptime(request.GET['start_date'], '%Y-%m-%d').date(), end_date
+    except ValueError:
+        # Handle invalid date format
+        end_date = timezone.now().date()
+    return end_date - timedelta(days=30), end_date
+
+
 @staff_member_required
 def export_csv(request, report_type):
-    """Export analytics data as CSV"""
-    try:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{report_type}_report_{timezone.now().strftime("%Y%m%d")}.csv"'
+    """Export analytics data as CSV, streamed as it is read"""
+    if report_type not in REPORTS:
+        raise Http404(_("Unknown report"))
+    start_date, end_date = _export_period(request)
+    response = StreamingHttpResponse(
+        csv_stream(report_type, start_date, end_date), content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{report_type}_report_{timezone.now().strftime("%Y%m%d")}.csv"'
+    return response
 
-        # Set CSV writer to handle UTF-8 characters properly
-        response.write('\ufeff'.encode('utf8'))  # BOM (Byte Order Mark)
-        writer = csv.writer(response, quoting=csv.QUOTE_ALL)
 
-        # Get date range from request or use default (last 30 days)
-        end_date = timezone.now().date()
-        start_date = request.GET.get('start_date')
-        end_date_param = request.GET.get('end_date')
-
-        try:
-            if start_date:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            else:
-                start_date = end_date - timedelta(days=30)
-
-            if end_date_param:
-                end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
-        except ValueError:
-            # Handle invalid date format
-            start_date = end_date - timedelta(days=30)
-
-        if report_type == 'revenue':
-            # Revenue report
-            writer.writerow(['Date', 'Total Revenue', 'Number of Bookings', 'Average Booking Value'])
-
-            try:
-                daily_revenue = Payment.objects.filter(
-                    status='completed',
-                    created_at__date__range=[start_date, end_date]
-                ).annotate(
-                    date=TruncDate('created_at')
-                ).values('date').annotate(
-                    total=Sum('amount'),
-                    booking_count=Count('booking', distinct=True)
-                ).order_by('date')
-
-                for item in daily_revenue:
-                    try:
-                        avg_value = item['total'] / item['booking_count'] if item['booking_count'] > 0 else 0
-                        writer.writerow([
-                            item['date'].strftime('%Y-%m-%d'),
-                            float(item['total']),
-                            item['booking_count'],
-                            float(avg_value)
-                        ])
-                    except (TypeError, ValueError, ZeroDivisionError) as e:
-                        # Handle calculation errors
-                        writer.writerow([
-                            item['date'].strftime('%Y-%m-%d') if item.get('date') else 'N/A',
-                            float(item.get('total', 0) or 0),
-                            item.get('booking_count', 0) or 0,
-                            0
-                        ])
-            except Exception as e:
-                # Fallback if query fails
-                writer.writerow(['Error generating revenue report', str(e)])
-
-        elif report_type == 'tours':
-            # Tour performance report
-            writer.writerow(['Tour Name', 'Bookings', 'Revenue', 'Views', 'Average Rating'])
-
-            try:
-                tours = Tour.objects.annotate(
-                    booking_count=Count('bookings', filter=Q(
-                        bookings__created_at__date__range=[start_date, end_date]
-                    )),
-                    revenue=Sum('bookings__payment__amount', filter=Q(
-                        bookings__payment__status='completed',
-                        bookings__payment__created_at__date__range=[start_date, end_date]
-                    )),
-                    analytics_view_count=Count('analytics_views', filter=Q(
-                        analytics_views__timestamp__date__range=[start_date, end_date]
-                    )),
-                    avg_rating=Avg('tour_reviews__rating', filter=Q(
-                        tour_reviews__created_at__date__range=[start_date, end_date]
-                    ))
-                ).order_by('-booking_count')
-
-                for tour in tours:
-                    try:
-                        writer.writerow([
-                            str(tour.name),
-                            int(tour.booking_count),
-                            float(tour.revenue or 0),
-                            int(tour.analytics_view_count),
-                            float(tour.avg_rating or 0)
-                        ])
-                    except (AttributeError, TypeError, ValueError) as e:
-                        # Handle missing attributes or conversion errors
-                        writer.writerow([
-                            str(getattr(tour, 'name', 'Unknown')),
-                            int(getattr(tour, 'booking_count', 0) or 0),
-                            float(getattr(tour, 'revenue', 0) or 0),
-                            int(getattr(tour, 'analytics_view_count', 0) or 0),
-                            float(getattr(tour, 'avg_rating', 0) or 0)
-                        ])
-            except Exception as e:
-                # Fallback if query fails
-                writer.writerow(['Error generating tours report', str(e)])
-
-        elif report_type == 'users':
-            # User activity report
-            writer.writerow(['Username', 'Email', 'Date Joined', 'Bookings', 'Total Spent', 'Reviews'])
-
-            try:
-                users = CustomUser.objects.annotate(
-                    booking_count=Count('bookings', filter=Q(
-                        bookings__created_at__date__range=[start_date, end_date]
-                    )),
-                    total_spent=Sum('bookings__payment__amount', filter=Q(
-                        bookings__payment__status='completed',
-                        bookings__payment__created_at__date__range=[start_date, end_date]
-                    )),
-                    review_count=Count('tour_reviews', filter=Q(
-                        tour_reviews__created_at__date__range=[start_date, end_date]
-                    ))
-                ).filter(
-                    Q(booking_count__gt=0) | Q(review_count__gt=0)
-                ).order_by('-booking_count')
-
-                for user in users:
-                    try:
-                        writer.writerow([
-                            str(user.username),
-                            str(user.email),
-                            user.date_joined.strftime('%Y-%m-%d'),
-                            int(user.booking_count),
-                            float(user.total_spent or 0),
-                            int(user.review_count)
-                        ])
-                    except (AttributeError, TypeError, ValueError) as e:
-                        # Handle missing attributes or conversion errors
-                        writer.writerow([
-                            str(getattr(user, 'username', 'Unknown')),
-                            str(getattr(user, 'email', 'Unknown')),
-                            getattr(user, 'date_joined', timezone.now()).strftime('%Y-%m-%d'),
-                            int(getattr(user, 'booking_count', 0) or 0),
-                            float(getattr(user, 'total_spent', 0) or 0),
-                            int(getattr(user, 'review_count', 0) or 0)
-                        ])
-            except Exception as e:
-                # Fallback if query fails
-                writer.writerow(['Error generating users report', str(e)])
-
-        elif report_type == 'reviews':
-            # Reviews report
-            writer.writerow(['Tour', 'User', 'Rating', 'Date', 'Comment'])
-
-            try:
-                reviews = Review.objects.filter(
-                    created_at__date__range=[start_date, end_date]
-                ).select_related('tour', 'user').order_by('-created_at')
-
-                for review in reviews:
-                    try:
-                        writer.writerow([
-                            str(review.tour.name),
-                            str(review.user.username),
-                            int(review.rating),
-                            review.created_at.strftime('%Y-%m-%d'),
-                            str(review.comment)
-                        ])
-                    except (AttributeError, TypeError, ValueError) as e:
-                        # Handle missing attributes or conversion errors
-                        writer.writerow([
-                            str(getattr(review.tour, 'name', 'Unknown Tour')),
-                            str(getattr(review.user, 'username', 'Unknown User')),
-                            int(getattr(review, 'rating', 0) or 0),
-                            getattr(review, 'created_at', timezone.now()).strftime('%Y-%m-%d'),
-                            str(getattr(review, 'comment', ''))
-                        ])
-            except Exception as e:
-                # Fallback if query fails
-                writer.writerow(['Error generating reviews report', str(e)])
-
-        elif report_type == 'dashboard':
-            # Dashboard summary report
-            writer.writerow(['Metric', 'Value', 'Period'])
-
-            try:
-                # Revenue
-                total_revenue = Payment.objects.filter(
-                    status='completed',
-                    created_at__date__range=[start_date, end_date]
-                ).aggregate(total=Sum('amount'))['total'] or 0
-
-                # Bookings
-                total_bookings = Booking.objects.filter(
-                    created_at__date__range=[start_date, end_date]
-                ).count()
-
-                confirmed_bookings = Booking.objects.filter(
-                    status='confirmed',
-                    created_at__date__range=[start_date, end_date]
-                ).count()
-
-                # Users
-                new_users = CustomUser.objects.filter(
-                    date_joined__date__range=[start_date, end_date]
-                ).count()
-
-                # Reviews
-                review_count = Review.objects.filter(
-                    created_at__date__range=[start_date, end_date]
-                ).count()
-
-                avg_rating = Review.objects.filter(
-                    created_at__date__range=[start_date, end_date]
-                ).aggregate(avg=Avg('rating'))['avg'] or 0
-
-                # Write summary data
-                period = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
-                writer.writerow(['Total Revenue', float(total_revenue), period])
-                writer.writerow(['Total Bookings', total_bookings, period])
-                writer.writerow(['Confirmed Bookings', confirmed_bookings, period])
-                writer.writerow(['New Users', new_users, period])
-                writer.writerow(['Review Count', review_count, period])
-                writer.writerow(['Average Rating', float(avg_rating), period])
-
-            except Exception as e:
-                # Fallback if query fails
-                writer.writerow(['Error generating dashboard report', str(e)])
-
-        return response
-
-    except Exception as e:
-        # If any error occurs, return a CSV with error information
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="error_report.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Error Type', 'Error Message'])
-        writer.writerow([type(e).__name__, str(e)])
-        return response
+@staff_member_required
+def export_xlsx(request, report_type):
+    """Export analytics data as an Excel workbook"""
+    if report_type not in REPORTS:
+        raise Http404(_("Unknown report"))
+    start_date, end_date = _export_period(request)
+    return FileResponse(
+        xlsx_file(report_type, start_date, end_date),
+        as_attachment=True,
+        filename=f'{report_type}_report_{timezone.now().strftime("%Y%m%d")}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -4,12 +4,18 @@ from django.urls import reverse
 from django.conf import settings
 from django.utils.text import slugify
 from django.utils import timezone
+from django.core.cache import cache
 from django_ckeditor_5.fields import CKEditor5Field # Updated to use CKEditor5
+from core.counters import increment_counter
 
 # Import related models from the main models module now
 from blog.models.category import Category
 from blog.models.tag import Tag
 
+# How long a visitor is remembered as having already viewed a post
+POST_VIEW_SEEN_TIMEOUT = 60 * 60 * 24
+
+
 class Post(models.Model):
     """Blog post model - Refactored for django-modeltranslation"""
 
@@ -65,8 +71,7 @@ class Post(models.Model):
 
     def increase_view_count(self):
         """Increase post view count by 1 (legacy method)"""
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        increment_counter(Post, self.pk, 'view_count')
 
     def add_view(self, request):
         """Add a unique view to the post based on user or IP address"""
@@ -85,19 +90,25 @@ class Post(models.Model):
                 request.session.save()
             session_key = request.session.session_key
 
+        user = request.user if request.user.is_authenticated else None
+
+        # Repeat visitors were already recorded; skip the lookup entirely
+        seen_key = f'post_view:{self.pk}:{ip_address}:{user.pk if user else session_key}'
+        if not cache.add(seen_key, True, POST_VIEW_SEEN_TIMEOUT):
+            return None
+
         # Try to get an existing view
         view, created = PostView.objects.get_or_create(
             post=self,
             ip_address=ip_address,
-            user=request.user if request.user.is_authenticated else None,
+            user=user,
             session_key=session_key,
             defaults={'viewed_at': timezone.now()}
         )
 
-        # If this is a new view, increment the view count
+        # If this is a new view, increment the view count (buffered)
         if created:
-            self.view_count += 1
-            self.save(update_fields=['view_count'])
+            increment_counter(Post, self.pk, 'view_count')
 
         return view
 
@@ -9,6 +9,8 @@ from django.db import models # Import models for Prefetch
 
 from blog.models import Post, Category, Tag, Comment
 from blog.forms import CommentForm
+from core.pagination import EstimatedCountPaginator
+from core.schema import tables_ready
 
 POSTS_PER_PAGE = 10
 
@@ -18,18 +20,13 @@ class PostListView(ListView):
     template_name = 'blog/post_list_redesign.html' # Using our new redesigned template
     context_object_name = 'posts'
     paginate_by = POSTS_PER_PAGE
+    paginator_class = EstimatedCountPaginator
 
     def get_queryset(self):
         """Check if the blog_post table exists before querying"""
         try:
             # Check if the Post table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM blog_post LIMIT 1")
-                    post_table_exists = True
-                except Exception:
-                    post_table_exists = False
+            post_table_exists = tables_ready(Post)
 
             if not post_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -44,24 +41,16 @@ class PostListView(ListView):
             category_slug = self.kwargs.get('category_slug')
             tag_slug = self.kwargs.get('tag_slug')
             if category_slug:
-                try:
-                    # Check if the Category table exists
-                    cursor.execute("SELECT 1 FROM blog_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
+                # Check if the Category table exists
+                category_table_exists = tables_ready(Category)
 
                 if category_table_exists:
                     category = get_object_or_404(Category, slug=category_slug)
                     queryset = queryset.filter(categories=category)
 
             if tag_slug:
-                try:
-                    # Check if the Tag table exists
-                    cursor.execute("SELECT 1 FROM blog_tag LIMIT 1")
-                    tag_table_exists = True
-                except Exception:
-                    tag_table_exists = False
+                # Check if the Tag table exists
+                tag_table_exists = tables_ready(Tag)
 
                 if tag_table_exists:
                     tag = get_object_or_404(Tag, slug=tag_slug)
@@ -89,19 +78,8 @@ class PostListView(ListView):
 
         try:
             # Check if the Category and Tag tables exist
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM blog_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
-
-                try:
-                    cursor.execute("SELECT 1 FROM blog_tag LIMIT 1")
-                    tag_table_exists = True
-                except Exception:
-                    tag_table_exists = False
+            category_table_exists = tables_ready(Category)
+            tag_table_exists = tables_ready(Tag)
 
             # Only query if tables exist
             if category_table_exists:
@@ -152,13 +130,7 @@ class PostDetailView(FormMixin, DetailView):
         """Check if the blog_post table exists before processing the request"""
         try:
             # Check if the Post table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM blog_post LIMIT 1")
-                    post_table_exists = True
-                except Exception:
-                    post_table_exists = False
+            post_table_exists = tables_ready(Post)
 
             if not post_table_exists:
                 # Redirect to home page if the table doesn't exist
@@ -177,13 +149,7 @@ class PostDetailView(FormMixin, DetailView):
     def get_queryset(self):
         try:
             # Check if the Comment table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM blog_comment LIMIT 1")
-                    comment_table_exists = True
-                except Exception:
-                    comment_table_exists = False
+            comment_table_exists = tables_ready(Comment)
 
             # Ensure we only show published posts, prefetch related data
             # modeltranslation handles fetching the correct language fields
@@ -224,13 +190,7 @@ class PostDetailView(FormMixin, DetailView):
             context['comment_form'] = self.get_form()
 
             # Check if the Category table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM blog_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
+            category_table_exists = tables_ready(Category)
 
             # Add related posts (example: same category)
             if category_table_exists and hasattr(post, 'categories'):
@@ -294,13 +254,7 @@ class PostSearchView(ListView):
         """Check if the blog_post table exists before querying"""
         try:
             # Check if the Post table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM blog_post LIMIT 1")
-                    post_table_exists = True
-                except Exception:
-                    post_table_exists = False
+            post_table_exists = tables_ready(Post)
 
             if not post_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -332,19 +286,8 @@ class PostSearchView(ListView):
 
         try:
             # Check if the Category and Tag tables exist
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM blog_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
-
-                try:
-                    cursor.execute("SELECT 1 FROM blog_tag LIMIT 1")
-                    tag_table_exists = True
-                except Exception:
-                    tag_table_exists = False
+            category_table_exists = tables_ready(Category)
+            tag_table_exists = tables_ready(Tag)
 
             # Only query if tables exist
             if category_table_exists:
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from decimal import Decimal
-from .models import Booking
+from .models import Booking, SeatReservation
 # from .models import Passenger # Uncomment if Passenger model is used
 # from modeltranslation.admin import TranslationAdmin # No longer needed for this admin
 
@@ -44,6 +44,19 @@ class BookingAdmin(admin.ModelAdmin): # Reverted to standard ModelAdmin
     # If using Passenger model:
     # inlines = [PassengerInline] # Define PassengerInline below
 
+
+@admin.register(SeatReservation)
+class SeatReservationAdmin(admin.ModelAdmin):
+    # Read-only: seats are only moved through booking.inventory
+    list_display = ('id', 'tour_date', 'booking', 'seats', 'status', 'expires_at', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('tour_date__tour', 'booking')
+    raw_id_fields = ('tour_date', 'booking')
+    readonly_fields = ('tour_date', 'booking', 'seats', 'status', 'expires_at', 'released_at', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
 # Uncomment and define if Passenger model is used
 # class PassengerInline(admin.TabularInline):
 #     model = Passenger
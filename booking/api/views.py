@@ -1,7 +1,12 @@
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from booking.inventory import SeatsUnavailable, hold_seats_for_booking
 from booking.models import Booking
+from tour.api.pagination import BookingCursorPagination
 from .serializers import BookingSerializer
 # from .permissions import IsOwnerOrReadOnly # Custom permission if needed
 
@@ -12,25 +17,33 @@ class BookingViewSet(viewsets.ModelViewSet):
     """
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated] # Only authenticated users can access
+    pagination_class = BookingCursorPagination
 
     def get_queryset(self):
         """
         This view should return a list of all the bookings
         for the currently authenticated user.
         """
-        # user = self.request.user
-        # return Booking.objects.filter(user=user)
-        # Placeholder until user relation is added and permissions refined
-        return Booking.objects.all()
+        user = self.request.user
+        queryset = Booking.objects.all()
+        if user.is_staff:
+            return queryset
+        # Served by the (user, -created_at) index, also for cursor pages
+        return queryset.filter(user=user)
 
     def perform_create(self, serializer):
         """
         Associate the booking with the requesting user upon creation.
         Calculate price or perform other actions.
         """
-        # serializer.save(user=self.request.user)
         # Add price calculation logic here if needed
-        serializer.save() # Placeholder
+        # The booking is only kept if its seats could be held
+        try:
+            with transaction.atomic():
+                booking = serializer.save(user=self.request.user)
+                hold_seats_for_booking(booking)
+        except SeatsUnavailable:
+            raise ValidationError({'start_date': _('Not enough seats are left on this date.')})
 
     # Example custom action to confirm a booking (adjust logic as needed)
     # @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser]) # Example: Only admin can confirm
@@ -9,3 +9,4 @@ class BookingConfig(AppConfig):
     def ready(self):
         # Import translation options here to ensure they are registered
         import booking.translation
+        import booking.signals
@@ -0,0 +1,253 @@
+"""
+Seat inventory for tour dates.
+
+``TourDate.available_seats`` is the single source of truth for free seats.
+Seats are only ever taken with a conditional ``UPDATE ... SET available_seats
+= available_seats - n WHERE available_seats >= n``, so concurrent checkouts
+for the same date serialize on that row and can never overbook it, without
+locking anything for longer than one statement.
+
+Every successful take is recorded as a ``SeatReservation``:
+
+* a new booking *holds* its seats for ``SEAT_HOLD_TTL`` seconds,
+* confirming the booking *commits* the hold (``booking.signals``),
+* changing the booking's date or party size *moves* the reservation,
+* cancelling or deleting the booking, or the hold expiring, *releases* the
+  seats again. Expired holds are released in bulk by
+  ``python manage.py release_expired_holds``; a date that looks sold out
+  releases its own expired holds first, so their seats are never lost
+  while the sweeper is not running.
+
+Bookings on a start date for which the tour has no active ``TourDate`` are
+not tracked, as before.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+from django.utils import timezone
+
+from tour.models import TourDate
+from .models import SeatReservation
+
+logger = logging.getLogger(__name__)
+
+# Expired holds released per transaction by the sweeper
+SWEEP_BATCH_SIZE = 500
+
+
+class SeatsUnavailable(Exception):
+    """The tour date does not have enough free seats."""
+
+
+def hold_ttl():
+    return timedelta(seconds=getattr(settings, 'SEAT_HOLD_TTL', 60 * 15))
+
+
+def find_tour_date(tour_id, start_date):
+    """ID of the active ``TourDate`` of a tour starting on ``start_date``, or None."""
+    return (
+        TourDate.objects.filter(tour_id=tour_id, start_date=start_date, is_active=True)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+        .first()
+    )
+
+
+def take_seats(tour_date_id, seats):
+    """Take ``seats`` from a tour date if that many are free. Returns True on success."""
+    return TourDate.objects.filter(
+        pk=tour_date_id, available_seats__gte=seats
+    ).update(available_seats=F('available_seats') - seats) == 1
+
+
+def _return_seats(totals):
+    """Give ``{tour_date_id: seats}`` back with a single UPDATE."""
+    if not totals:
+        return
+    TourDate.objects.filter(pk__in=list(totals)).update(
+        available_seats=F('available_seats') + Case(
+            *[When(pk=pk, then=seats) for pk, seats in totals.items()],
+            default=0,
+            output_field=IntegerField()
+        )
+    )
+
+
+def hold_seats(tour_date_id, seats, booking=None, ttl=None, status=SeatReservation.STATUS_HELD):
+    """
+    Take ``seats`` from a tour date and record the reservation.
+
+    Held reservations expire after ``ttl`` (default ``SEAT_HOLD_TTL``).
+    Raises ``SeatsUnavailable`` if the date does not have enough free seats.
+    """
+    expires_at = None
+    if status == SeatReservation.STATUS_HELD:
+        expires_at = timezone.now() + (ttl or hold_ttl())
+    # The UPDATE comes first so the transaction takes the write lock right away
+    with transaction.atomic():
+        if not take_seats(tour_date_id, seats):
+            if not (release_expired_holds(tour_date_id=tour_date_id) and take_seats(tour_date_id, seats)):
+                raise SeatsUnavailable(f"Not enough free seats on tour date {tour_date_id}")
+        return SeatReservation.objects.create(
+            tour_date_id=tour_date_id,
+            booking=booking,
+            seats=seats,
+            status=status,
+            expires_at=expires_at,
+        )
+
+
+def hold_seats_for_booking(booking, ttl=None):
+    """
+    Hold the seats of a saved booking on its tour date.
+
+    Call it in the transaction that saves the booking, so the booking is
+    rolled back when ``SeatsUnavailable`` is raised. Returns the reservation,
+    or None if the tour has no date on the booking's start date.
+    """
+    tour_date_id = find_tour_date(booking.tour_id, booking.start_date)
+    if tour_date_id is None:
+        return None
+    return hold_seats(tour_date_id, booking.seat_count, booking=booking, ttl=ttl)
+
+
+def ensure_hold(booking, ttl=None):
+    """
+    Make sure a pending booking still holds its seats, e.g. before payment.
+
+    Extends an active hold, or takes the seats again if the hold was already
+    released. Raises ``SeatsUnavailable`` if they are gone.
+    """
+    extended = SeatReservation.objects.filter(
+        booking=booking, status=SeatReservation.STATUS_HELD
+    ).update(expires_at=timezone.now() + (ttl or hold_ttl()))
+    if extended or booking.seat_reservations.filter(status=SeatReservation.STATUS_COMMITTED).exists():
+        return
+    hold_seats_for_booking(booking, ttl)
+
+
+def commit_seats(booking):
+    """
+    Make the booking's reservation permanent once it is confirmed.
+
+    If the hold expired in the meantime the seats are taken again. Returns
+    False (and logs an error) if the date sold out before that.
+    """
+    committed = SeatReservation.objects.filter(
+        booking=booking, status=SeatReservation.STATUS_HELD
+    ).update(status=SeatReservation.STATUS_COMMITTED, expires_at=None)
+    if committed or booking.seat_reservations.filter(status=SeatReservation.STATUS_COMMITTED).exists():
+        return True
+
+    tour_date_id = find_tour_date(booking.tour_id, booking.start_date)
+    if tour_date_id is None:
+        return True
+    try:
+        hold_seats(tour_date_id, booking.seat_count, booking=booking,
+                   status=SeatReservation.STATUS_COMMITTED)
+        return True
+    except SeatsUnavailable:
+        logger.error(f"Booking {booking.pk} was confirmed but tour date {tour_date_id} is sold out")
+        return False
+
+
+def commit_seats_for_bookings(bookings):
+    """
+    ``commit_seats`` for many confirmed bookings: one UPDATE commits their
+    holds, and only bookings left without a committed reservation take
+    their seats one by one.
+    """
+    pks = [booking.pk for booking in bookings]
+    if not pks:
+        return
+    SeatReservation.objects.filter(
+        booking_id__in=pks, status=SeatReservation.STATUS_HELD
+    ).update(status=SeatReservation.STATUS_COMMITTED, expires_at=None)
+    committed = set(SeatReservation.objects.filter(
+        booking_id__in=pks, status=SeatReservation.STATUS_COMMITTED
+    ).values_list('booking_id', flat=True))
+    for booking in bookings:
+        if booking.pk not in committed:
+            commit_seats(booking)
+
+
+def _release(pks, statuses, **conditions):
+    """
+    Release the reservations among ``pks`` that are still in ``statuses`` and
+    give their seats back. Returns the number of reservations released.
+    """
+    if not pks:
+        return 0
+    marker = timezone.now()
+    with transaction.atomic():
+        released = SeatReservation.objects.filter(
+            pk__in=pks, status__in=statuses, **conditions
+        ).update(status=SeatReservation.STATUS_RELEASED, released_at=marker)
+        if not released:
+            return 0
+        # Only the rows flipped above carry this marker
+        totals = defaultdict(int)
+        rows = SeatReservation.objects.filter(pk__in=pks, released_at=marker).values_list('tour_date_id', 'seats')
+        for tour_date_id, seats in rows:
+            totals[tour_date_id] += seats
+        _return_seats(totals)
+    return released
+
+
+def release_seats(booking):
+    """Give back the seats held or committed for a booking (cancellation)."""
+    pks = list(booking.seat_reservations.exclude(
+        status=SeatReservation.STATUS_RELEASED
+    ).values_list('pk', flat=True))
+    return _release(pks, [SeatReservation.STATUS_HELD, SeatReservation.STATUS_COMMITTED])
+
+
+def move_seats(booking, ttl=None):
+    """
+    Reserve a booking's seats again after its start date or party size
+    changed: the current reservation is released and the seats taken on the
+    (new) date, so a larger party cannot skip the seat check.
+
+    Call it in the transaction that saves the booking; ``SeatsUnavailable``
+    rolls both back. A committed reservation stays committed, a hold gets a
+    new ``ttl``. Bookings without an active reservation are left alone;
+    ``ensure_hold`` takes their seats before payment. Returns the new
+    reservation, or None.
+    """
+    active = list(booking.seat_reservations.exclude(
+        status=SeatReservation.STATUS_RELEASED
+    ).values_list('status', flat=True))
+    if not active:
+        return None
+    status = (
+        SeatReservation.STATUS_COMMITTED if SeatReservation.STATUS_COMMITTED in active
+        else SeatReservation.STATUS_HELD
+    )
+    with transaction.atomic():
+        release_seats(booking)
+        tour_date_id = find_tour_date(booking.tour_id, booking.start_date)
+        if tour_date_id is None:
+            return None
+        return hold_seats(tour_date_id, booking.seat_count, booking=booking, ttl=ttl, status=status)
+
+
+def release_expired_holds(now=None, batch_size=SWEEP_BATCH_SIZE, tour_date_id=None):
+    """
+    Release every hold that expired before ``now``, or only those on
+    ``tour_date_id``. Returns the number released.
+    """
+    now = now or timezone.now()
+    expired = SeatReservation.objects.filter(status=SeatReservation.STATUS_HELD, expires_at__lt=now)
+    if tour_date_id is not None:
+        expired = expired.filter(tour_date_id=tour_date_id)
+    released = 0
+    while True:
+        pks = list(expired.order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        # Holds extended meanwhile no longer match expires_at__lt
+        released += _release(pks, [SeatReservation.STATUS_HELD], expires_at__lt=now)
+        if len(pks) < batch_size:
+            return released
@@ -0,0 +1,135 @@
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from booking.inventory import SeatsUnavailable, hold_seats, release_expired_holds
+from booking.models import SeatReservation
+from tour.models import Tour, TourDate
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent checkouts against a single tour date and check that the '
+        'seat inventory never oversells it, compared with a read-then-write update'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=200,
+                            help='Concurrent checkouts, one thread each')
+        parser.add_argument('--capacity', type=int, default=50,
+                            help='Seats on the benchmark tour date')
+        parser.add_argument('--party-size', type=int, default=2,
+                            help='Seats taken by each checkout')
+
+    def handle(self, *args, **options):
+        tour = Tour.objects.order_by('pk').first()
+        if tour is None:
+            raise CommandError('No tours found; create some tours first')
+
+        capacity = options['capacity']
+        party_size = options['party_size']
+        # A far-future date nobody books; removed again with its reservations
+        tour_date = TourDate.objects.create(
+            tour=tour,
+            start_date=date(2999, 1, 1),
+            end_date=date(2999, 1, 1) + timedelta(days=tour.duration_days),
+            available_seats=capacity,
+        )
+        try:
+            naive = self.run(options['checkouts'], lambda: self.naive_checkout(tour_date.pk, party_size))
+            sold_naive = naive['succeeded'] * party_size
+            self.report('Read-then-write', naive, capacity, sold_naive)
+
+            TourDate.objects.filter(pk=tour_date.pk).update(available_seats=capacity)
+            inventory = self.run(
+                options['checkouts'], lambda: self.inventory_checkout(tour_date.pk, party_size)
+            )
+            held = SeatReservation.objects.filter(tour_date=tour_date).aggregate(seats=Sum('seats'))['seats'] or 0
+            self.report('Conditional UPDATE', inventory, capacity, held)
+
+            tour_date.refresh_from_db()
+            consistent = tour_date.available_seats + held == capacity and held <= capacity
+            style = self.style.SUCCESS if consistent else self.style.ERROR
+            self.stdout.write(style(
+                f'  inventory check: {held} seats held + {tour_date.available_seats} free '
+                f'= {held + tour_date.available_seats} (capacity {capacity})'
+            ))
+
+            # Expire every hold and sweep them in bulk
+            SeatReservation.objects.filter(tour_date=tour_date).update(
+                expires_at=timezone.now() - timedelta(seconds=1)
+            )
+            started = time.perf_counter()
+            released = release_expired_holds()
+            elapsed = (time.perf_counter() - started) * 1000
+            tour_date.refresh_from_db()
+            self.stdout.write(
+                f'Sweeper: released {released} expired holds in {elapsed:.1f} ms, '
+                f'{tour_date.available_seats}/{capacity} seats free again'
+            )
+        finally:
+            tour_date.delete()
+
+    @staticmethod
+    def naive_checkout(tour_date_id, seats):
+        # Check availability, then write the new value: concurrent checkouts
+        # read the same count and overwrite each other's decrements
+        available = TourDate.objects.values_list('available_seats', flat=True).get(pk=tour_date_id)
+        if available < seats:
+            return False
+        time.sleep(0.001)
+        TourDate.objects.filter(pk=tour_date_id).update(available_seats=available - seats)
+        return True
+
+    @staticmethod
+    def inventory_checkout(tour_date_id, seats):
+        try:
+            hold_seats(tour_date_id, seats)
+            return True
+        except SeatsUnavailable:
+            return False
+
+    def run(self, checkouts, checkout):
+        barrier = threading.Barrier(checkouts)
+        lock = threading.Lock()
+        result = {'succeeded': 0, 'rejected': 0, 'errors': 0, 'latencies': []}
+
+        def worker():
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                outcome = 'succeeded' if checkout() else 'rejected'
+            except Exception:
+                outcome = 'errors'
+            finally:
+                connection.close()
+            with lock:
+                result[outcome] += 1
+                result['latencies'].append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=worker) for _ in range(checkouts)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result['elapsed'] = time.perf_counter() - started
+        return result
+
+    def report(self, label, result, capacity, sold):
+        latencies = sorted(result['latencies'])
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        oversold = max(sold - capacity, 0)
+        style = self.style.ERROR if oversold else self.style.SUCCESS
+        self.stdout.write(
+            f'{label}: {result["succeeded"]} succeeded, {result["rejected"]} sold out, '
+            f'{result["errors"]} errors in {result["elapsed"]:.2f}s '
+            f'(p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms)'
+        )
+        self.stdout.write(style(f'  {sold} seats sold for a capacity of {capacity}, {oversold} oversold'))
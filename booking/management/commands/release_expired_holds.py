@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from booking.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Release the seats of booking holds that expired before payment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and sweep every --interval seconds')
+        parser.add_argument('--interval', type=float,
+                            default=getattr(settings, 'SEAT_HOLD_SWEEP_INTERVAL', 60),
+                            help='Seconds between sweeps with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                close_old_connections()
+                released = release_expired_holds()
+                if released or not options['loop']:
+                    self.stdout.write(f'Released {released} expired seat holds')
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Error releasing expired holds: {e}'))
+                if not options['loop']:
+                    raise
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
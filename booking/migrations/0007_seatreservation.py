@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 03:33
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_alter_booking_options_booking_booking_reference_and_more'),
+        ('tour', '0009_tourdate_availability_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('held', 'Held'), ('committed', 'Committed'), ('released', 'Released')], default='held', max_length=10)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seat_reservations', to='booking.booking')),
+                ('tour_date', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_reservations', to='tour.tourdate')),
+            ],
+            options={
+                'verbose_name': 'Seat Reservation',
+                'verbose_name_plural': 'Seat Reservations',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='booking_sea_status_b44c01_idx')],
+            },
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.core.validators import MinValueValidator
 from decimal import Decimal
 # Assuming 'tour' app has a 'Tour' model and 'users' app has 'CustomUser'
 from tour.models import Tour # Uncommented
+from tour.pricing import quote
 from users.models import CustomUser # Uncommented
 
 class Booking(models.Model):
@@ -73,53 +74,98 @@ class Booking(models.Model):
     def __str__(self):
         return f"{self.booking_reference or f'BK-{self.id:06d}'} - {self.user.get_full_name() or self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so booking.signals can react to changes
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    @property
+    def seat_count(self):
+        return self.num_adults + (self.num_children or 0)
+
     def save(self, *args, **kwargs):
         # Calculate prices if not set
         if not self.subtotal or not self.total_price:
             self.calculate_price()
 
-        # First save to get an ID if this is a new booking
-        super().save(*args, **kwargs)
+        # Assign the booking reference before the insert, so a new booking is
+        # a single INSERT (see booking.references)
+        if not self.booking_reference and kwargs.get('update_fields') is None:
+            from .references import next_booking_reference
+            self.booking_reference = next_booking_reference(using=kwargs.get('using'))
 
-        # Generate booking reference if not set
-        if not self.booking_reference:
-            self.booking_reference = f"BK-{self.id:06d}"
-            # Save again to store the booking reference
-            super().save(update_fields=['booking_reference'])
+        super().save(*args, **kwargs)
 
     def calculate_price(self):
         """Calculate booking prices based on tour prices and number of participants"""
         if not self.tour:
             return Decimal('0.00'), Decimal('0.00'), Decimal('0.00')
 
-        # Get prices
-        regular_price = self.tour.price
-        discounted_price = self.tour.discount_price if self.tour.has_discount else regular_price
-        child_price = discounted_price * Decimal('0.5')  # Children at half price
+        price = quote(self.tour, self.num_adults, self.num_children)
+
+        # Update instance attributes
+        self.subtotal = price.subtotal
+        self.discount_amount = price.discount_amount
+        self.total_price = price.total_price
+
+        return price.subtotal, price.discount_amount, price.total_price
+
+class SeatReservation(models.Model):
+    """
+    Seats taken from a ``TourDate`` for a booking (see ``booking.inventory``).
+
+    A reservation starts out ``held`` until ``expires_at``, becomes
+    ``committed`` once the booking is confirmed, and ``released`` when the
+    hold expires or the booking is cancelled, which returns its seats.
+    """
+    STATUS_HELD = 'held'
+    STATUS_COMMITTED = 'committed'
+    STATUS_RELEASED = 'released'
+    STATUS_CHOICES = (
+        (STATUS_HELD, _('Held')),
+        (STATUS_COMMITTED, _('Committed')),
+        (STATUS_RELEASED, _('Released')),
+    )
+
+    tour_date = models.ForeignKey('tour.TourDate', on_delete=models.CASCADE, related_name='seat_reservations')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='seat_reservations')
+    seats = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_HELD)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    released_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Seat Reservation')
+        verbose_name_plural = _('Seat Reservations')
+        indexes = [
+            # The sweeper looks up expired holds
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.seats} seats on {self.tour_date} ({self.get_status_display()})"
 
-        # Calculate subtotal (based on regular price)
-        adult_subtotal = regular_price * self.num_adults
-        child_subtotal = regular_price * Decimal('0.5') * (self.num_children or 0)
-        subtotal = adult_subtotal + child_subtotal
 
-        # Calculate discount
-        discount_amount = Decimal('0.00')
-        if self.tour.has_discount:
-            discount_per_adult = regular_price - discounted_price
-            discount_per_child = discount_per_adult * Decimal('0.5')
-            discount_amount = (discount_per_adult * self.num_adults) + \
-                            (discount_per_child * (self.num_children or 0))
+class ReferenceSequence(models.Model):
+    """
+    Next unallocated number of a reference sequence (see ``booking.references``).
 
-        # Calculate total price
-        total_price = (discounted_price * self.num_adults) + \
-                     (child_price * (self.num_children or 0))
+    Workers reserve numbers in blocks by advancing ``next_value``.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
 
-        # Update instance attributes
-        self.subtotal = subtotal
-        self.discount_amount = discount_amount
-        self.total_price = total_price
+    class Meta:
+        verbose_name = _('Reference Sequence')
+        verbose_name_plural = _('Reference Sequences')
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
 
-        return subtotal, discount_amount, total_price
 
 # Add related models if needed, e.g., Passenger details
 # class Passenger(models.Model):
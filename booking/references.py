@@ -0,0 +1,90 @@
+"""
+Booking reference numbers (``BK-000123``) assigned before the booking is
+inserted.
+
+Numbers come from a ``ReferenceSequence`` row using a hi-lo scheme: a worker
+reserves a block of ``BOOKING_REFERENCE_BLOCK_SIZE`` numbers by advancing the
+row with one ``UPDATE``, then hands them out from memory, so the sequence
+costs two queries per block instead of a second write per booking.
+
+A block is only kept for later bookings once the transaction that reserved
+it has committed. If that transaction rolls back, the row goes back to its
+old value and the rest of the block is dropped. Numbers are therefore never
+issued twice across workers. They are not gap-free, and bookings from
+different workers are not numbered in creation order.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max
+
+from .models import Booking, ReferenceSequence
+
+SEQUENCE_NAME = 'booking_reference'
+REFERENCE_FORMAT = 'BK-{:06d}'
+
+_lock = threading.Lock()
+# Committed, unused numbers of this process per database alias
+_pools = {}
+
+
+def block_size():
+    return max(getattr(settings, 'BOOKING_REFERENCE_BLOCK_SIZE', 20), 1)
+
+
+def format_reference(number):
+    return REFERENCE_FORMAT.format(number)
+
+
+def initial_value(using=DEFAULT_DB_ALIAS):
+    """First number of a new sequence: past every booking ID and reference already issued."""
+    numbers = [Booking.objects.using(using).aggregate(Max('pk'))['pk__max'] or 0]
+    references = Booking.objects.using(using).filter(
+        booking_reference__startswith='BK-'
+    ).values_list('booking_reference', flat=True)
+    numbers.extend(
+        int(reference[3:]) for reference in references.iterator() if re.fullmatch(r'BK-\d+', reference)
+    )
+    return max(numbers) + 1
+
+
+def _reserve_block(size, using):
+    """Advance the sequence by ``size``; returns the reserved ``range``."""
+    sequences = ReferenceSequence.objects.using(using).filter(name=SEQUENCE_NAME)
+    with transaction.atomic(using=using):
+        if not sequences.update(next_value=F('next_value') + size):
+            try:
+                with transaction.atomic(using=using):
+                    ReferenceSequence.objects.using(using).create(
+                        name=SEQUENCE_NAME, next_value=initial_value(using)
+                    )
+            except IntegrityError:
+                # Another worker created it first
+                pass
+            sequences.update(next_value=F('next_value') + size)
+        # Read back in the same transaction, which holds the row
+        end = sequences.values_list('next_value', flat=True).get()
+    return range(end - size, end)
+
+
+def _release_block(numbers, using):
+    with _lock:
+        _pools.setdefault(using, []).extend(numbers)
+
+
+def next_booking_reference(using=None):
+    """A booking reference that has never been issued before."""
+    using = using or DEFAULT_DB_ALIAS
+    with _lock:
+        pool = _pools.setdefault(using, [])
+        if pool:
+            return format_reference(pool.pop(0))
+
+    block = _reserve_block(block_size(), using)
+    rest = list(block[1:])
+    if rest:
+        # Runs right away outside a transaction, and is dropped on rollback
+        transaction.on_commit(lambda: _release_block(rest, using), using=using)
+    return format_reference(block[0])
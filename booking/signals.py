@@ -0,0 +1,41 @@
+"""
+Signal handlers that keep the seat inventory in step with booking status.
+"""
+import logging
+
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Booking
+from .inventory import commit_seats, release_seats
+
+logger = logging.getLogger(__name__)
+
+CONFIRMED_STATUSES = ('confirmed', 'completed')
+
+
+@receiver(post_save, sender=Booking, dispatch_uid='booking.inventory.booking_saved')
+def booking_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    # Only status changes touch the inventory
+    if instance.status == previous:
+        return
+    try:
+        if instance.status in CONFIRMED_STATUSES:
+            commit_seats(instance)
+        elif instance.status == 'cancelled':
+            release_seats(instance)
+    except Exception as e:
+        logger.error(f"Error updating seat inventory for booking {instance.pk}: {e}")
+
+
+@receiver(pre_delete, sender=Booking, dispatch_uid='booking.inventory.booking_deleting')
+def booking_deleting(sender, instance, **kwargs):
+    # The reservations are cascaded away with the booking, return their seats first
+    try:
+        release_seats(instance)
+    except Exception as e:
+        logger.error(f"Error releasing seats of deleted booking {instance.pk}: {e}")
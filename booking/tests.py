@@ -0,0 +1,50 @@
+import datetime
+
+from django.test import TestCase
+
+from tour.models import Destination, Tour, TourDate
+from .inventory import SeatsUnavailable, hold_seats
+from .models import SeatReservation
+
+
+class ExpiredHoldTests(TestCase):
+    """A date releases its own expired holds before it counts as sold out."""
+
+    @classmethod
+    def setUpTestData(cls):
+        destination = Destination.objects.create(
+            name='Luxor', description='Temples', cover_image='destinations/luxor.jpg',
+            country='Egypt', city='Luxor',
+        )
+        tour = Tour.objects.create(
+            name='Valley of the Kings', description='Tombs', short_description='Tombs',
+            destination=destination, duration_days=1, duration_nights=0, price=60,
+            max_people=4, cover_image='tours/valley.jpg',
+        )
+        start = datetime.date.today() + datetime.timedelta(days=7)
+        cls.tour_date = TourDate.objects.create(tour=tour, start_date=start, end_date=start, available_seats=4)
+        cls.other_date = TourDate.objects.create(
+            tour=tour, start_date=start + datetime.timedelta(days=1),
+            end_date=start + datetime.timedelta(days=1), available_seats=4,
+        )
+
+    def test_expired_hold_released_when_sold_out(self):
+        expired = hold_seats(self.tour_date.pk, 4, ttl=datetime.timedelta(seconds=-1))
+        other = hold_seats(self.other_date.pk, 2, ttl=datetime.timedelta(seconds=-1))
+        reservation = hold_seats(self.tour_date.pk, 3)
+
+        self.assertEqual(reservation.status, SeatReservation.STATUS_HELD)
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, SeatReservation.STATUS_RELEASED)
+        self.tour_date.refresh_from_db()
+        self.assertEqual(self.tour_date.available_seats, 1)
+        # Other dates are left to the sweeper
+        other.refresh_from_db()
+        self.assertEqual(other.status, SeatReservation.STATUS_HELD)
+
+    def test_active_holds_kept(self):
+        hold_seats(self.tour_date.pk, 4)
+        with self.assertRaises(SeatsUnavailable):
+            hold_seats(self.tour_date.pk, 1)
+        self.tour_date.refresh_from_db()
+        self.assertEqual(self.tour_date.available_seats, 0)
@@ -9,6 +9,7 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
 from decimal import Decimal
 import json
 import uuid
@@ -19,7 +20,11 @@ from datetime import datetime, date, timedelta
 
 from .models import Booking
 from .forms import BookingForm
+from .inventory import SeatsUnavailable, ensure_hold, hold_seats_for_booking, move_seats
+from .references import next_booking_reference
 from tour.models import Tour
+from tour.pricing import quote
+from core.idempotency import idempotent
 from payments.models import Payment
 from payments.paypal import PayPalClient
 
@@ -74,6 +79,11 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
         initial['num_adults'] = participants
         return initial
 
+    def get_tour(self):
+        if not hasattr(self, '_tour'):
+            self._tour = get_object_or_404(Tour.objects.select_related('destination'), pk=self.kwargs.get('tour_id'))
+        return self._tour
+
     def form_valid(self, form):
         # Assign the logged-in user to the booking
         form.instance.user = self.request.user
@@ -84,39 +94,30 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
             messages.error(self.request, _("Tour information is missing."))
             return self.form_invalid(form)
 
-        tour = get_object_or_404(Tour, pk=tour_id)
+        tour = self.get_tour()
         form.instance.tour = tour
 
         # Calculate prices
-        num_adults = form.cleaned_data.get('num_adults', 1)
-        num_children = form.cleaned_data.get('num_children', 0)
-
-        # Calculate using tour prices
-        regular_price = tour.price
-        discounted_price = tour.discount_price if tour.has_discount else tour.price
-
-        # Calculate subtotal (based on regular price)
-        adult_subtotal = regular_price * num_adults
-        child_subtotal = regular_price * Decimal('0.5') * num_children
-        subtotal = adult_subtotal + child_subtotal
-
-        # Calculate discount if applicable
-        discount_amount = 0
-        if tour.has_discount:
-            discount_per_adult = regular_price - discounted_price
-            discount_per_child = discount_per_adult * Decimal('0.5')
-            discount_amount = (discount_per_adult * num_adults) + (discount_per_child * num_children)
-
-        # Calculate total price
-        total_price = subtotal - discount_amount
+        price = quote(tour, form.cleaned_data.get('num_adults', 1), form.cleaned_data.get('num_children', 0))
+        total_price = price.total_price
 
         # Set the calculated values
-        form.instance.subtotal = subtotal
-        form.instance.discount_amount = discount_amount
+        form.instance.subtotal = price.subtotal
+        form.instance.discount_amount = price.discount_amount
         form.instance.total_price = total_price
 
-        # Save the booking
-        self.object = form.save()
+        # Save the booking and hold its seats; nothing is saved if the date is sold out
+        try:
+            with transaction.atomic():
+                self.object = form.save()
+                hold_seats_for_booking(self.object)
+        except SeatsUnavailable:
+            form.instance.pk = None
+            error = _("Not enough seats are left on this date.")
+            if self.request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'success': False, 'error': str(error)}, status=409)
+            form.add_error('start_date', error)
+            return self.form_invalid(form)
 
         # For AJAX requests (from the booking form)
         if self.request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -137,11 +138,9 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
         tour_id = self.kwargs.get('tour_id')
 
         if tour_id:
-            tour = get_object_or_404(Tour, pk=tour_id)
+            tour = self.get_tour()
             context['tour'] = tour
             context['tour_name'] = tour.name
-            context['tour_price'] = float(tour.price)
-            context['tour_discount_price'] = float(tour.discount_price) if tour.has_discount else float(tour.price)
             context['tour_has_discount'] = tour.has_discount
             context['tour_destination'] = str(tour.destination)
             context['tour_duration_days'] = tour.duration_days
@@ -187,42 +186,14 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
             # Add today's date for date picker
             context['today'] = date.today()
 
-            # Calculate child price (half of adult price)
-            context['child_price'] = float(tour.discount_price) * 0.5 if tour.has_discount else float(tour.price) * 0.5
-
-            # Calculate discount amount for display
+            # Per-person prices for the form's price calculator
+            price = quote(tour, participants)
+            context['tour_price'] = float(price.regular_price)
+            context['tour_discount_price'] = float(price.adult_price)
+            context['child_price'] = float(price.child_price)
             if tour.has_discount:
-                # Get participants count from query parameters
-                participants = self.request.GET.get('participants', '1')
-                try:
-                    participants = int(participants)
-                    if participants < 1:
-                        participants = 1
-                except (ValueError, TypeError):
-                    participants = 1
-
-                # Calculate discount percentage
-                discount_percentage = tour.discount_percentage
-
-                # Calculate discount per person using the percentage
-                discount_per_person = float(tour.price) * (discount_percentage / 100)
-
-                # Calculate total discount for all participants
-                total_discount = discount_per_person * participants
-
-                # Log detailed discount calculation
-                print('Discount calculation in BookingCreateView:', {
-                    'tour_price': float(tour.price),
-                    'discount_percentage': discount_percentage,
-                    'discount_per_person': discount_per_person,
-                    'participants': participants,
-                    'total_discount': total_discount
-                })
-
-                # Store both the per-person discount and total discount
-                context['discount_per_person'] = discount_per_person
-                context['discount_amount'] = total_discount
-                context['initial_participants'] = participants
+                context['discount_per_person'] = float(price.regular_price - price.adult_price)
+                context['discount_amount'] = float(price.tour_discount)
 
         return context
 
@@ -277,35 +248,19 @@ class BookingUpdateView(LoginRequiredMixin, UpdateView):
                 default_end_date = default_start_date + timedelta(days=tour_duration_days)
 
                 # Calculate prices
-                adult_price = tour_discount_price if tour_has_discount else tour_price
-                child_price = adult_price * Decimal('0.5')  # Children at half price
-
-                adult_amount = adult_price * num_adults
-                child_amount = child_price * num_children
-
-                # Calculate subtotal (based on regular price)
-                adult_subtotal = tour_price * num_adults
-                child_subtotal = tour_price * Decimal('0.5') * num_children
-                subtotal = adult_subtotal + child_subtotal
-
-                # Calculate discount if applicable
-                discount_amount = Decimal('0')
-                if tour_has_discount and tour_discount_price is not None:
-                    discount_per_adult = tour_price - tour_discount_price
-                    discount_per_child = discount_per_adult * Decimal('0.5')
-                    discount_amount = (discount_per_adult * num_adults) + (discount_per_child * num_children)
-
-                # Calculate total price
-                total_price = subtotal - discount_amount
+                price = quote(tour, num_adults, num_children)
+                adult_amount = price.adult_amount
+                child_amount = price.child_amount
+                child_price = price.child_price
+                subtotal = price.subtotal
+                discount_amount = price.discount_amount
+                total_price = price.total_price
 
                 # Get tour destination name safely
                 tour_destination = tour.destination.name if hasattr(tour, 'destination') and tour.destination else 'N/A'
 
                 # Calculate discount percentage if applicable
-                tour_discount_percent = None
-                if tour_has_discount and tour_price > 0:
-                    discount_diff = tour_price - tour_discount_price
-                    tour_discount_percent = int((discount_diff / tour_price) * 100)
+                tour_discount_percent = price.discount_percentage if tour_has_discount else None
 
                 # Add to context
                 context.update({
@@ -420,10 +375,33 @@ class BookingUpdateView(LoginRequiredMixin, UpdateView):
         return Booking.objects.filter(user=self.request.user)
         # Placeholder removed
 
+    # Fields that change how many seats the booking needs, and on which date
+    SEAT_FIELDS = {'start_date', 'num_adults', 'num_children'}
+
     def form_valid(self, form):
-        # Recalculate price if relevant fields changed?
+        if not self.SEAT_FIELDS & set(form.changed_data):
+            messages.success(self.request, _("Booking updated successfully."))
+            return super().form_valid(form)
+
+        # Reprice the new party and move its seats; nothing is saved if the date is sold out
+        booking = form.instance
+        price = quote(booking.tour, booking.num_adults, booking.num_children)
+        booking.subtotal = price.subtotal
+        booking.discount_amount = price.discount_amount
+        booking.total_price = price.total_price
+        try:
+            with transaction.atomic():
+                self.object = form.save()
+                move_seats(self.object)
+        except SeatsUnavailable:
+            error = _("Not enough seats are left on this date.")
+            if self.request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'success': False, 'error': str(error)}, status=409)
+            form.add_error('start_date', error)
+            return self.form_invalid(form)
+
         messages.success(self.request, _("Booking updated successfully."))
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -436,14 +414,11 @@ class BookingUpdateView(LoginRequiredMixin, UpdateView):
         num_adults = booking.num_adults
         num_children = booking.num_children
 
-        # Get prices
-        regular_price = tour.price
-        discounted_price = tour.discount_price if tour.has_discount else tour.price
-        child_price = discounted_price * Decimal('0.5')  # Children at half price
-
-        # Calculate amounts
-        adult_amount = discounted_price * num_adults
-        child_amount = discounted_price * Decimal('0.5') * num_children
+        # Per-person prices and amounts
+        price = quote(tour, num_adults, num_children)
+        child_price = price.child_price
+        adult_amount = price.adult_amount
+        child_amount = price.child_amount
 
         # Get subtotal, discount, and total from booking
         subtotal = booking.subtotal
@@ -451,7 +426,7 @@ class BookingUpdateView(LoginRequiredMixin, UpdateView):
         total_price = booking.total_price
 
         # Generate a booking number if not already set
-        booking_number = f"BK-{booking.id:06d}"
+        booking_number = booking.booking_reference or f"BK-{booking.id:06d}"
 
         # Add to context
         context['num_adults'] = num_adults
@@ -560,37 +535,30 @@ def booking_confirmation_steps(request, pk):
         num_adults = booking.num_adults
         num_children = booking.num_children or 0
 
-        # Get prices
-        regular_price = tour.price
-        discounted_price = tour.discount_price if tour.has_discount else tour.price
-        child_price = discounted_price * Decimal('0.5')  # Children at half price
-
-        # Calculate amounts
-        adult_amount = discounted_price * num_adults
-        child_amount = child_price * num_children if num_children else Decimal('0')
+        price = quote(tour, num_adults, num_children)
+        regular_price = price.regular_price
+        discounted_price = price.adult_price
+        child_price = price.child_price
+        adult_amount = price.adult_amount
+        child_amount = price.child_amount
 
         # Ensure price calculations
         if not booking.subtotal or not booking.total_price:
-            booking.subtotal = (regular_price * num_adults) + (regular_price * Decimal('0.5') * num_children)
-            booking.discount_amount = (regular_price - discounted_price) * num_adults
-            if num_children:
-                booking.discount_amount += (regular_price - child_price) * num_children
-            booking.total_price = adult_amount + child_amount
+            booking.subtotal = price.subtotal
+            booking.discount_amount = price.discount_amount
+            booking.total_price = price.total_price
             booking.save()
 
         # Generate a booking reference number if not set
         if not booking.booking_reference:
-            booking.booking_reference = f"BK-{booking.id:06d}"
-            booking.save()
+            booking.booking_reference = next_booking_reference()
+            booking.save(update_fields=['booking_reference'])
 
         # Get currency code from session or default
         currency_code = request.session.get('currency_code', 'USD')
 
         # Calculate discount percentage if applicable
-        tour_discount_percent = None
-        if tour.has_discount and regular_price > 0:
-            discount_diff = regular_price - discounted_price
-            tour_discount_percent = int((discount_diff / regular_price) * 100)
+        tour_discount_percent = price.discount_percentage if tour.has_discount else None
 
         context = {
             'booking': booking,
@@ -628,6 +596,7 @@ def booking_confirmation_steps(request, pk):
         return redirect('booking:booking_list')
 
 @login_required
+@idempotent
 def booking_form(request, tour_id):
     """
     Display the booking form page with PayPal integration.
@@ -692,24 +661,8 @@ def booking_form(request, tour_id):
             end_date = start_date + timedelta(days=tour.duration_days)
 
             # Calculate prices
-            regular_price = tour.price
-            discounted_price = tour.discount_price if tour.has_discount else tour.price
-            child_price = discounted_price * Decimal('0.5')  # Children at half price
-
-            # Calculate subtotal (based on regular price)
-            adult_subtotal = regular_price * num_adults
-            child_subtotal = regular_price * Decimal('0.5') * num_children
-            subtotal = adult_subtotal + child_subtotal
-
-            # Calculate discount if applicable
-            discount_amount = Decimal('0')
-            if tour.has_discount:
-                discount_per_adult = regular_price - discounted_price
-                discount_per_child = discount_per_adult * Decimal('0.5')
-                discount_amount = (discount_per_adult * num_adults) + (discount_per_child * num_children)
-
-            # Calculate total price
-            total_price = subtotal - discount_amount
+            price = quote(tour, num_adults, num_children)
+            total_price = price.total_price
 
             # Create booking
             booking = Booking(
@@ -720,17 +673,19 @@ def booking_form(request, tour_id):
                 num_adults=num_adults,
                 num_children=num_children,
                 special_requests=special_requests,
-                subtotal=subtotal,
-                discount_amount=discount_amount,
+                subtotal=price.subtotal,
+                discount_amount=price.discount_amount,
                 total_price=total_price,
                 status='pending',
                 payment_status='pending'
             )
-            booking.save()
-
-            # Generate booking reference
-            booking.booking_reference = f"BK-{booking.id:06d}"
-            booking.save(update_fields=['booking_reference'])
+            # Save the booking and hold its seats; nothing is saved if the date is sold out
+            try:
+                with transaction.atomic():
+                    booking.save()
+                    hold_seats_for_booking(booking)
+            except SeatsUnavailable:
+                return JsonResponse({'error': str(_("Not enough seats are left on this date."))}, status=409)
 
             # Return JSON response for AJAX requests
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -748,83 +703,36 @@ def booking_form(request, tour_id):
             return redirect('booking:booking_confirmation_steps', pk=booking.id)
 
         # Handle GET request (display form)
-        # Calculate prices for adults and children
-        regular_price = tour.price
-        discounted_price = tour.discount_price if tour.has_discount else tour.price
-        child_price = discounted_price * Decimal('0.5')  # Children at half price
-
         # Use participants count from query parameters
         num_adults = participants  # This is already validated above
         print(f"Using participants count: {num_adults} (from query parameter)")
-        num_children = 0
 
-        # Calculate amounts
-        adult_amount = discounted_price * num_adults
-        child_amount = child_price * num_children
-
-        # Use values from URL if available, otherwise calculate
-        if subtotal_from_url is not None:
-            subtotal = Decimal(str(subtotal_from_url))
-            print(f"Using subtotal from URL: {subtotal}")
-        else:
-            # Calculate subtotal (based on regular price)
-            adult_subtotal = regular_price * num_adults
-            child_subtotal = regular_price * Decimal('0.5') * num_children
-            subtotal = adult_subtotal + child_subtotal
-            print(f"Calculated subtotal: {subtotal}")
-
-        # Calculate discount if applicable
-        if discount_from_url is not None and tour.has_discount:
-            discount_amount = Decimal(str(discount_from_url))
-            print(f"Using discount from URL: {discount_amount}")
-        else:
-            discount_amount = Decimal('0')
-            if tour.has_discount:
-                # Calculate discount using the discount percentage
-                discount_percentage = tour.discount_percentage
-                discount_per_person = float(tour.price) * (discount_percentage / 100)
-                discount_amount = Decimal(str(discount_per_person)) * num_adults
-                print(f"Calculated discount: {discount_amount}")
-
-        # Calculate total price
-        if total_from_url is not None:
-            total_price = Decimal(str(total_from_url))
-            print(f"Using total from URL: {total_price}")
-        else:
-            total_price = subtotal - discount_amount
-            print(f"Calculated total: {total_price}")
+        # Prices are always quoted here; amounts passed in the URL are only
+        # the tour page's own preview of the same quote
+        price = quote(tour, num_adults)
+        logger.debug(f"Quoted subtotal={price.subtotal}, discount={price.discount_amount}, total={price.total_price}")
 
         # Calculate default dates
         today = date.today()
 
-        # Calculate discount percentage if applicable
-        tour_discount_percent = None
-        if tour.has_discount and tour.price > 0:
-            discount_diff = tour.price - tour.discount_price
-            tour_discount_percent = int((discount_diff / tour.price) * 100)
-
-        # Calculate discount per person for JavaScript
-        discount_per_person = 0
-        if tour.has_discount:
-            discount_percentage = tour.discount_percentage
-            discount_per_person = float(tour.price) * (discount_percentage / 100)
+        tour_discount_percent = price.discount_percentage if tour.has_discount else None
 
         context = {
             'tour': tour,
             'currency_code': currency_code,
-            'child_price': float(child_price),
-            'discount_amount': float(discount_amount),
-            'discount_per_person': discount_per_person,
-            'subtotal': float(subtotal),
-            'total_price': float(total_price),
+            'child_price': float(price.child_price),
+            'discount_amount': float(price.discount_amount),
+            'discount_per_person': float(price.regular_price - price.adult_price),
+            'subtotal': float(price.subtotal),
+            'total_price': float(price.total_price),
             'today': today,
             'paypal_client_id': settings.PAYPAL_CLIENT_ID if hasattr(settings, 'PAYPAL_CLIENT_ID') else "sb",
             'initial_participants': num_adults,
-            'tour_price': float(regular_price),
-            'tour_discount_price': float(discounted_price),
+            'tour_price': float(price.regular_price),
+            'tour_discount_price': float(price.adult_price),
             'tour_discount_percent': tour_discount_percent,
-            'adult_amount': float(adult_amount),
-            'child_amount': float(child_amount),
+            'adult_amount': float(price.adult_amount),
+            'child_amount': float(price.child_amount),
             'has_discount': tour.has_discount,
             'from_tour_detail': True if subtotal_from_url is not None else False,
         }
@@ -844,6 +752,7 @@ def booking_form(request, tour_id):
 
 @login_required
 @require_POST
+@idempotent
 def create_paypal_order(request, booking_id):
     """
     Create a PayPal order for a booking.
@@ -858,6 +767,12 @@ def create_paypal_order(request, booking_id):
         booking = get_object_or_404(Booking, id=booking_id, user=request.user)
         logger.info(f"Booking details: tour={booking.tour.name}, price={booking.total_price}, user={request.user.username}")
 
+        # Keep the seats held while the customer is paying
+        try:
+            ensure_hold(booking)
+        except SeatsUnavailable:
+            return JsonResponse({'error': str(_("Not enough seats are left on this date."))}, status=409)
+
         # Create or get payment record
         payment, created = Payment.objects.get_or_create(
             booking=booking,
@@ -943,6 +858,7 @@ def create_paypal_order(request, booking_id):
 
 @login_required
 @require_POST
+@idempotent
 def capture_paypal_payment(request, booking_id):
     """
     Capture payment for an approved PayPal order.
@@ -10,3 +10,16 @@ class CoreConfig(AppConfig):
         # Import translation options here to ensure they are registered
         # when the app is ready.
         import core.translation
+
+        # Drop the cached table list whenever migrations have been applied
+        from django.db.models.signals import post_migrate
+        from .schema import invalidate_schema_registry
+        post_migrate.connect(invalidate_schema_registry, dispatch_uid='core.invalidate_schema_registry')
+
+        # Drop this worker's exchange-rate snapshot when currencies change
+        from django.db.models.signals import post_delete, post_save
+        from .currency_rates import invalidate_rate_table
+        from .models import Currency
+        post_migrate.connect(invalidate_rate_table, dispatch_uid='core.invalidate_rate_table')
+        post_save.connect(invalidate_rate_table, sender=Currency, dispatch_uid='core.currency_saved')
+        post_delete.connect(invalidate_rate_table, sender=Currency, dispatch_uid='core.currency_deleted')
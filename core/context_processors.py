@@ -1,4 +1,6 @@
+from .currency_rates import current_rates
 from .models import Currency
+from .schema import tables_ready
 from django.conf import settings
 import json
 
@@ -43,30 +45,22 @@ def currency_processor(request):
 
     # Create a dummy currency object if the database table doesn't exist yet
     # This is useful during initial deployment when migrations haven't been applied
-    try:
-        # Check if the Currency model is ready (table exists)
-        from django.db import connection
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1 FROM core_currency LIMIT 1")
-            table_exists = True
-    except Exception:
-        table_exists = False
+    table_exists = tables_ready(Currency)
 
     if table_exists:
-        try:
-            current_currency = Currency.objects.get(code=current_currency_code)
-        except Currency.DoesNotExist:
+        # Read from the worker's snapshot of the Currency table, not the database
+        rates = current_rates()
+        current_currency = rates.get(current_currency_code)
+        if current_currency is None:
             # Fallback to USD if selected currency doesn't exist
-            try:
-                current_currency = Currency.objects.get(code='USD')
+            current_currency = rates.get('USD')
+            if current_currency is not None:
                 request.session['currency_code'] = 'USD'
-            except Currency.DoesNotExist:
-                # Handle case where Currency table might be empty
-                current_currency = None
+            # Otherwise the Currency table is empty and current_currency stays None
 
         # Get all active currencies for the dropdown
         # Ensure we have the four required currencies: USD, EUR, GBP, EGP
-        currencies = Currency.objects.filter(code__in=['USD', 'EUR', 'GBP', 'EGP'], is_active=True)
+        currencies = rates.active(['USD', 'EUR', 'GBP', 'EGP'])
     else:
         # Create dummy currency objects
         class DummyCurrency:
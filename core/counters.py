@@ -0,0 +1,161 @@
+"""
+Write-behind counters for hot, approximate columns such as ``view_count``.
+
+Detail pages used to run an ``UPDATE ... SET view_count = view_count + 1`` on
+every hit. On popular pages those writes serialize on a single row (and, on
+SQLite, on the whole database). Instead, increments are accumulated in a
+buffer kept by each worker process and applied in bulk by a background
+thread every ``VIEW_COUNTER_FLUSH_INTERVAL`` seconds, with a single UPDATE per
+model. Pending increments are also flushed when the process exits.
+
+Increments remember the name of the database they were counted against and
+are dropped if it changed before the flush, as it does when the test runner
+destroys its test database: they must not end up in another database.
+
+Counter values read from the database can therefore lag behind by up to one
+flush interval per worker.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Case, F, When
+
+logger = logging.getLogger(__name__)
+
+# Rows updated per statement when flushing
+FLUSH_BATCH_SIZE = 500
+
+
+def flush_interval():
+    return getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 10)
+
+
+def database_name(model):
+    """Name of the database ``model`` is written to (the test runner swaps it)."""
+    return connections[model.objects.db].settings_dict['NAME']
+
+
+class CounterBuffer:
+    """
+    In-process buffer of pending ``{(model, field, database name): {pk: amount}}``
+    increments.
+
+    ``increment`` only touches memory. ``flush`` swaps the pending increments
+    out under the lock and applies them with one ``UPDATE ... CASE`` per model
+    and field (chunked by ``FLUSH_BATCH_SIZE``), so the number of database
+    writes depends on the flush interval rather than on the traffic.
+
+    With ``autoflush=False`` no background thread is started and the caller
+    is responsible for calling ``flush``.
+    """
+
+    def __init__(self, autoflush=True):
+        self.autoflush = autoflush
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+        self._stopped = threading.Event()
+
+    def increment(self, model, pk, field='view_count', amount=1):
+        key = (model, field, database_name(model))
+        with self._lock:
+            self._pending[key][pk] += amount
+        if self.autoflush:
+            self._ensure_flusher()
+
+    def pending(self, model, pk, field='view_count'):
+        """Increments for one row that have not reached the database yet."""
+        with self._lock:
+            values = self._pending.get((model, field, database_name(model)))
+            return values.get(pk, 0) if values else 0
+
+    def flush(self):
+        """Apply all pending increments. Returns the number of rows updated."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+
+        updated = 0
+        for (model, field, name), values in pending.items():
+            if name != database_name(model):
+                logger.debug(f"Dropping {model._meta.label}.{field} counters of database {name}")
+                continue
+            items = list(values.items())
+            try:
+                with transaction.atomic(using=model.objects.db):
+                    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+                        updated += self._apply(model, field, items[start:start + FLUSH_BATCH_SIZE])
+            except Exception as e:
+                logger.error(f"Error flushing {model._meta.label}.{field} counters: {e}")
+                # Keep the increments for the next attempt
+                with self._lock:
+                    for pk, amount in items:
+                        self._pending[(model, field, name)][pk] += amount
+        return updated
+
+    @staticmethod
+    def _apply(model, field, items):
+        increment = Case(
+            *[When(pk=pk, then=amount) for pk, amount in items],
+            default=0,
+            output_field=model._meta.get_field(field)
+        )
+        return model.objects.filter(pk__in=[pk for pk, _ in items]).update(
+            **{field: F(field) + increment}
+        )
+
+    def _ensure_flusher(self):
+        # Threads don't survive fork(), so each worker starts its own
+        pid = os.getpid()
+        if self._flusher_pid == pid and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher_pid == pid and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(
+                target=self._run, name='counter-flusher', daemon=True
+            )
+            self._flusher_pid = pid
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stopped.wait(flush_interval()):
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error in counter flusher: {e}")
+            finally:
+                # The thread's connection would otherwise stay open forever
+                connections.close_all()
+
+    def stop(self):
+        """Stop the background thread and flush what is left."""
+        self._stopped.set()
+        self.flush()
+
+
+counter_buffer = CounterBuffer()
+
+
+def increment_counter(model, pk, field='view_count', amount=1):
+    """Buffer an increment of ``model.field`` for the row ``pk``."""
+    counter_buffer.increment(model, pk, field=field, amount=amount)
+
+
+def flush_counters():
+    """Apply the pending increments of this process immediately."""
+    return counter_buffer.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        counter_buffer.stop()
+    except Exception as e:
+        logger.error(f"Error flushing counters at exit: {e}")
@@ -0,0 +1,177 @@
+"""
+Process-wide snapshot of the ``Currency`` table.
+
+The currency template tags and ``currency_processor`` used to query
+``Currency`` for every price they rendered, about 20 queries for a page of
+tour cards. They now read from a ``RateTable``: an immutable copy of the
+whole table, loaded with two queries, which is never changed once built.
+Updates build a new table and swap the reference, so a request always sees
+one consistent set of rates, even while another thread reloads.
+
+The worker that saves or deletes a ``Currency`` (the admin, or
+``update_exchange_rates`` in its own process) drops its snapshot through
+signals. Other workers compare a version (row count and latest
+``last_updated``) with one small query at most every
+``CURRENCY_RATES_CHECK_INTERVAL`` seconds and reload when it has changed.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.translation import get_language
+
+from .models import Currency
+from .schema import tables_ready
+
+logger = logging.getLogger(__name__)
+
+
+def check_interval():
+    return getattr(settings, 'CURRENCY_RATES_CHECK_INTERVAL', 30)
+
+
+class CurrencyRate(namedtuple('CurrencyRate', ['code', 'symbol', 'exchange_rate', 'is_active', 'names'])):
+    """
+    Read-only stand-in for a ``Currency`` row. ``names`` maps language codes
+    to the translated names; ``name`` picks the active language's like the
+    model's translated field does.
+    """
+
+    __slots__ = ()
+
+    @property
+    def name(self):
+        language = (get_language() or '').split('-')[0]
+        return (
+            self.names.get(language)
+            or self.names.get(getattr(settings, 'MODELTRANSLATION_DEFAULT_LANGUAGE', 'en'))
+            or self.names.get(None, '')
+        )
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+
+class RateTable:
+    """Immutable ``{code: CurrencyRate}`` with the version it was loaded at."""
+
+    __slots__ = ('currencies', 'version')
+
+    def __init__(self, currencies, version=None):
+        object.__setattr__(self, 'currencies', MappingProxyType(dict(currencies)))
+        object.__setattr__(self, 'version', version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RateTable is immutable")
+
+    def get(self, code):
+        return self.currencies.get(code) if code else None
+
+    def rate(self, code):
+        currency = self.get(code)
+        return currency.exchange_rate if currency is not None else None
+
+    def active(self, codes):
+        """Active currencies among ``codes``, ordered by code like ``Currency.Meta.ordering``."""
+        return [
+            currency for code, currency in sorted(self.currencies.items())
+            if code in codes and currency.is_active
+        ]
+
+
+EMPTY = RateTable({})
+
+
+def _names(currency):
+    names = {None: currency.name}
+    for language in getattr(settings, 'MODELTRANSLATION_LANGUAGES', ()):
+        value = getattr(currency, f'name_{language}', None)
+        if value:
+            names[language] = value
+    return MappingProxyType(names)
+
+
+class RateTableCache:
+    """
+    Holds the current ``RateTable`` of this worker.
+
+    ``table`` never queries while the snapshot is fresh; after
+    ``CURRENCY_RATES_CHECK_INTERVAL`` seconds it checks the version, and
+    reloads only if the table changed. Until the ``Currency`` table exists,
+    it returns an empty table and checks again on the next interval.
+    """
+
+    def __init__(self):
+        self._table = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _version(self):
+        stamp = Currency.objects.aggregate(rows=Count('id'), updated=Max('last_updated'))
+        return stamp['rows'], stamp['updated']
+
+    def load(self):
+        """Read the whole table into a new snapshot and swap it in."""
+        if not tables_ready(Currency):
+            table = EMPTY
+        else:
+            version = self._version()
+            currencies = {currency.code: CurrencyRate(
+                code=currency.code,
+                symbol=currency.symbol,
+                exchange_rate=currency.exchange_rate,
+                is_active=currency.is_active,
+                names=_names(currency),
+            ) for currency in Currency.objects.all()}
+            table = RateTable(currencies, version)
+        self._table = table
+        self._checked_at = time.monotonic()
+        return table
+
+    def invalidate(self):
+        """Drop the snapshot; the next lookup reloads it."""
+        self._table = None
+
+    @property
+    def table(self):
+        table = self._table
+        if table is not None and time.monotonic() - self._checked_at < check_interval():
+            return table
+        with self._lock:
+            # Another thread may have reloaded while this one waited
+            if self._table is not None and time.monotonic() - self._checked_at < check_interval():
+                return self._table
+            try:
+                if self._table is not None and self._table.version is not None \
+                        and self._version() == self._table.version:
+                    self._checked_at = time.monotonic()
+                    return self._table
+                return self.load()
+            except Exception as e:
+                # Keep serving the last rates if the database is unavailable
+                logger.error(f"Error loading exchange rates: {e}")
+                self._checked_at = time.monotonic()
+                if self._table is None:
+                    self._table = EMPTY
+                return self._table
+
+
+rate_tables = RateTableCache()
+
+
+def current_rates():
+    """Shortcut for ``rate_tables.table``."""
+    return rate_tables.table
+
+
+def invalidate_rate_table(sender=None, using=None, **kwargs):
+    """
+    ``post_save``/``post_delete``/``post_migrate`` receiver that drops the
+    snapshot once the change is committed, so the reload sees it.
+    """
+    transaction.on_commit(rate_tables.invalidate, using=using)
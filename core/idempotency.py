@@ -0,0 +1,155 @@
+"""
+``Idempotency-Key`` support for unsafe endpoints.
+
+Clients send a unique ``Idempotency-Key`` header with each logical attempt
+(a booking submission, a PayPal order, a capture) and reuse it when they
+retry. The first request with a key runs the view. Its response is stored
+in ``IdempotencyKey`` for ``IDEMPOTENCY_KEY_TTL`` seconds and served again
+for every retry with that key. Replays cost one indexed lookup and never
+reach the view, its models or the payment gateway.
+
+* Keys are scoped to the user; requests without the header, or from
+  anonymous users, run as before.
+* Reusing a key for a different request (method, path or body) is
+  rejected with 422.
+* A retry that arrives while the first request is still running gets 409
+  with ``Retry-After``. A request that never finished stops blocking its key
+  after ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds.
+* Only successful (2xx/3xx) responses are stored. After an error the key is
+  released so the client can retry, e.g. while polling for a capture.
+
+Replayed responses carry an ``Idempotent-Replayed: true`` header.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.http.request import RawPostDataException
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Response headers stored and replayed along with the body
+STORED_HEADERS = ('Content-Type', 'Location')
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def request_fingerprint(request):
+    """Hash of the method, path and body (the parsed form once a multipart body was consumed)."""
+    try:
+        body = request.body
+    except RawPostDataException:
+        body = repr(sorted(request.POST.lists())).encode()
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def replay(record):
+    response = HttpResponse(record.response_body, status=record.status_code)
+    for header, value in record.response_headers.items():
+        response[header] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(user, key, fingerprint):
+    """
+    Claim ``key`` for a new request. Returns ``(record, None)`` when the view
+    should run, or ``(None, response)`` to answer without running it.
+    """
+    now = timezone.now()
+    for _attempt in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint, expires_at=now + key_ttl()
+                ), None
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if existing is None:
+            continue
+        abandoned = existing.status_code is None and existing.created_at <= now - lock_timeout()
+        if existing.expires_at <= now or abandoned:
+            # Take the key over; only one of several concurrent retries wins
+            IdempotencyKey.objects.filter(pk=existing.pk, created_at=existing.created_at).delete()
+            continue
+        if existing.fingerprint != fingerprint:
+            return None, JsonResponse(
+                {'error': f'{HEADER} was already used for a different request'}, status=422
+            )
+        if existing.status_code is None:
+            response = JsonResponse(
+                {'error': f'A request with this {HEADER} is still being processed'}, status=409
+            )
+            response['Retry-After'] = '1'
+            return None, response
+        return None, replay(existing)
+    return None, JsonResponse({'error': f'{HEADER} is busy, please retry'}, status=409)
+
+
+def _store(record, response):
+    if response.streaming or response.status_code >= 400:
+        record.delete()
+        return
+    record.status_code = response.status_code
+    record.response_headers = {
+        header: response[header] for header in STORED_HEADERS if response.has_header(header)
+    }
+    record.response_body = response.content
+    record.save(update_fields=['status_code', 'response_headers', 'response_body'])
+
+
+def idempotent(view_func):
+    """
+    Make a function view replay its first successful response for each
+    ``Idempotency-Key``. Apply it below ``login_required``.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method in ('GET', 'HEAD', 'OPTIONS') or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}, status=400)
+
+        record, response = _claim(request.user, key, request_fingerprint(request))
+        if response is not None:
+            return response
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        try:
+            _store(record, response)
+        except Exception as e:
+            logger.error(f"Error storing response for {HEADER} {key}: {e}")
+        return response
+    return _wrapped_view
+
+
+def clear_expired_keys(now=None):
+    """Delete stored responses past their TTL. Returns the number deleted."""
+    return IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from core.counters import CounterBuffer
+from tour.models import Tour
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCounter:
+    """``execute_wrapper`` hook counting the write statements sent to the database."""
+
+    def __init__(self):
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Compare database writes of per-hit view count updates with buffered counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5,
+                            help='How long each mode simulates page views')
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Flush interval used for the buffered mode')
+        parser.add_argument('--tours', type=int, default=20,
+                            help='Number of tours the views are spread over')
+
+    def handle(self, *args, **options):
+        tour_ids = list(Tour.objects.values_list('pk', flat=True)[:options['tours']])
+        if not tour_ids:
+            self.stdout.write(self.style.ERROR('No tours found; create some tours first'))
+            return
+
+        # All changes are rolled back, the stored view counts stay untouched
+        with transaction.atomic():
+            direct = self.run(tour_ids, options['seconds'], self.direct_hit)
+            buffer = CounterBuffer(autoflush=False)
+            buffered = self.run(
+                tour_ids, options['seconds'],
+                lambda pk: buffer.increment(Tour, pk),
+                flush=buffer.flush, interval=options['interval']
+            )
+            transaction.set_rollback(True)
+
+        self.report('Per-hit UPDATE', direct)
+        self.report(f'Buffered, flushed every {options["interval"]:g}s', buffered)
+
+    @staticmethod
+    def direct_hit(pk):
+        # What Tour.increment_view_count used to do on every detail page view
+        Tour.objects.filter(pk=pk).update(view_count=F('view_count') + 1)
+
+    def run(self, tour_ids, seconds, hit, flush=None, interval=None):
+        counter = WriteCounter()
+        hits = 0
+        with connection.execute_wrapper(counter):
+            started = last_flush = time.perf_counter()
+            while True:
+                now = time.perf_counter()
+                if now - started >= seconds:
+                    break
+                hit(tour_ids[hits % len(tour_ids)])
+                hits += 1
+                if flush and now - last_flush >= interval:
+                    flush()
+                    last_flush = now
+            if flush:
+                flush()
+            elapsed = time.perf_counter() - started
+        return hits, counter.writes, elapsed
+
+    def report(self, label, result):
+        hits, writes, elapsed = result
+        self.stdout.write(
+            f'{label}: {hits} views in {elapsed:.1f}s ({hits / elapsed:,.0f}/s), '
+            f'{writes} writes ({writes / elapsed:.1f}/s, {hits / max(writes, 1):,.0f} views per write)'
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.idempotency import clear_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses that are past their TTL'
+
+    def handle(self, *args, **options):
+        deleted = clear_expired_keys()
+        self.stdout.write(f'Deleted {deleted} expired idempotency keys')
@@ -0,0 +1,96 @@
+import multiprocessing
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from core.ratelimit import parse_rate
+
+# Nothing is routed here; the middleware counts the request before the 404
+PATH = '/api/rate-limit-loadtest/'
+
+
+def send_requests(start, requests, ip, queue):
+    """Worker process: wait for the start signal, then send ``requests`` requests as client ``ip``."""
+    client = Client(REMOTE_ADDR=ip)
+    statuses = Counter()
+    headers = {}
+    start.wait()
+    for _ in range(requests):
+        response = client.get(PATH)
+        statuses[response.status_code] += 1
+        if response.status_code == 429 and 'rejected' not in headers:
+            headers['rejected'] = {name: response.get(name) for name in (
+                'Retry-After', 'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset'
+            )}
+    queue.put((statuses, headers))
+
+
+class Command(BaseCommand):
+    help = (
+        'Send requests from several processes, as gunicorn workers would receive them, '
+        'and check that a rate limit holds across all of them together'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help='Worker processes sending requests')
+        parser.add_argument('--requests', type=int, default=100, help='Requests sent by each process')
+        parser.add_argument('--rate', default='50/h',
+                            help='Rate of the temporary policy under test (a long window keeps the run inside it)')
+
+    def handle(self, *args, **options):
+        limit, _period = parse_rate(options['rate'])
+        cache = settings.CACHES[getattr(settings, 'RATELIMIT_CACHE_ALIAS', 'default')]['BACKEND']
+        if 'locmem' in cache or 'dummy' in cache:
+            self.stdout.write(self.style.WARNING(
+                f'The rate limit cache ({cache}) is private to each process, so every process gets its '
+                f'own limit; set SHARED_CACHE_URL to a shared cache such as Redis'
+            ))
+
+        # A policy of its own, so real counters are neither used nor touched
+        policy = {'name': f'loadtest-{uuid.uuid4().hex[:8]}', 'path': f'^{PATH}$', 'rate': options['rate']}
+        # fork, so the processes inherit the overridden settings like forked gunicorn workers do
+        context = multiprocessing.get_context('fork')
+        start = context.Event()
+        queue = context.Queue()
+        with override_settings(
+            RATELIMIT_ENABLED=True,
+            RATELIMIT_POLICIES=[policy],
+            ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+        ):
+            workers = [
+                context.Process(target=send_requests, args=(start, options['requests'], '203.0.113.7', queue))
+                for _ in range(options['processes'])
+            ]
+            for worker in workers:
+                worker.start()
+            started = time.perf_counter()
+            start.set()
+            results = [queue.get() for _ in workers]
+            elapsed = time.perf_counter() - started
+            for worker in workers:
+                worker.join()
+
+        statuses = sum((result[0] for result in results), Counter())
+        sent = sum(statuses.values())
+        rejected = statuses[429]
+        allowed = sent - rejected
+        self.stdout.write(
+            f'{sent} requests from {options["processes"]} processes in {elapsed:.2f}s '
+            f'({sent / elapsed:.0f} requests/s) against a limit of {options["rate"]}: '
+            f'{allowed} allowed, {rejected} rejected'
+        )
+        headers = next((result[1]['rejected'] for result in results if result[1]), None)
+        if headers:
+            self.stdout.write('Headers of a rejected request: ' + ', '.join(
+                f'{name}: {value}' for name, value in headers.items()
+            ))
+        if allowed > limit:
+            raise CommandError(f'{allowed} requests went through, more than the limit of {limit}')
+        if allowed < min(limit, sent):
+            raise CommandError(f'Only {allowed} requests went through, fewer than the limit of {limit}')
+        self.stdout.write(self.style.SUCCESS(f'The limit held across all processes ({allowed}/{limit})'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Print a signed token; requests sending it in an X-Profile-Token header are profiled '
+        '(see core.profiling)'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(profiling.make_token())
+        self.stderr.write(
+            f'Valid for {profiling.token_max_age()} seconds, e.g.: '
+            f'curl -H "X-Profile-Token: <token>" https://<host>/en/tours/'
+        )
@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from core.schema import schema_registry, MISSING_TABLE_RECHECK_SECONDS
+
+
+class Command(BaseCommand):
+    help = 'Reload the schema readiness registry and report missing model tables'
+
+    def handle(self, *args, **options):
+        tables = schema_registry.refresh()
+        self.stdout.write(f'Found {len(tables)} tables in the database')
+
+        missing = [
+            model._meta.db_table
+            for model in apps.get_models()
+            if model._meta.managed and model._meta.db_table not in tables
+        ]
+        if not missing:
+            self.stdout.write(self.style.SUCCESS('All model tables are ready'))
+            return
+
+        for table in missing:
+            self.stdout.write(self.style.WARNING(f'Missing table: {table}'))
+        self.stdout.write(
+            f'Running workers re-check missing tables every {MISSING_TABLE_RECHECK_SECONDS} seconds'
+        )
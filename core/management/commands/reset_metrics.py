@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import metrics
+
+
+class Command(BaseCommand):
+    help = 'Delete the request latency histograms stored by all workers (see core.metrics)'
+
+    def handle(self, *args, **options):
+        metrics.reset()
+        self.stdout.write(self.style.SUCCESS(f'Request metrics in {metrics.metrics_dir()} cleared'))
@@ -1,6 +1,7 @@
 import requests
 from decimal import Decimal
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 from core.models import Currency
 from django.conf import settings
@@ -25,16 +26,19 @@ class Command(BaseCommand):
                 
             rates = data.get('rates', {})
             
-            # Update each currency in the database
+            # Update each currency in the database, all in one transaction so
+            # workers reloading their rate snapshot never see half of the new
+            # rates (see core.currency_rates)
             currencies = Currency.objects.all()
             updated_count = 0
             
-            for currency in currencies:
-                if currency.code in rates:
-                    currency.exchange_rate = Decimal(str(rates[currency.code]))
-                    currency.last_updated = timezone.now()
-                    currency.save()
-                    updated_count += 1
+            with transaction.atomic():
+                for currency in currencies:
+                    if currency.code in rates:
+                        currency.exchange_rate = Decimal(str(rates[currency.code]))
+                        currency.last_updated = timezone.now()
+                        currency.save()
+                        updated_count += 1
             
             self.stdout.write(
                 self.style.SUCCESS(f'Successfully updated {updated_count} currency exchange rates')
@@ -0,0 +1,367 @@
+"""
+Request latency histograms shared by all worker processes.
+
+``PageSpeedMiddleware`` kept a ``slow_pages`` dict in the cache and rewrote
+it with ``cache.get``/``cache.set`` on every slow request, so concurrent
+workers overwrote each other, and requests under two seconds were never
+recorded. ``RequestMetricsMiddleware`` now records every request in a
+histogram per view (the resolved URL name, not the raw path), method and
+status class.
+
+Histograms have fixed buckets growing by a factor of ``BUCKET_FACTOR`` from
+1 ms, so any percentile read from them is within about 20% of the exact
+value and merging them is plain addition. Each thread records into its own
+shard, so recording takes no lock; the shards of threads that ended are
+folded into one retired total. A background thread per worker periodically
+writes the worker's totals to ``<METRICS_DIR>/latency-<pid>-<nonce>.json``
+(replacing the file atomically); readers add up the files of all workers.
+Totals only grow, so a worker that exits leaves its last totals behind and
+sums stay monotonic, as Prometheus expects. The random nonce keeps a new
+worker that reuses a pid from overwriting the file of the old one. ``python manage.py
+reset_metrics`` starts over. ``WorkerTotals`` does the sharing and is also
+used for the per-request SQL statistics of core.querystats.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the buckets: 1 ms, 1.4 ms, 2 ms, ... about 46 s, then +Inf
+BUCKET_START = 0.001
+BUCKET_FACTOR = 2 ** 0.5
+BUCKET_COUNT = 32
+BOUNDS = tuple(BUCKET_START * BUCKET_FACTOR ** index for index in range(BUCKET_COUNT))
+
+# Histogram layout: one count per bucket (the last one is +Inf), then the sum
+SUM = BUCKET_COUNT + 1
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'tourism-metrics'))
+
+
+def flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+
+def bucket_index(seconds):
+    """Index of the first bucket whose upper bound is at least ``seconds``."""
+    if seconds <= BUCKET_START:
+        return 0
+    # The epsilon keeps values on a bound in that bound's bucket
+    index = math.ceil(math.log(seconds / BUCKET_START, BUCKET_FACTOR) - 1e-9)
+    return min(index, BUCKET_COUNT)
+
+
+def new_histogram():
+    return [0] * BUCKET_COUNT + [0, 0.0]
+
+
+def merge_into(total, values):
+    for index, value in enumerate(values):
+        total[index] += value
+
+
+def quantile(histogram, q):
+    """
+    Estimate of the ``q`` quantile in seconds, interpolated linearly within
+    its bucket like Prometheus' ``histogram_quantile``; None when empty.
+    """
+    count = sum(histogram[:SUM])
+    if not count:
+        return None
+    rank = q * count
+    seen = 0
+    for index in range(BUCKET_COUNT + 1):
+        in_bucket = histogram[index]
+        if in_bucket and seen + in_bucket >= rank:
+            if index == BUCKET_COUNT:
+                return BOUNDS[-1]
+            lower = BOUNDS[index - 1] if index else 0.0
+            return lower + (BOUNDS[index] - lower) * (rank - seen) / in_bucket
+        seen += in_bucket
+    return BOUNDS[-1]
+
+
+class WorkerTotals:
+    """
+    Totals of this process, ``{key: [numbers]}``, shared with the other
+    workers through ``<METRICS_DIR>/<name>-<pid>-<nonce>.json``. Keys are tuples of
+    strings and totals of the same key from different workers add up
+    element by element.
+
+    ``value`` returns the calling thread's own list for a key, which the
+    caller adds to in place, so recording takes no lock. ``snapshot`` adds
+    the threads' lists up; it may miss a request being recorded at that
+    very moment, which the next snapshot includes, and folds the shards of
+    threads that ended into ``_retired``. With ``autoflush=False``
+    no file is written in the background and ``flush`` must be called.
+    """
+
+    name = None
+
+    def __init__(self, autoflush=True):
+        self.autoflush = autoflush
+        self._local = threading.local()
+        # (weak reference to the thread, its shard)
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._nonce = uuid.uuid4().hex[:8]
+        self._flusher = None
+        self._stopped = threading.Event()
+        atexit.register(self._flush_at_exit)
+
+    def new_value(self, key):
+        raise NotImplementedError
+
+    def value(self, key):
+        """The calling thread's totals for ``key``."""
+        if self._pid != os.getpid():
+            self._forked()
+        shard = getattr(self._local, 'shard', None)
+        if shard is None or self._local.pid != self._pid:
+            shard = self._new_shard()
+        value = shard.get(key)
+        if value is None:
+            value = shard[key] = self.new_value(key)
+        if self.autoflush:
+            self._ensure_flusher()
+        return value
+
+    def _new_shard(self):
+        shard = {}
+        with self._lock:
+            self._retire_dead_shards()
+            self._shards.append((weakref.ref(threading.current_thread()), shard))
+        self._local.shard = shard
+        self._local.pid = self._pid
+        return shard
+
+    def _forked(self):
+        # A forked worker starts from zero; the parent's totals are in its own file
+        with self._lock:
+            if self._pid != os.getpid():
+                self._shards = []
+                self._retired = {}
+                self._pid = os.getpid()
+                self._nonce = uuid.uuid4().hex[:8]
+                self._flusher = None
+
+    def _retire_dead_shards(self):
+        # Called with the lock held. A thread that ended no longer writes its
+        # shard, so it can be added up once and dropped
+        live = []
+        for reference, shard in self._shards:
+            thread = reference()
+            if thread is not None and thread.is_alive():
+                live.append((reference, shard))
+            else:
+                for key, value in shard.items():
+                    self._add(self._retired, key, list(value))
+        self._shards = live
+
+    def snapshot(self):
+        """``{key: totals}`` recorded by this process."""
+        with self._lock:
+            self._retire_dead_shards()
+            totals = {key: list(value) for key, value in self._retired.items()}
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            for key, value in list(shard.items()):
+                self._add(totals, key, list(value))
+        return totals
+
+    def _add(self, totals, key, value):
+        if key in totals:
+            merge_into(totals[key], value)
+        else:
+            totals[key] = value
+
+    def _is_own_file(self, name):
+        return name.startswith(f'{self.name}-') and name.endswith('.json')
+
+    def path(self):
+        if self._pid != os.getpid():
+            self._forked()
+        return os.path.join(metrics_dir(), f'{self.name}-{self._pid}-{self._nonce}.json')
+
+    def flush(self):
+        """Write this process's totals to its file."""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return
+        directory = metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        data = json.dumps([[*key, value] for key, value in snapshot.items()])
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=f'.{self.name}-')
+        try:
+            with os.fdopen(fd, 'w') as output:
+                output.write(data)
+            os.replace(temporary, self.path())
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def collect(self):
+        """Totals of all workers: the other workers' files plus this process's live totals."""
+        totals = {}
+        own = os.path.basename(self.path())
+        try:
+            names = os.listdir(metrics_dir())
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if not self._is_own_file(name) or name == own:
+                continue
+            try:
+                with open(os.path.join(metrics_dir(), name)) as source:
+                    entries = json.load(source)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading metrics {name}: {e}")
+                continue
+            for *key, value in entries:
+                self._add(totals, tuple(key), value)
+        for key, value in self.snapshot().items():
+            self._add(totals, key, value)
+        return totals
+
+    def workers(self):
+        """Number of processes whose totals ``collect`` includes."""
+        try:
+            names = os.listdir(metrics_dir())
+        except FileNotFoundError:
+            names = []
+        files = {name for name in names if self._is_own_file(name)}
+        return len(files | {os.path.basename(self.path())})
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._run, name=f'{self.name}-flusher', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stopped.wait(flush_interval()):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing {self.name} metrics: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _flush_at_exit(self):
+        try:
+            self.stop()
+        except Exception as e:
+            logger.error(f"Error writing {self.name} metrics at exit: {e}")
+
+
+class LatencyRecorder(WorkerTotals):
+    """Latency histograms by ``(view, method, status)``."""
+
+    name = 'latency'
+
+    def new_value(self, key):
+        return new_histogram()
+
+    def observe(self, key, seconds):
+        histogram = self.value(key)
+        histogram[bucket_index(seconds)] += 1
+        histogram[SUM] += seconds
+
+
+recorder = LatencyRecorder()
+
+
+def view_label(request):
+    """Name requests are recorded under: the resolved view name, or ``'<static>'``/``'<unmatched>'``."""
+    match = getattr(request, 'resolver_match', None)
+    if match is not None:
+        return match.view_name
+    if settings.STATIC_URL and request.path.startswith(settings.STATIC_URL):
+        return '<static>'
+    return '<unmatched>'
+
+
+def observe(view, method, status, seconds):
+    """Record one request that took ``seconds``."""
+    recorder.observe((view, method, status), seconds)
+
+
+def reset():
+    """Delete the stored totals of all workers."""
+    try:
+        names = os.listdir(metrics_dir())
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith('.json') and not name.startswith('.'):
+            os.unlink(os.path.join(metrics_dir(), name))
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(histograms):
+    """``histograms`` in the Prometheus text exposition format."""
+    name = 'django_http_request_duration_seconds'
+    lines = [
+        f'# HELP {name} Time from the first middleware to the response, by view name, method and status class.',
+        f'# TYPE {name} histogram',
+    ]
+    for (view, method, status), histogram in sorted(histograms.items()):
+        labels = f'view="{_label(view)}",method="{_label(method)}",status="{_label(status)}"'
+        cumulative = 0
+        for index, bound in enumerate(BOUNDS):
+            cumulative += histogram[index]
+            lines.append(f'{name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+        cumulative += histogram[BUCKET_COUNT]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram[SUM]:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def view_summaries(histograms):
+    """
+    One row per view, all methods and statuses together: requests, errors
+    (5xx), mean and p50/p95/p99 in milliseconds, busiest views first.
+    """
+    views = defaultdict(new_histogram)
+    errors = defaultdict(int)
+    for (view, method, status), histogram in histograms.items():
+        merge_into(views[view], histogram)
+        if status == '5xx':
+            errors[view] += sum(histogram[:SUM])
+    rows = []
+    for view, histogram in views.items():
+        count = sum(histogram[:SUM])
+        rows.append({
+            'view': view,
+            'requests': count,
+            'errors': errors[view],
+            'total_seconds': histogram[SUM],
+            'mean_ms': histogram[SUM] / count * 1000,
+            'p50_ms': quantile(histogram, 0.50) * 1000,
+            'p95_ms': quantile(histogram, 0.95) * 1000,
+            'p99_ms': quantile(histogram, 0.99) * 1000,
+        })
+    return sorted(rows, key=lambda row: row['total_seconds'], reverse=True)
@@ -4,7 +4,6 @@ import re
 import json
 from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
-from django.core.cache import cache
 from django.http import HttpResponseForbidden, HttpResponse
 from django.utils.crypto import constant_time_compare
 from django.template.response import TemplateResponse
@@ -42,77 +41,6 @@ class APIPerformanceMiddleware(MiddlewareMixin):
 
         return response
 
-class APIRequestThrottleMiddleware(MiddlewareMixin):
-    """
-    Middleware to throttle API requests based on IP address.
-    """
-    API_URL_PATTERN = re.compile(r'^/api/')
-
-    def __init__(self, get_response=None):
-        super().__init__(get_response)
-        self.request_counts = {}
-        self.last_cleanup = time.time()
-
-    def process_request(self, request):
-        # Only process API requests
-        if not self.API_URL_PATTERN.match(request.path):
-            return None
-
-        # Clean up old entries every 5 minutes
-        current_time = time.time()
-        if current_time - self.last_cleanup > 300:  # 5 minutes
-            self._cleanup_old_entries(current_time)
-            self.last_cleanup = current_time
-
-        # Get client IP
-        ip = self._get_client_ip(request)
-
-        # Initialize or update request count for this IP
-        if ip not in self.request_counts:
-            self.request_counts[ip] = {'count': 0, 'last_request': current_time}
-
-        # Check if request should be throttled
-        if self._should_throttle(ip, current_time):
-            from django.http import HttpResponse
-            return HttpResponse(
-                "Too many requests. Please try again later.",
-                status=429,
-                content_type="text/plain"
-            )
-
-        # Update request count
-        self.request_counts[ip]['count'] += 1
-        self.request_counts[ip]['last_request'] = current_time
-
-        return None
-
-    def _get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-
-    def _should_throttle(self, ip, current_time):
-        # Reset count if last request was more than 1 minute ago
-        if current_time - self.request_counts[ip]['last_request'] > 60:
-            self.request_counts[ip]['count'] = 0
-            return False
-
-        # Throttle if more than 60 requests per minute
-        return self.request_counts[ip]['count'] >= 60
-
-    def _cleanup_old_entries(self, current_time):
-        # Remove entries older than 10 minutes
-        to_remove = []
-        for ip, data in self.request_counts.items():
-            if current_time - data['last_request'] > 600:  # 10 minutes
-                to_remove.append(ip)
-
-        for ip in to_remove:
-            del self.request_counts[ip]
-
 class APIResponseCompressionMiddleware(MiddlewareMixin):
     """
     Middleware to ensure API responses are compressed.
@@ -164,50 +92,6 @@ class LoginSpeedupMiddleware(MiddlewareMixin):
         return response
 
 
-class PageSpeedMiddleware(MiddlewareMixin):
-    """
-    Middleware to track and optimize page load times.
-    """
-    def process_request(self, request):
-        request.start_time = time.time()
-
-    def process_response(self, request, response):
-        if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-
-            # Log slow page loads (more than 2 seconds)
-            if duration > 2.0 and not request.path.startswith('/admin/') and not request.path.startswith('/static/'):
-                logger.warning(f"Slow page load: {request.method} {request.path} - Duration: {duration:.2f}s")
-
-                # Store slow pages in cache for monitoring
-                slow_pages_key = 'slow_pages'
-                slow_pages = cache.get(slow_pages_key, {})
-
-                path_key = request.path
-                if path_key in slow_pages:
-                    slow_pages[path_key]['count'] += 1
-                    slow_pages[path_key]['total_time'] += duration
-                    slow_pages[path_key]['avg_time'] = slow_pages[path_key]['total_time'] / slow_pages[path_key]['count']
-                else:
-                    slow_pages[path_key] = {
-                        'count': 1,
-                        'total_time': duration,
-                        'avg_time': duration,
-                        'last_seen': time.time()
-                    }
-
-                # Keep only the 20 slowest pages
-                if len(slow_pages) > 20:
-                    # Sort by average time and keep top 20
-                    slow_pages = dict(sorted(slow_pages.items(),
-                                            key=lambda x: x[1]['avg_time'],
-                                            reverse=True)[:20])
-
-                cache.set(slow_pages_key, slow_pages, 86400)  # Store for 24 hours
-
-        return response
-
-
 class SecurityHeadersMiddleware(MiddlewareMixin):
     """
     Middleware to add security headers to all responses.
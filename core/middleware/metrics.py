@@ -0,0 +1,41 @@
+import logging
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
+    """
+    Record how long every request takes in the latency histograms of
+    core.metrics, by resolved view name (``'tour:tour_detail'``, not the
+    path, so URLs with slugs and ids don't each get their own series),
+    method and status class. Requests that resolve to no view are recorded
+    as ``'<static>'`` or ``'<unmatched>'``.
+
+    Goes first in ``MIDDLEWARE`` so the time includes the other middleware.
+    Requests slower than ``METRICS_SLOW_REQUEST_SECONDS`` are also logged.
+    """
+
+    def process_request(self, request):
+        request._metrics_started = time.perf_counter()
+
+    def process_response(self, request, response):
+        started = getattr(request, '_metrics_started', None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+
+        view = metrics.view_label(request)
+        try:
+            metrics.observe(view, request.method, f'{response.status_code // 100}xx', duration)
+        except Exception as e:
+            logger.error(f"Error recording request metrics: {e}")
+
+        if duration > getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', 2.0) and view != '<static>':
+            logger.warning(f"Slow request: {request.method} {request.path} ({view}) - Duration: {duration:.2f}s")
+        return response
@@ -0,0 +1,22 @@
+from core import profiling
+
+
+class ProfilingMiddleware:
+    """
+    Profile the view of requests picked by ``core.profiling.trigger`` (staff
+    ``?_profile=1``, a signed ``X-Profile-Token`` header or 1 in
+    ``PROFILING_SAMPLE_EVERY`` requests) and store the capture.
+
+    Goes last in ``MIDDLEWARE``: what it wraps is then URL resolution, the
+    other middleware's ``process_view`` and the view itself, and
+    ``request.user`` is available for the staff check.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = profiling.trigger(request)
+        if reason is None:
+            return self.get_response(request)
+        return profiling.profile(request, self.get_response, reason)
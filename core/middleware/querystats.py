@@ -0,0 +1,96 @@
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.functional import empty
+
+from core import querystats
+from core.metrics import view_label
+
+logger = logging.getLogger(__name__)
+
+
+def is_staff(request):
+    """Whether the request is a staff user's, without a query: only if the view already loaded the user."""
+    user = getattr(request, 'user', None)
+    wrapped = getattr(user, '_wrapped', user)
+    return wrapped is not empty and wrapped is not None and wrapped.is_authenticated and wrapped.is_staff
+
+
+class QueryStatsMiddleware:
+    """
+    Count the SQL queries of a sample of requests (``QUERY_STATS_SAMPLE_RATE``)
+    on every database connection and flag suspected N+1 queries (see
+    core.querystats).
+
+    Staff users (and everyone with ``DEBUG=True``) get the figures in the
+    response: ``Server-Timing: db;dur=<ms>;desc="<n> queries"``,
+    ``X-DB-Queries`` and ``X-DB-N-Plus-One`` (fingerprint x executions).
+    Requests with a suspected N+1 query or more than
+    ``QUERY_STATS_LOG_THRESHOLD`` queries are logged with the figures as
+    structured fields. Queries run while a streaming response is consumed
+    happen after this middleware returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = querystats.sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        queries = querystats.RequestQueries()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+
+        try:
+            self.report(request, response, queries)
+        except Exception as e:
+            logger.error(f"Error reporting query statistics: {e}")
+        return response
+
+    def report(self, request, response, queries):
+        view = view_label(request)
+        suspects = queries.suspects()
+        querystats.recorder.record(view, queries, suspects)
+
+        db_ms = queries.seconds * 1000
+        if settings.DEBUG or is_staff(request):
+            timing = f'db;dur={db_ms:.1f};desc="{queries.count} queries"'
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+            response['X-DB-Queries'] = str(queries.count)
+            if suspects:
+                response['X-DB-N-Plus-One'] = ', '.join(
+                    f"{suspect['fingerprint']}x{suspect['count']}" for suspect in suspects
+                )
+
+        if suspects or queries.count >= querystats.log_threshold():
+            details = {
+                'view': view,
+                'path': request.path,
+                'method': request.method,
+                'db_queries': queries.count,
+                'db_time_ms': round(db_ms, 1),
+                'n_plus_one': [
+                    {'fingerprint': suspect['fingerprint'], 'count': suspect['count'], 'sql': suspect['sql']}
+                    for suspect in suspects
+                ],
+            }
+            if suspects:
+                worst = suspects[0]
+                logger.warning(
+                    f"Suspected N+1 query in {view}: {worst['count']} x {worst['sql'][:200]} "
+                    f"({queries.count} queries, {db_ms:.1f}ms in the database)",
+                    extra=details,
+                )
+            else:
+                logger.warning(
+                    f"Many queries in {view}: {queries.count} queries, {db_ms:.1f}ms in the database",
+                    extra=details,
+                )
@@ -0,0 +1,51 @@
+import logging
+
+from django.http import HttpResponse, JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from core.ratelimit import check_request
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Enforce ``RATELIMIT_POLICIES`` with counters shared by all workers (see
+    core.ratelimit). Requests over a limit get a 429 with ``Retry-After``;
+    every rate-limited response carries the ``X-RateLimit-Limit``,
+    ``X-RateLimit-Remaining`` and ``X-RateLimit-Reset`` (seconds until the
+    current window ends) headers.
+
+    Must come after ``AuthenticationMiddleware`` so per-user policies can
+    see ``request.user``.
+    """
+
+    def process_request(self, request):
+        try:
+            decision = check_request(request)
+        except Exception as e:
+            # An unreachable cache must not take the site down with it
+            logger.error(f"Rate limiter unavailable, letting {request.path} through: {e}")
+            return None
+        request.rate_limit = decision
+        if decision is None or decision.allowed:
+            return None
+
+        message = "Too many requests. Please try again later."
+        if request.path_info.startswith('/api/'):
+            response = JsonResponse(
+                {'detail': f"Request was throttled. Expected available in {decision.retry_after} seconds."},
+                status=429,
+            )
+        else:
+            response = HttpResponse(message, status=429, content_type="text/plain")
+        response['Retry-After'] = str(decision.retry_after)
+        return response
+
+    def process_response(self, request, response):
+        decision = getattr(request, 'rate_limit', None)
+        if decision is not None:
+            response['X-RateLimit-Limit'] = str(decision.limit)
+            response['X-RateLimit-Remaining'] = str(decision.remaining)
+            response['X-RateLimit-Reset'] = str(decision.reset)
+        return response
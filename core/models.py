@@ -117,3 +117,30 @@ class Newsletter(models.Model):
     
     def __str__(self):
         return self.email
+
+
+class IdempotencyKey(models.Model):
+    """
+    First response to a request sent with an ``Idempotency-Key`` header
+    (see ``core.idempotency``). ``status_code`` is empty while that request
+    is still running.
+    """
+    user = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE,
+                             related_name='idempotency_keys', verbose_name=_("User"))
+    key = models.CharField(_("Key"), max_length=255)
+    fingerprint = models.CharField(_("Request Fingerprint"), max_length=64)
+    status_code = models.PositiveSmallIntegerField(_("Status Code"), null=True, blank=True)
+    response_headers = models.JSONField(_("Response Headers"), default=dict, blank=True)
+    response_body = models.BinaryField(_("Response Body"), blank=True, default=b'')
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    expires_at = models.DateTimeField(_("Expires At"), db_index=True)
+
+    class Meta:
+        verbose_name = _("Idempotency Key")
+        verbose_name_plural = _("Idempotency Keys")
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='core_idempotencykey_unique_user_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
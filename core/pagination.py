@@ -0,0 +1,140 @@
+"""
+Row counts for pagination without a full ``COUNT(*)``.
+
+Django's ``Paginator`` counts every matching row before it can render a
+page, which on large tables costs as much as reading the table. Most list
+pages only need to know whether there is a next page and roughly how many
+pages there are, so ``approximate_count`` answers from the database's table
+statistics when the queryset is unfiltered, and otherwise counts at most
+``COUNT_CAP`` rows. ``EstimatedCountPaginator`` is a drop-in ``Paginator``
+built on it for the HTML list views.
+"""
+import logging
+
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+# Rows counted exactly before the total is reported as an estimate
+COUNT_CAP = 1000
+
+
+def table_row_estimate(model, using='default'):
+    """
+    Row count of ``model``'s table from the planner statistics, or None.
+
+    Uses ``pg_class.reltuples`` on PostgreSQL and ``sqlite_stat1`` on SQLite
+    (only present after ``ANALYZE``). Other backends return None.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if cursor.fetchone() is None:
+                    return None
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError as e:
+        logger.error(f"Error reading row estimate for {table}: {e}")
+        return None
+    if not row or row[0] is None:
+        return None
+    # sqlite_stat1.stat is "<rows> <rows per key> ..."
+    estimate = int(str(row[0]).split()[0])
+    # reltuples is -1 for tables that were never analyzed
+    return estimate if estimate >= 0 else None
+
+
+def _is_unfiltered(queryset):
+    query = queryset.query
+    return not query.where and not query.distinct and not query.combinator and query.low_mark == 0 and query.high_mark is None
+
+
+def approximate_count(queryset, cap=COUNT_CAP):
+    """
+    Return ``(count, is_exact)`` for ``queryset``.
+
+    Unfiltered querysets of tables larger than ``cap`` are answered from the
+    table statistics without scanning. Otherwise at most ``cap + 1`` rows are
+    counted; if there are more, ``cap`` (or the table estimate, if larger) is
+    returned as an estimate.
+    """
+    if not hasattr(queryset, 'query'):
+        return len(queryset), True
+
+    unfiltered = _is_unfiltered(queryset)
+    estimate = table_row_estimate(queryset.model, queryset.db) if unfiltered else None
+    if estimate is not None and estimate > cap:
+        return estimate, False
+
+    counted = queryset.order_by()[:cap + 1].count()
+    if counted <= cap:
+        return counted, True
+    return max(cap, estimate or 0), False
+
+
+class EstimatedPage(Page):
+    """Page whose ``has_next`` comes from fetching one extra row rather than from the total."""
+
+    def __init__(self, object_list, number, paginator, has_more=None):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        if self.has_more is not None:
+            return self.has_more
+        return super().has_next()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    ``Paginator`` for list pages that don't need an exact total.
+
+    ``count`` comes from ``approximate_count``. When it is only an estimate,
+    pages past the estimated last page stay reachable and each page fetches
+    one extra row to know whether another page follows; ``count_is_exact``
+    tells templates whether to show the total as "about".
+    """
+    count_cap = COUNT_CAP
+
+    @cached_property
+    def _approximate_count(self):
+        return approximate_count(self.object_list, self.count_cap)
+
+    @cached_property
+    def count(self):
+        return self._approximate_count[0]
+
+    @property
+    def count_is_exact(self):
+        return self._approximate_count[1]
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Beyond the estimated last page; page() finds out if it is empty
+            if not self.count_is_exact and int(number) > 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return self._get_page(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
@@ -4,43 +4,59 @@ Performance optimization utilities for the tourism project.
 import time
 import functools
 import logging
+from contextlib import ExitStack
 from django.core.cache import cache
 from django.conf import settings
-from django.db import connection, reset_queries
+from django.db import connections
 from django.utils.decorators import method_decorator
 
+from core.querystats import RequestQueries
+
 logger = logging.getLogger(__name__)
 
+def _queries_on_all_connections(stack):
+    queries = RequestQueries()
+    for conn in connections.all():
+        stack.enter_context(conn.execute_wrapper(queries))
+    return queries
+
+
 def query_debugger(func):
     """
     Debug database queries for a function.
     Use as a decorator on view functions to log the number of queries executed.
+    Works with DEBUG=False: queries are counted with an execute wrapper (see
+    core.querystats), not read from ``connection.queries``.
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        reset_queries()
         start = time.time()
-        result = func(*args, **kwargs)
+        with ExitStack() as stack:
+            queries = _queries_on_all_connections(stack)
+            result = func(*args, **kwargs)
         end = time.time()
-        
-        query_count = len(connection.queries)
-        query_time = sum(float(q.get('time', 0)) for q in connection.queries)
-        
+
+        query_count = queries.count
+        query_time = queries.seconds
+
         logger.debug(f"Function: {func.__name__}")
         logger.debug(f"Number of Queries: {query_count}")
         logger.debug(f"Finished in: {(end - start):.2f}s")
         logger.debug(f"Query time: {query_time:.2f}s")
-        
+
+        for suspect in queries.suspects():
+            logger.warning(f"Suspected N+1 query in {func.__name__}: {suspect['count']} x {suspect['sql']}")
+
         # Log slow functions (taking more than 1 second)
         if end - start > 1.0:
             logger.warning(f"Slow function detected: {func.__name__} took {(end - start):.2f}s with {query_count} queries")
-            
+
             # Log the actual queries if there are too many
             if query_count > 10:
                 logger.warning("Queries executed:")
-                for i, query in enumerate(connection.queries):
-                    logger.warning(f"{i+1}. {query['sql']}")
-        
+                for i, (sql, (count, seconds)) in enumerate(queries.grouped().items()):
+                    logger.warning(f"{i+1}. {count} x {sql} ({seconds:.3f}s)")
+
         return result
     return wrapper
 
@@ -53,23 +69,27 @@ def method_query_debugger(name):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            reset_queries()
             start = time.time()
-            result = func(*args, **kwargs)
+            with ExitStack() as stack:
+                queries = _queries_on_all_connections(stack)
+                result = func(*args, **kwargs)
             end = time.time()
-            
-            query_count = len(connection.queries)
-            query_time = sum(float(q.get('time', 0)) for q in connection.queries)
-            
+
+            query_count = queries.count
+            query_time = queries.seconds
+
             logger.debug(f"Method: {name}.{func.__name__}")
             logger.debug(f"Number of Queries: {query_count}")
             logger.debug(f"Finished in: {(end - start):.2f}s")
             logger.debug(f"Query time: {query_time:.2f}s")
-            
+
+            for suspect in queries.suspects():
+                logger.warning(f"Suspected N+1 query in {name}.{func.__name__}: {suspect['count']} x {suspect['sql']}")
+
             # Log slow methods (taking more than 1 second)
             if end - start > 1.0:
                 logger.warning(f"Slow method detected: {name}.{func.__name__} took {(end - start):.2f}s with {query_count} queries")
-            
+
             return result
         return wrapper
     return decorator
@@ -0,0 +1,245 @@
+"""
+On-demand request profiling.
+
+``ProfilingMiddleware`` runs a request's view (and the rendering of its
+template response) under ``cProfile`` when:
+
+- a staff user adds ``?_profile=1`` to the URL,
+- the request carries an ``X-Profile-Token`` header made by
+  ``python manage.py profile_token`` (signed with ``SECRET_KEY`` and valid
+  for ``PROFILING_TOKEN_MAX_AGE`` seconds), for tools without a staff
+  session, or
+- it is picked by ``PROFILING_SAMPLE_EVERY`` (about 1 request in N; 0 turns
+  sampling off).
+
+Other requests only pay for the checks above; no profiler is created.
+
+Each capture is written to ``PROFILING_DIR`` as a ``.prof`` file (the
+``pstats`` format, so ``snakeviz`` and similar tools can open it) next to a
+``.json`` file with the URL, view, status, wall and CPU time and the SQL
+query count. Only the newest ``PROFILING_MAX_CAPTURES`` are kept. Files are
+named by capture time, so every worker can trim the ring without
+coordination. The staff pages under ``/admin/performance/profiles/`` list
+the captures and show their top functions.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import tempfile
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+from core.querystats import RequestQueries
+
+logger = logging.getLogger(__name__)
+
+QUERY_FLAG = '_profile'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+TOKEN_SALT = 'core.profiling'
+
+
+def profiling_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'tourism-profiles'))
+
+
+def sample_every():
+    return getattr(settings, 'PROFILING_SAMPLE_EVERY', 0)
+
+
+def max_captures():
+    return getattr(settings, 'PROFILING_MAX_CAPTURES', 100)
+
+
+def token_max_age():
+    return getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+
+
+def make_token():
+    """Signed value for the ``X-Profile-Token`` header."""
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+def valid_token(token):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=token_max_age()) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+def trigger(request):
+    """Why ``request`` should be profiled (``'staff'``, ``'token'`` or ``'sample'``), or None."""
+    if QUERY_FLAG in request.META.get('QUERY_STRING', '') and QUERY_FLAG in request.GET:
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and user.is_staff:
+            return 'staff'
+    token = request.META.get(TOKEN_HEADER)
+    if token and valid_token(token):
+        return 'token'
+    every = sample_every()
+    if every > 0 and random.random() * every < 1:
+        return 'sample'
+    return None
+
+
+def profile(request, get_response, reason):
+    """Run ``get_response(request)`` under cProfile and save the capture."""
+    profiler = cProfile.Profile()
+    queries = RequestQueries()
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler is already running in this thread
+            logger.error(f"Cannot profile {request.path}: {e}")
+            return get_response(request)
+        try:
+            response = get_response(request)
+            # Template responses are rendered after the view; that is part of its cost
+            if callable(getattr(response, 'render', None)) and not getattr(response, 'is_rendered', True):
+                response.render()
+        finally:
+            profiler.disable()
+    wall = time.perf_counter() - started
+    cpu = time.thread_time() - cpu_started
+
+    match = getattr(request, 'resolver_match', None)
+    meta = {
+        'captured_at': datetime.now(timezone.utc).isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.view_name if match is not None else None,
+        'status': response.status_code,
+        'reason': reason,
+        'wall_ms': round(wall * 1000, 1),
+        'cpu_ms': round(cpu * 1000, 1),
+        'queries': queries.count,
+        'db_ms': round(queries.seconds * 1000, 1),
+        'pid': os.getpid(),
+    }
+    try:
+        save(profiler, meta)
+    except Exception as e:
+        logger.error(f"Error saving profile of {request.path}: {e}")
+    return response
+
+
+def save(profiler, meta):
+    """Write a capture and drop the oldest ones beyond ``PROFILING_MAX_CAPTURES``."""
+    directory = profiling_dir()
+    os.makedirs(directory, exist_ok=True)
+    # Sorting the names sorts the captures by time
+    capture_id = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+    profiler.dump_stats(os.path.join(directory, f'{capture_id}.prof'))
+    # The .json file is written last: a capture is listed only once it is complete
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.capture-')
+    with os.fdopen(fd, 'w') as output:
+        json.dump(meta, output)
+    os.replace(temporary, os.path.join(directory, f'{capture_id}.json'))
+    trim(max_captures())
+    return capture_id
+
+
+def trim(keep):
+    ids = _capture_ids()
+    for capture_id in ids[:max(len(ids) - keep, 0)]:
+        for extension in ('json', 'prof'):
+            try:
+                os.unlink(os.path.join(profiling_dir(), f'{capture_id}.{extension}'))
+            except FileNotFoundError:
+                # Another worker trimmed it first
+                pass
+
+
+def _capture_ids():
+    try:
+        names = os.listdir(profiling_dir())
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-5] for name in names if name.endswith('.json') and not name.startswith('.'))
+
+
+def _valid_id(capture_id):
+    return capture_id in _capture_ids()
+
+
+def _read(capture_id):
+    try:
+        with open(os.path.join(profiling_dir(), f'{capture_id}.json')) as source:
+            meta = json.load(source)
+    except (OSError, ValueError):
+        return None
+    meta['id'] = capture_id
+    meta['captured_at'] = datetime.fromisoformat(meta['captured_at'])
+    return meta
+
+
+def captures():
+    """Metadata of the stored captures, newest first, each with its ``id``."""
+    found = (_read(capture_id) for capture_id in reversed(_capture_ids()))
+    return [meta for meta in found if meta is not None]
+
+
+def capture(capture_id):
+    """Metadata of one capture, or None if it does not exist (any more)."""
+    if not _valid_id(capture_id):
+        return None
+    return _read(capture_id)
+
+
+def profile_path(capture_id):
+    if not _valid_id(capture_id):
+        return None
+    return os.path.join(profiling_dir(), f'{capture_id}.prof')
+
+
+def top_functions(capture_id, limit=40, sort='cumulative'):
+    """
+    The ``limit`` functions with the highest cumulative (or ``'tottime'``)
+    time: dicts with ``function``, ``location``, ``calls``, ``primitive_calls``,
+    ``tottime``, ``cumtime`` and ``percall`` (cumulative per call) in
+    seconds, and ``share``, the percentage of the whole request's time.
+    """
+    path = profile_path(capture_id)
+    if path is None:
+        return None
+    stats = pstats.Stats(path).stats
+    total = max((entry[3] for entry in stats.values()), default=0)
+    index = 3 if sort == 'cumulative' else 2
+    rows = []
+    for (filename, line, name), (primitive, calls, tottime, cumtime, _callers) in sorted(
+        stats.items(), key=lambda item: item[1][index], reverse=True
+    )[:limit]:
+        rows.append({
+            'function': name,
+            'location': f'{_short_path(filename)}:{line}' if line else filename,
+            'calls': calls,
+            'primitive_calls': primitive,
+            'tottime': tottime,
+            'cumtime': cumtime,
+            'percall': cumtime / primitive if primitive else 0,
+            'share': cumtime / total * 100 if total else 0,
+        })
+    return rows
+
+
+def _short_path(filename):
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        return filename[len(base):].lstrip(os.sep)
+    marker = f'site-packages{os.sep}'
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
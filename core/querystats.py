@@ -0,0 +1,178 @@
+"""
+Per-request SQL statistics that work with ``DEBUG=False``.
+
+``connection.queries`` is only filled when ``DEBUG=True``, so the
+``query_debugger`` decorators saw nothing in production. ``RequestQueries``
+is installed with ``connection.execute_wrapper`` instead: it times each
+statement Django sends and counts it under its SQL text, which for an ORM
+query is the same string every time with the values passed separately.
+That is a dict update per query, cheap enough to leave on; how many
+requests it covers is set by ``QUERY_STATS_SAMPLE_RATE``.
+
+When the request ends, statements are normalized (literals and parameters
+replaced by ``?``, ``IN`` lists of any length collapsed) and grouped. A
+``SELECT`` run ``QUERY_STATS_N_PLUS_ONE_THRESHOLD`` times or more in one
+request is reported as a suspected N+1 query: the usual sign of a related
+object loaded inside a loop instead of with ``select_related`` or
+``prefetch_related``.
+
+Totals per view and the suspected N+1 queries are shared across workers
+like the latency histograms (see core.metrics) and shown on the
+performance dashboard.
+"""
+import functools
+import hashlib
+import re
+import time
+
+from django.conf import settings
+
+from core.metrics import WorkerTotals
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def sample_rate():
+    return getattr(settings, 'QUERY_STATS_SAMPLE_RATE', 1.0)
+
+
+def n_plus_one_threshold():
+    return getattr(settings, 'QUERY_STATS_N_PLUS_ONE_THRESHOLD', 5)
+
+
+def log_threshold():
+    return getattr(settings, 'QUERY_STATS_LOG_THRESHOLD', 50)
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize(sql):
+    """``sql`` with its values replaced by ``?``, so statements differing only in values compare equal."""
+    sql = _STRING.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """Short stable id of the normalized ``sql``, for headers and log searches."""
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+class RequestQueries:
+    """
+    ``execute_wrapper`` counting the queries of one request (one thread).
+    ``statements`` maps each SQL string to ``[executions, seconds]``.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            entry = self.statements.get(sql)
+            if entry is None:
+                self.statements[sql] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def grouped(self):
+        """``{normalized sql: [executions, seconds]}``."""
+        groups = {}
+        for sql, (count, seconds) in self.statements.items():
+            key = normalize(sql)
+            if key in groups:
+                groups[key][0] += count
+                groups[key][1] += seconds
+            else:
+                groups[key] = [count, seconds]
+        return groups
+
+    def suspects(self, threshold=None):
+        """
+        Suspected N+1 queries: dicts with the normalized ``sql``, its
+        ``fingerprint``, ``count`` and ``seconds``, most repeated first.
+        """
+        threshold = n_plus_one_threshold() if threshold is None else threshold
+        found = [
+            {'sql': sql, 'fingerprint': fingerprint(sql), 'count': count, 'seconds': seconds}
+            for sql, (count, seconds) in self.grouped().items()
+            if count >= threshold and sql.lstrip('(').upper().startswith('SELECT')
+        ]
+        return sorted(found, key=lambda suspect: suspect['count'], reverse=True)
+
+
+class QueryRecorder(WorkerTotals):
+    """
+    ``('view', view, '')``: sampled requests, queries, seconds in the
+    database and requests with a suspected N+1 query.
+    ``('n+1', view, sql)``: requests where ``sql`` was repeated, its
+    executions in them and their seconds.
+    """
+
+    name = 'queries'
+
+    def new_value(self, key):
+        return [0, 0, 0.0, 0] if key[0] == 'view' else [0, 0, 0.0]
+
+    def record(self, view, queries, suspects):
+        totals = self.value(('view', view, ''))
+        totals[0] += 1
+        totals[1] += queries.count
+        totals[2] += queries.seconds
+        if suspects:
+            totals[3] += 1
+        for suspect in suspects:
+            repeated = self.value(('n+1', view, suspect['sql']))
+            repeated[0] += 1
+            repeated[1] += suspect['count']
+            repeated[2] += suspect['seconds']
+
+
+recorder = QueryRecorder()
+
+
+def view_query_stats(totals):
+    """``{view: {'sampled', 'avg_queries', 'avg_db_ms', 'n_plus_one'}}`` from ``recorder.collect()``."""
+    stats = {}
+    for (kind, view, _sql), value in totals.items():
+        if kind != 'view':
+            continue
+        requests, queries, seconds, flagged = value
+        stats[view] = {
+            'sampled': requests,
+            'avg_queries': queries / requests,
+            'avg_db_ms': seconds / requests * 1000,
+            'n_plus_one': flagged,
+        }
+    return stats
+
+
+def n_plus_one_summaries(totals):
+    """Suspected N+1 queries from ``recorder.collect()``, most time spent first."""
+    rows = []
+    for (kind, view, sql), value in totals.items():
+        if kind != 'n+1':
+            continue
+        requests, executions, seconds = value
+        rows.append({
+            'view': view,
+            'sql': sql,
+            'fingerprint': fingerprint(sql),
+            'requests': requests,
+            'avg_repeats': executions / requests,
+            'total_seconds': seconds,
+        })
+    return sorted(rows, key=lambda row: row['total_seconds'], reverse=True)
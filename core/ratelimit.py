@@ -0,0 +1,185 @@
+"""
+Rate limiting shared by every worker process.
+
+``APIRequestThrottleMiddleware`` used to count requests in a dict on each
+worker, so the real limit was the configured one times the number of
+workers, the dict grew until its periodic cleanup, and concurrent threads
+could lose updates. Counters now live in the ``RATELIMIT_CACHE_ALIAS`` cache
+(Redis in production, see ``SHARED_CACHE_URL``) and are only changed
+with the cache's atomic ``incr``.
+
+Each policy in ``RATELIMIT_POLICIES`` applies a rate such as ``'60/m'`` to
+the requests whose path matches its pattern (and method, if given),
+counted per client IP or per signed-in user. The limit is a sliding window
+approximated from two fixed windows: the count of the current window plus
+the previous window's count weighted by how much of it still overlaps the
+sliding window. A request costs one ``incr`` and one ``get`` per matching
+policy, whatever the traffic; a rejected request is taken back out of the
+count, so clients retrying too fast do not extend their own block.
+
+Keys carry the window number, so a counter is never reset in place and
+simply expires after two windows.
+"""
+import math
+import re
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+RATE_PATTERN = re.compile(r'^\s*(?P<limit>\d+)\s*/\s*(?P<count>\d*)\s*(?P<unit>[smhd])\w*\s*$')
+
+
+def parse_rate(rate):
+    """``'60/m'`` -> ``(60, 60)``: requests allowed and window in seconds. Also takes ``'5/10s'``."""
+    match = RATE_PATTERN.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '60/m' or '5/10s'")
+    return int(match['limit']), int(match['count'] or 1) * PERIODS[match['unit']]
+
+
+class Policy:
+    """One rate limit: ``rate`` for requests matching ``path`` and ``methods``, counted per ``key``."""
+
+    KEYS = ('ip', 'user')
+
+    def __init__(self, name, path, rate, key='ip', methods=None, exempt_staff=False):
+        if key not in self.KEYS:
+            raise ValueError(f"Rate limit policy {name!r}: key must be one of {self.KEYS}")
+        self.name = name
+        self.path = re.compile(path)
+        self.rate = rate
+        self.limit, self.period = parse_rate(rate)
+        self.key = key
+        self.methods = {method.upper() for method in methods} if methods else None
+        self.exempt_staff = exempt_staff
+
+    def matches(self, request):
+        if self.methods is not None and request.method not in self.methods:
+            return False
+        return bool(self.path.search(request.path_info))
+
+    def identity(self, request):
+        """Who the requests are counted for, or None if the request is exempt."""
+        if self.key == 'user' or self.exempt_staff:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                if self.exempt_staff and user.is_staff:
+                    return None
+                if self.key == 'user':
+                    return f'user:{user.pk}'
+        return f'ip:{client_ip(request)}'
+
+
+def trusted_proxies():
+    return getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 0)
+
+
+def client_ip(request):
+    """
+    Address the request came from. ``X-Forwarded-For`` is only read behind
+    ``RATELIMIT_TRUSTED_PROXIES`` proxies, and from the right: each proxy
+    appends the address it got the request from, so the entry of the
+    outermost trusted proxy is the client; entries left of it are whatever
+    the client sent.
+    """
+    proxies = trusted_proxies()
+    if proxies > 0:
+        forwarded = [
+            address.strip()
+            for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+            if address.strip()
+        ]
+        if forwarded:
+            return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+Decision = namedtuple('Decision', ['policy', 'allowed', 'limit', 'remaining', 'reset', 'retry_after', 'key'])
+
+
+def get_cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE_ALIAS', 'default')]
+
+
+def _increment(cache, key, timeout):
+    """Atomically add one to ``key``, creating it if needed; returns the new count."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # First request of the window; if another process won the race, count on its key
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+def hit(policy, identity, now=None):
+    """Count one request of ``identity`` against ``policy`` and decide whether it may go through."""
+    cache = get_cache()
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now, policy.period)
+    window = int(window)
+    base = f'ratelimit:{policy.name}:{identity}'
+    current_key = f'{base}:{window}'
+
+    count = _increment(cache, current_key, policy.period * 2)
+    previous = cache.get(f'{base}:{window - 1}') or 0
+    weight = 1 - elapsed / policy.period
+    used = previous * weight + count
+
+    reset = math.ceil(policy.period - elapsed)
+    if used <= policy.limit:
+        return Decision(policy, True, policy.limit, int(policy.limit - used), reset, 0, current_key)
+
+    # Rejected requests don't count
+    cache.decr(current_key)
+    count -= 1
+    if count + 1 > policy.limit or not previous:
+        # Only the next window has room
+        retry_after = reset
+    else:
+        # Wait until enough of the previous window has slid out for one more request
+        retry_after = math.ceil(policy.period * (1 - (policy.limit - count - 1) / previous) - elapsed)
+    return Decision(policy, False, policy.limit, 0, reset, max(retry_after, 1), current_key)
+
+
+_policies = None
+_policies_source = None
+
+
+def get_policies():
+    """``Policy`` objects for ``RATELIMIT_POLICIES``, rebuilt when the setting changes."""
+    global _policies, _policies_source
+    source = getattr(settings, 'RATELIMIT_POLICIES', [])
+    if source is not _policies_source:
+        _policies = [Policy(**options) for options in source]
+        _policies_source = source
+    return _policies
+
+
+def check_request(request):
+    """
+    Count ``request`` against every policy it matches. Returns the tightest
+    ``Decision`` (a rejection if any policy rejects it), or None if no
+    policy applies.
+    """
+    if not getattr(settings, 'RATELIMIT_ENABLED', True):
+        return None
+    allowed = []
+    for policy in get_policies():
+        if not policy.matches(request):
+            continue
+        identity = policy.identity(request)
+        if identity is None:
+            continue
+        decision = hit(policy, identity)
+        if not decision.allowed:
+            # The request doesn't go through, so the other policies don't count it either
+            for counted in allowed:
+                get_cache().decr(counted.key)
+            return decision
+        allowed.append(decision)
+    return min(allowed, key=lambda decision: decision.remaining, default=None)
@@ -0,0 +1,98 @@
+"""
+Process-wide registry of the database tables that are ready to be queried.
+
+Views used to probe each table with ``SELECT 1 FROM <table> LIMIT 1`` on every
+request so that pages keep rendering before migrations have been applied.
+The registry introspects the table list once per worker and answers those
+questions from memory. It is invalidated by the ``post_migrate`` signal and
+can be refreshed with the ``refresh_schema_registry`` management command.
+"""
+import logging
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# While some tables are still missing (for example on the first deploy, when
+# migrations run in a separate process) re-introspect at most this often.
+MISSING_TABLE_RECHECK_SECONDS = 30
+
+
+def _table_name(table):
+    """Accept either a model class or a raw table name."""
+    meta = getattr(table, '_meta', None)
+    if meta is not None:
+        return meta.db_table
+    return table
+
+
+class SchemaRegistry:
+    """
+    Cache of the table names present in a database.
+
+    The table list is loaded lazily on first use, which happens once per
+    worker process. Lookups for tables that exist never touch the database
+    again; lookups for missing tables trigger a single introspection query at
+    most every ``MISSING_TABLE_RECHECK_SECONDS``.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self._tables = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Introspect the database and replace the cached table list."""
+        connection = connections[self.using]
+        try:
+            with connection.cursor() as cursor:
+                tables = frozenset(connection.introspection.table_names(cursor))
+        except Exception as e:
+            # Leave the registry unloaded so the next lookup tries again.
+            logger.error(f"Error introspecting database tables: {e}")
+            return frozenset()
+
+        with self._lock:
+            self._tables = tables
+            self._checked_at = time.monotonic()
+        return tables
+
+    def invalidate(self):
+        """Forget the cached table list; it is reloaded on next lookup."""
+        with self._lock:
+            self._tables = None
+
+    @property
+    def tables(self):
+        tables = self._tables
+        if tables is None:
+            tables = self.refresh()
+        return tables
+
+    def is_ready(self, *tables):
+        """Return True if every given model or table name exists."""
+        names = [_table_name(table) for table in tables]
+        known = self.tables
+        if all(name in known for name in names):
+            return True
+
+        if time.monotonic() - self._checked_at >= MISSING_TABLE_RECHECK_SECONDS:
+            known = self.refresh()
+            return all(name in known for name in names)
+        return False
+
+
+schema_registry = SchemaRegistry()
+
+
+def tables_ready(*tables):
+    """Shortcut for ``schema_registry.is_ready``."""
+    return schema_registry.is_ready(*tables)
+
+
+def invalidate_schema_registry(sender=None, **kwargs):
+    """``post_migrate`` receiver that drops the cached table list."""
+    schema_registry.invalidate()
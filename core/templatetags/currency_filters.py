@@ -1,7 +1,7 @@
 from django import template
 from django.conf import settings
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from core.models import Currency
+from core.currency_rates import current_rates
 import logging
 
 register = template.Library()
@@ -12,6 +12,7 @@ def convert_currency(context, value, original_currency_code=None):
     """
     Converts a given value from its original currency to the selected currency.
     Assumes exchange rates in the Currency model are relative to the base currency (settings.DEFAULT_CURRENCY_CODE).
+    Rates come from the worker's snapshot of the Currency table (core.currency_rates), not the database.
 
     Usage: {% convert_currency tour.price tour.currency.code %}
            {% convert_currency tour.discount_price tour.currency.code %}
@@ -49,12 +50,11 @@ def convert_currency(context, value, original_currency_code=None):
     original_rate = None
     original_currency = None
     if original_currency_code:
-        try:
-            original_currency = Currency.objects.get(code=original_currency_code)
-            original_rate = original_currency.exchange_rate
-        except Currency.DoesNotExist:
+        original_currency = current_rates().get(original_currency_code)
+        if original_currency is None:
             logger.warning(f"Original currency not found in DB for code: {original_currency_code}")
             return f"{value:.2f} {original_currency_code}?" # Indicate missing original currency rate
+        original_rate = original_currency.exchange_rate
     elif base_currency_code == target_currency.code:
          # If original code wasn't provided AND target is base, assume value is already in base
          original_rate = Decimal(1.0)
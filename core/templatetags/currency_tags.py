@@ -1,6 +1,6 @@
 from django import template
 from decimal import Decimal
-from core.models import Currency
+from core.currency_rates import current_rates
 
 register = template.Library()
 
@@ -12,21 +12,20 @@ def convert_price(price, currency_code='USD'):
         
     try:
         # Get the exchange rate for the target currency
-        currency = Currency.objects.get(code=currency_code)
-        converted_price = Decimal(price) * currency.exchange_rate
+        exchange_rate = current_rates().rate(currency_code)
+        if exchange_rate is None:
+            return price
+        converted_price = Decimal(price) * exchange_rate
         
         # Format with 2 decimal places
         return f"{converted_price:.2f}"
-    except Currency.DoesNotExist:
-        return price
     except Exception:
         return price
 
 @register.simple_tag
 def currency_symbol(currency_code='USD'):
     """Return the symbol for the specified currency"""
-    try:
-        currency = Currency.objects.get(code=currency_code)
-        return currency.symbol
-    except Currency.DoesNotExist:
-        return '$'  # Default to USD symbol
\ No newline at end of file
+    currency = current_rates().get(currency_code)
+    if currency is None:
+        return '$'  # Default to USD symbol
+    return currency.symbol
\ No newline at end of file
@@ -0,0 +1,232 @@
+import datetime
+import multiprocessing
+import re
+import tempfile
+import threading
+import unittest
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.counters import CounterBuffer
+from core.currency_rates import rate_tables
+from core.metrics import LatencyRecorder
+from core.ratelimit import check_request, client_ip, get_cache
+from core.schema import schema_registry
+from reviews.models import Review
+from tour.facets import get_facet_index
+from tour.models import Category, Destination, Tour, TourDate
+
+PROBE = re.compile(r'^SELECT 1 FROM\b', re.IGNORECASE)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class SchemaProbeTests(TestCase):
+    """The pages ask ``core.schema`` whether tables exist instead of probing them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        destination = Destination.objects.create(
+            name='Luxor', description='Temples', cover_image='destinations/luxor.jpg',
+            country='Egypt', city='Luxor', is_featured=True,
+        )
+        category = Category.objects.create(name='Culture', description='Culture')
+        cls.tours = []
+        for number in range(3):
+            tour = Tour.objects.create(
+                name=f'Nile Tour {number}', description='Cruise', short_description='Cruise',
+                destination=destination, duration_days=3, duration_nights=2, price=100,
+                max_people=10, cover_image='tours/nile.jpg', is_featured=True,
+            )
+            tour.categories.add(category)
+            TourDate.objects.create(
+                tour=tour, start_date=datetime.date.today() + datetime.timedelta(days=30),
+                end_date=datetime.date.today() + datetime.timedelta(days=33), available_seats=10,
+            )
+            cls.tours.append(tour)
+        user = get_user_model().objects.create_user(username='reviewer', email='reviewer@example.com')
+        Review.objects.create(tour=cls.tours[0], user=user, rating=5, comment='Great')
+
+    def setUp(self):
+        # All three are loaded once per worker; load them here so the counts are per request
+        schema_registry.refresh()
+        rate_tables.load()
+        get_facet_index()
+
+    def assertNoProbes(self, url, queries):
+        with CaptureQueriesContext(connection) as captured:
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        probes = [query['sql'] for query in captured if PROBE.match(query['sql'])]
+        self.assertEqual(probes, [])
+
+    def test_home(self):
+        self.assertNoProbes(reverse('core:home'), 3)
+
+    def test_tour_list(self):
+        self.assertNoProbes(reverse('tour:tour_list'), 7)
+
+    def test_tour_detail(self):
+        self.assertNoProbes(reverse('tour:tour_detail', args=[self.tours[0].slug]), 7)
+
+
+class CounterBufferTests(TestCase):
+    """Buffered increments only reach the database they were counted against."""
+
+    @classmethod
+    def setUpTestData(cls):
+        destination = Destination.objects.create(
+            name='Siwa', description='Oasis', cover_image='destinations/siwa.jpg', country='Egypt', city='Siwa',
+        )
+        cls.tour = Tour.objects.create(
+            name='Siwa Oasis', description='Oasis', short_description='Oasis', destination=destination,
+            duration_days=2, duration_nights=1, price=90, max_people=8, cover_image='tours/siwa.jpg',
+        )
+
+    def test_flush(self):
+        buffer = CounterBuffer(autoflush=False)
+        for _ in range(3):
+            buffer.increment(Tour, self.tour.pk)
+        self.assertEqual(buffer.pending(Tour, self.tour.pk), 3)
+        with self.assertNumQueries(3):  # savepoint, UPDATE, release
+            self.assertEqual(buffer.flush(), 1)
+        self.tour.refresh_from_db()
+        self.assertEqual(self.tour.view_count, 3)
+
+    def test_dropped_when_database_changed(self):
+        buffer = CounterBuffer(autoflush=False)
+        buffer.increment(Tour, self.tour.pk)
+        # As after the test runner destroyed the test database at exit
+        with mock.patch.dict(connection.settings_dict, NAME='another-database'):
+            with self.assertNumQueries(0):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.flush(), 0)
+        self.tour.refresh_from_db()
+        self.assertEqual(self.tour.view_count, 0)
+
+
+class WorkerTotalsTests(SimpleTestCase):
+    """Per-thread shards and the files the workers share their totals through."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def observe_in_thread(self, recorder):
+        thread = threading.Thread(target=recorder.observe, args=(('tour:tour_list', 'GET', '2xx'), 0.05))
+        thread.start()
+        thread.join()
+
+    def test_shards_of_ended_threads_retired(self):
+        recorder = LatencyRecorder(autoflush=False)
+        for _ in range(20):
+            self.observe_in_thread(recorder)
+        snapshot = recorder.snapshot()
+        self.assertEqual(sum(snapshot[('tour:tour_list', 'GET', '2xx')][:-1]), 20)
+        self.assertEqual(recorder._shards, [])
+        self.observe_in_thread(recorder)
+        self.assertEqual(sum(recorder.snapshot()[('tour:tour_list', 'GET', '2xx')][:-1]), 21)
+
+    def test_reused_pid_keeps_old_totals(self):
+        old = LatencyRecorder(autoflush=False)
+        old.observe(('tour:tour_list', 'GET', '2xx'), 0.05)
+        old.flush()
+        # A new worker that got the pid of the one that exited
+        new = LatencyRecorder(autoflush=False)
+        new.observe(('tour:tour_list', 'GET', '2xx'), 0.05)
+        new.flush()
+        self.assertNotEqual(new.path(), old.path())
+        self.assertEqual(new.workers(), 2)
+        self.assertEqual(sum(new.collect()[('tour:tour_list', 'GET', '2xx')][:-1]), 2)
+
+
+class ClientIpTests(SimpleTestCase):
+    """X-Forwarded-For is only trusted as far as the configured proxies."""
+
+    def request(self, forwarded_for):
+        return RequestFactory().get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR=forwarded_for)
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=0)
+    def test_no_trusted_proxies_uses_peer(self):
+        self.assertEqual(client_ip(self.request('198.51.100.9')), '10.0.0.2')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=1)
+    def test_spoofed_entries_ignored(self):
+        # The client sent "1.2.3.4"; the load balancer appended the real address
+        self.assertEqual(client_ip(self.request('1.2.3.4, 203.0.113.7')), '203.0.113.7')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=2)
+    def test_proxy_chain(self):
+        self.assertEqual(client_ip(self.request('1.2.3.4, 203.0.113.7, 10.0.0.1')), '203.0.113.7')
+        self.assertEqual(client_ip(self.request('203.0.113.7')), '203.0.113.7')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=1)
+    def test_missing_header_uses_peer(self):
+        self.assertEqual(client_ip(RequestFactory().get('/', REMOTE_ADDR='10.0.0.2')), '10.0.0.2')
+
+
+def send_requests(start, requests, queue):
+    """Worker process: wait for the start signal, then count ``requests`` requests from one client."""
+    factory = RequestFactory()
+    allowed = rejected = 0
+    retry_after = []
+    start.wait()
+    for _ in range(requests):
+        decision = check_request(factory.get('/api/tours/', REMOTE_ADDR='203.0.113.7'))
+        if decision.allowed:
+            allowed += 1
+        else:
+            rejected += 1
+            retry_after.append(decision.retry_after)
+    queue.put((allowed, rejected, retry_after))
+
+
+def shared_cache_backend():
+    return settings.CACHES[getattr(settings, 'RATELIMIT_CACHE_ALIAS', 'default')]['BACKEND']
+
+
+@unittest.skipUnless(
+    shared_cache_backend().endswith('RedisCache'),
+    'needs SHARED_CACHE_URL pointing at Redis; per-process caches give each process its own limit',
+)
+class RateLimitProcessTests(SimpleTestCase):
+    """A limit holds across worker processes, like gunicorn workers sharing Redis."""
+
+    PROCESSES = 4
+    REQUESTS = 40
+
+    def test_limit_holds_across_processes(self):
+        # A policy of its own, so no other counters are touched; a long window keeps the test inside it
+        policy = {'name': f'test-{uuid.uuid4().hex[:8]}', 'path': r'^/api/tours/$', 'rate': '50/h'}
+        # fork, so the processes inherit the overridden settings like forked gunicorn workers do
+        context = multiprocessing.get_context('fork')
+        start = context.Event()
+        queue = context.Queue()
+        with override_settings(RATELIMIT_ENABLED=True, RATELIMIT_POLICIES=[policy]):
+            get_cache().close()
+            workers = [
+                context.Process(target=send_requests, args=(start, self.REQUESTS, queue))
+                for _ in range(self.PROCESSES)
+            ]
+            for worker in workers:
+                worker.start()
+            start.set()
+            results = [queue.get(timeout=60) for _ in workers]
+            for worker in workers:
+                worker.join()
+
+        allowed = sum(result[0] for result in results)
+        rejected = sum(result[1] for result in results)
+        self.assertEqual(allowed, 50)
+        self.assertEqual(rejected, self.PROCESSES * self.REQUESTS - 50)
+        self.assertTrue(all(seconds >= 1 for result in results for seconds in result[2]))
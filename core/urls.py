@@ -5,7 +5,7 @@ from .views import (
     HomeView, AboutView, FAQListView, ContactView,
     TermsConditionsView, PrivacyPolicyView,
     subscribe_newsletter, set_currency, get_exchange_rates,
-    performance_dashboard, healthcheck
+    performance_dashboard, metrics, profile_list, profile_detail, profile_download, healthcheck
 )
 from .views import csrf_token_view
 
@@ -26,6 +26,10 @@ urlpatterns = [
 
     # Performance monitoring
     path('admin/performance/', staff_member_required(performance_dashboard), name='performance_dashboard'),
+    path('admin/performance/profiles/', profile_list, name='profile_list'),
+    path('admin/performance/profiles/<str:capture_id>/', profile_detail, name='profile_detail'),
+    path('admin/performance/profiles/<str:capture_id>/download/', profile_download, name='profile_download'),
+    path('metrics', metrics, name='metrics'),
 
     # Health check
     path('health/', healthcheck, name='healthcheck'),
@@ -15,7 +15,7 @@ from .core_views import (
     csrf_failure
 )
 
-from .performance import performance_dashboard
+from .performance import performance_dashboard, metrics, profile_list, profile_detail, profile_download
 from .healthcheck import healthcheck
 
 # Import the CSRF token view
@@ -14,6 +14,7 @@ from blog.models import Post
 from reviews.models import Review
 from ..models import FAQ, ContactMessage, Newsletter, SiteSetting, Currency
 from ..forms import ContactForm, NewsletterForm
+from ..schema import tables_ready
 
 
 class HomeView(TemplateView):
@@ -26,18 +27,14 @@ class HomeView(TemplateView):
         # Check if database tables exist before querying
         try:
             # Check if the Tour table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
+            tour_table_exists = tables_ready(Tour)
 
             # Only query Tour model if the table exists
             if tour_table_exists:
-                context['featured_tours'] = Tour.objects.filter(is_active=True, is_featured=True)[:6]
-                context['popular_tours'] = Tour.objects.filter(is_active=True).order_by('-view_count')[:6]
+                # Tour cards show each tour's categories and prices in its currency
+                cards = Tour.objects.filter(is_active=True).select_related('currency').prefetch_related('categories')
+                context['featured_tours'] = cards.filter(is_featured=True)[:6]
+                context['popular_tours'] = cards.order_by('-view_count')[:6]
 
                 # Get top reviews for testimonials section
                 context['testimonials'] = Review.objects.filter(
@@ -50,11 +47,7 @@ class HomeView(TemplateView):
                 context['testimonials'] = []
 
             # Check if the Category table exists
-            try:
-                cursor.execute("SELECT 1 FROM tour_category LIMIT 1")
-                category_table_exists = True
-            except Exception:
-                category_table_exists = False
+            category_table_exists = tables_ready(TourCategory)
 
             if category_table_exists:
                 context['tour_categories'] = TourCategory.objects.filter(is_active=True)[:6]
@@ -62,11 +55,7 @@ class HomeView(TemplateView):
                 context['tour_categories'] = []
 
             # Check if the Destination table exists
-            try:
-                cursor.execute("SELECT 1 FROM tour_destination LIMIT 1")
-                destination_table_exists = True
-            except Exception:
-                destination_table_exists = False
+            destination_table_exists = tables_ready(Destination)
 
             if destination_table_exists:
                 context['featured_destinations'] = Destination.objects.filter(is_active=True, is_featured=True)[:6]
@@ -74,11 +63,7 @@ class HomeView(TemplateView):
                 context['featured_destinations'] = []
 
             # Check if the Post table exists
-            try:
-                cursor.execute("SELECT 1 FROM blog_post LIMIT 1")
-                post_table_exists = True
-            except Exception:
-                post_table_exists = False
+            post_table_exists = tables_ready(Post)
 
             if post_table_exists:
                 context['latest_posts'] = Post.objects.filter(is_published=True).order_by('-published_at')[:3]
@@ -109,13 +94,7 @@ class AboutView(TemplateView):
         context = super().get_context_data(**kwargs)
         try:
             # Check if the SiteSetting table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM core_sitesetting LIMIT 1")
-                    sitesetting_table_exists = True
-                except Exception:
-                    sitesetting_table_exists = False
+            sitesetting_table_exists = tables_ready(SiteSetting)
 
             if sitesetting_table_exists:
                 try:
@@ -144,13 +123,7 @@ class FAQListView(ListView):
         """Check if the core_faq table exists before querying"""
         try:
             # Check if the FAQ table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM core_faq LIMIT 1")
-                    faq_table_exists = True
-                except Exception:
-                    faq_table_exists = False
+            faq_table_exists = tables_ready(FAQ)
 
             if not faq_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -189,13 +162,7 @@ class ContactView(FormView):
         context = super().get_context_data(**kwargs)
         try:
             # Check if the SiteSetting table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM core_sitesetting LIMIT 1")
-                    sitesetting_table_exists = True
-                except Exception:
-                    sitesetting_table_exists = False
+            sitesetting_table_exists = tables_ready(SiteSetting)
 
             if sitesetting_table_exists:
                 try:
@@ -239,13 +206,7 @@ class TermsConditionsView(TemplateView):
         context = super().get_context_data(**kwargs)
         try:
             # Check if the SiteSetting table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM core_sitesetting LIMIT 1")
-                    sitesetting_table_exists = True
-                except Exception:
-                    sitesetting_table_exists = False
+            sitesetting_table_exists = tables_ready(SiteSetting)
 
             if sitesetting_table_exists:
                 try:
@@ -272,13 +233,7 @@ class PrivacyPolicyView(TemplateView):
         context = super().get_context_data(**kwargs)
         try:
             # Check if the SiteSetting table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM core_sitesetting LIMIT 1")
-                    sitesetting_table_exists = True
-                except Exception:
-                    sitesetting_table_exists = False
+            sitesetting_table_exists = tables_ready(SiteSetting)
 
             if sitesetting_table_exists:
                 try:
@@ -304,13 +259,7 @@ def set_currency(request):
 
     try:
         # Check if the Currency table exists
-        from django.db import connection
-        with connection.cursor() as cursor:
-            try:
-                cursor.execute("SELECT 1 FROM core_currency LIMIT 1")
-                currency_table_exists = True
-            except Exception:
-                currency_table_exists = False
+        currency_table_exists = tables_ready(Currency)
 
         # Validate if the currency code exists
         if currency_table_exists and currency_code and Currency.objects.filter(code=currency_code).exists():
@@ -339,13 +288,7 @@ def get_exchange_rates(request):
     """API endpoint to get current exchange rates for JavaScript"""
     try:
         # Check if the Currency table exists
-        from django.db import connection
-        with connection.cursor() as cursor:
-            try:
-                cursor.execute("SELECT 1 FROM core_currency LIMIT 1")
-                currency_table_exists = True
-            except Exception:
-                currency_table_exists = False
+        currency_table_exists = tables_ready(Currency)
 
         if not currency_table_exists:
             # Return default USD only if table doesn't exist
@@ -1,44 +1,97 @@
 """
 Performance monitoring views for the tourism project.
 """
-import time
-from django.shortcuts import render
+from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
-from django.core.cache import cache
-from django.db import connection
-from django.utils import timezone
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from core import metrics as request_metrics
+from core import profiling, querystats
+
 
 @staff_member_required
 def performance_dashboard(request):
     """
-    Display performance statistics for the site.
-    """
-    # Get slow pages from cache
-    slow_pages = cache.get('slow_pages', {})
-    
-    # Convert timestamps to datetime objects
-    for path, data in slow_pages.items():
-        data['last_seen'] = timezone.datetime.fromtimestamp(data['last_seen'])
-    
-    # Get database query statistics
-    start_time = time.time()
-    query_count = len(connection.queries)
-    query_time = sum(float(q.get('time', 0)) for q in connection.queries)
-    
-    # Get cache statistics (these would need to be tracked separately in a real app)
-    cache_hits = cache.get('cache_hits', 0)
-    cache_misses = cache.get('cache_misses', 0)
-    
-    # Calculate page load time
-    page_load_time = time.time() - start_time
-    
+    Display request latency percentiles and SQL statistics per view, and
+    suspected N+1 queries, across all workers.
+    """
+    histograms = request_metrics.recorder.collect()
+    rows = request_metrics.view_summaries(histograms)
+    query_totals = querystats.recorder.collect()
+    query_stats = querystats.view_query_stats(query_totals)
+    for row in rows:
+        row['queries'] = query_stats.get(row['view'])
+    context = {
+        'views': rows,
+        'n_plus_one': querystats.n_plus_one_summaries(query_totals),
+        'sample_rate': querystats.sample_rate(),
+        'total_requests': sum(row['requests'] for row in rows),
+        'workers': request_metrics.recorder.workers(),
+        'flush_interval': request_metrics.flush_interval(),
+    }
+    return render(request, 'core/performance_dashboard.html', context)
+
+
+def metrics(request):
+    """
+    Request latency histograms of all workers in the Prometheus text format.
+    Readable by staff, or with ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+    user = getattr(request, 'user', None)
+    if not authorized and not (user is not None and user.is_active and user.is_staff):
+        return HttpResponseForbidden("Forbidden", content_type="text/plain")
+    return HttpResponse(
+        request_metrics.prometheus_text(request_metrics.recorder.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def profile_list(request):
+    """
+    List the stored request profiles (see core.profiling), newest first.
+    """
+    context = {
+        'captures': profiling.captures(),
+        'max_captures': profiling.max_captures(),
+        'sample_every': profiling.sample_every(),
+        'query_flag': profiling.QUERY_FLAG,
+    }
+    return render(request, 'core/profile_list.html', context)
+
+
+@staff_member_required
+def profile_detail(request, capture_id):
+    """
+    Show the top functions of one request profile by cumulative or own time.
+    """
+    sort = 'tottime' if request.GET.get('sort') == 'tottime' else 'cumulative'
+    capture = profiling.capture(capture_id)
+    functions = profiling.top_functions(capture_id, sort=sort) if capture else None
+    if functions is None:
+        raise Http404("Profile not found")
     context = {
-        'slow_pages': slow_pages,
-        'query_count': query_count,
-        'query_time': query_time,
-        'page_load_time': page_load_time,
-        'cache_hits': cache_hits,
-        'cache_misses': cache_misses,
+        'capture': capture,
+        'functions': functions,
+        'sort': sort,
     }
-    
-    return render(request, 'performance_optimizations.html', context)
+    return render(request, 'core/profile_detail.html', context)
+
+
+@staff_member_required
+def profile_download(request, capture_id):
+    """
+    Download the raw ``.prof`` file of a request profile, for snakeviz and similar tools.
+    """
+    path = profiling.profile_path(capture_id)
+    if path is None:
+        raise Http404("Profile not found")
+    try:
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{capture_id}.prof')
+    except FileNotFoundError:
+        raise Http404("Profile not found")
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, WebhookEvent
 from modeltranslation.admin import TranslationAdmin # Import if any fields become translatable
 
 @admin.register(Payment)
@@ -18,3 +18,12 @@ class PaymentAdmin(admin.ModelAdmin): # Inherit from TranslationAdmin if needed
     #     updated = queryset.update(status='refunded')
     #     self.message_user(request, f"{updated} payments marked as refunded.")
     # mark_as_refunded.short_description = "Mark selected payments as refunded"
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'provider', 'event_type', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'provider', 'event_type')
+    search_fields = ('event_id', 'payload')
+    readonly_fields = ('provider', 'event_id', 'event_type', 'payload', 'attempts', 'error', 'received_at', 'processed_at')
+    list_per_page = 25
@@ -0,0 +1,267 @@
+"""
+A local stand-in for the PayPal REST API, for load tests and offline work.
+
+``FakePayPalServer`` answers the calls ``PayPalClient`` makes, with the same
+URLs, status codes and response shapes:
+
+* ``POST /v1/oauth2/token`` issues bearer tokens that expire after
+  ``token_ttl`` seconds; API calls with an unknown or expired token get 401,
+* ``POST /v2/checkout/orders`` creates an order,
+* ``GET /v2/checkout/orders/<id>`` returns it,
+* ``POST /v2/checkout/orders/<id>/capture`` captures it once (422 after that),
+* a ``PayPal-Request-Id`` seen before replays the first response.
+
+Orders are approved as soon as they are created, since there is no buyer.
+After each capture a ``PAYMENT.CAPTURE.COMPLETED`` webhook event is sent to
+``webhook``, which is either a URL to POST to or a callable taking the event.
+
+Every request waits ``latency`` seconds plus up to ``jitter``, and a share
+``error_rate`` of them fails with 503. Run it with ``python manage.py
+fake_paypal_server`` and start the site with ``PAYPAL_API_BASE_URL`` set to
+its URL and ``PAYPAL_TEST_MODE=False``; ``python manage.py loadtest_checkout``
+starts its own.
+"""
+import json
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+ORDER_PATH = re.compile(r'^/v2/checkout/orders/(?P<order_id>[\w-]+)(?P<capture>/capture)?$')
+
+
+def _now():
+    return datetime.now(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class FakePayPalHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out without waiting for the client's ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug(f"Fake PayPal: {format % args}")
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, payload = self.server.handle_call(self.command, self.path, self.headers, body)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Paypal-Debug-Id', uuid.uuid4().hex[:13])
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakePayPalServer(ThreadingHTTPServer):
+    """
+    In-memory PayPal API on ``host:port`` (port 0 picks a free one).
+
+    ``start`` serves it from a background thread; ``stats`` counts the
+    calls, injected errors, replays, tokens and webhooks so far.
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 token_ttl=32400, webhook=None, webhook_delay=0.0):
+        super().__init__((host, port), FakePayPalHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl
+        self.webhook = webhook
+        self.webhook_delay = webhook_delay
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._orders = {}
+        self._replies = {}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-paypal', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_call(self, method, path, headers, body):
+        """Returns ``(status, payload)`` for one API call."""
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        path = path.split('?', 1)[0]
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.error_rate and random.random() < self.error_rate:
+                self.stats['injected_errors'] += 1
+                return 503, self.error('SERVICE_UNAVAILABLE', 'Service Unavailable (injected)')
+
+        if method == 'POST' and path == '/v1/oauth2/token':
+            return self.issue_token()
+
+        token = (headers.get('Authorization') or '').removeprefix('Bearer ')
+        with self._lock:
+            if self._tokens.get(token, 0) <= time.time():
+                self.stats['rejected_tokens'] += 1
+                return 401, {'error': 'invalid_token', 'error_description': 'Token signature verification failed'}
+
+        request_id = headers.get('PayPal-Request-Id')
+        if method == 'POST' and request_id:
+            with self._lock:
+                if request_id in self._replies:
+                    self.stats['replays'] += 1
+                    return self._replies[request_id]
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, self.error('MALFORMED_REQUEST_JSON', 'The request JSON is not well formed.')
+
+        match = ORDER_PATH.match(path)
+        if method == 'POST' and path == '/v2/checkout/orders':
+            reply = self.create_order(data)
+        elif match and method == 'GET' and not match['capture']:
+            reply = self.get_order(match['order_id'])
+        elif match and method == 'POST' and match['capture']:
+            reply = self.capture_order(match['order_id'])
+        else:
+            reply = 404, self.error('RESOURCE_NOT_FOUND', 'The specified resource does not exist.')
+
+        if method == 'POST' and request_id:
+            with self._lock:
+                self._replies[request_id] = reply
+        return reply
+
+    @staticmethod
+    def error(name, message):
+        return {'name': name, 'message': message, 'debug_id': uuid.uuid4().hex[:13]}
+
+    def issue_token(self):
+        token = f"A21AA{secrets.token_urlsafe(32)}"
+        with self._lock:
+            self._tokens[token] = time.time() + self.token_ttl
+            self.stats['tokens'] += 1
+        return 200, {
+            'scope': 'https://uri.paypal.com/services/payments/payment',
+            'access_token': token,
+            'token_type': 'Bearer',
+            'app_id': 'APP-FAKE',
+            'expires_in': self.token_ttl,
+            'nonce': f"{_now()}{uuid.uuid4().hex[:8]}",
+        }
+
+    def links(self, order_id):
+        return [
+            {'href': f"{self.url}/checkoutnow?token={order_id}", 'rel': 'approve', 'method': 'GET'},
+            {'href': f"{self.url}/v2/checkout/orders/{order_id}", 'rel': 'self', 'method': 'GET'},
+            {'href': f"{self.url}/v2/checkout/orders/{order_id}/capture", 'rel': 'capture', 'method': 'POST'},
+        ]
+
+    def create_order(self, data):
+        units = data.get('purchase_units') or []
+        if data.get('intent') not in ('CAPTURE', 'AUTHORIZE') or not units:
+            return 422, self.error('UNPROCESSABLE_ENTITY', 'intent and purchase_units are required.')
+        order_id = uuid.uuid4().hex[:17].upper()
+        order = {
+            'id': order_id,
+            'intent': data['intent'],
+            'status': 'APPROVED',
+            'purchase_units': units,
+            'create_time': _now(),
+            'links': self.links(order_id),
+        }
+        with self._lock:
+            self._orders[order_id] = order
+            self.stats['orders'] += 1
+        return 201, {'id': order_id, 'status': 'CREATED', 'links': order['links']}
+
+    def get_order(self, order_id):
+        with self._lock:
+            order = self._orders.get(order_id)
+        if order is None:
+            return 404, self.error('RESOURCE_NOT_FOUND', f'Order {order_id} does not exist.')
+        return 200, order
+
+    def capture_order(self, order_id):
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None:
+                return 404, self.error('RESOURCE_NOT_FOUND', f'Order {order_id} does not exist.')
+            if order['status'] == 'COMPLETED':
+                return 422, self.error('UNPROCESSABLE_ENTITY', 'ORDER_ALREADY_CAPTURED')
+            amount = order['purchase_units'][0].get('amount', {'currency_code': 'USD', 'value': '0.00'})
+            capture = {
+                'id': uuid.uuid4().hex[:17].upper(),
+                'status': 'COMPLETED',
+                'amount': {'currency_code': amount.get('currency_code'), 'value': amount.get('value')},
+                'custom_id': order['purchase_units'][0].get('custom_id'),
+                'create_time': _now(),
+            }
+            order['status'] = 'COMPLETED'
+            for unit in order['purchase_units']:
+                unit['payments'] = {'captures': [capture]}
+            self.stats['captures'] += 1
+        if self.webhook:
+            self.send_webhook(order, capture)
+        return 201, {
+            'id': order_id,
+            'status': 'COMPLETED',
+            'purchase_units': [
+                {'reference_id': unit.get('reference_id'), 'payments': {'captures': [capture]}}
+                for unit in order['purchase_units']
+            ],
+            'links': self.links(order_id)[1:2],
+        }
+
+    def send_webhook(self, order, capture):
+        event = {
+            'id': f"WH-{uuid.uuid4().hex[:17].upper()}",
+            'event_version': '1.0',
+            'create_time': _now(),
+            'resource_type': 'capture',
+            'event_type': 'PAYMENT.CAPTURE.COMPLETED',
+            'summary': f"Payment completed for {capture['amount']['value']} {capture['amount']['currency_code']}",
+            'resource': dict(capture, supplementary_data={'related_ids': {'order_id': order['id']}}),
+        }
+
+        def deliver():
+            if self.webhook_delay:
+                time.sleep(self.webhook_delay)
+            try:
+                if callable(self.webhook):
+                    self.webhook(event)
+                else:
+                    requests.post(self.webhook, json=event, timeout=10)
+                outcome = 'webhooks'
+            except Exception as e:
+                logger.error(f"Fake PayPal could not deliver webhook {event['id']}: {e}")
+                outcome = 'failed_webhooks'
+            with self._lock:
+                self.stats[outcome] += 1
+
+        threading.Thread(target=deliver, name='fake-paypal-webhook', daemon=True).start()
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from payments.fake_paypal import FakePayPalServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local stand-in for the PayPal REST API (OAuth, orders, capture, '
+        'webhooks) with configurable latency and error injection'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Milliseconds added to every response')
+        parser.add_argument('--jitter', type=float, default=0.0,
+                            help='Up to this many extra milliseconds, at random')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Share of requests answered with 503, between 0 and 1')
+        parser.add_argument('--token-ttl', type=int, default=32400,
+                            help='Seconds before an access token expires')
+        parser.add_argument('--webhook-url',
+                            help='URL receiving PAYMENT.CAPTURE.COMPLETED events, e.g. '
+                                 'http://localhost:8000/en/payments/webhook/paypal/')
+        parser.add_argument('--webhook-delay', type=float, default=0.0,
+                            help='Seconds between a capture and its webhook')
+
+    def handle(self, *args, **options):
+        server = FakePayPalServer(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'] / 1000,
+            error_rate=options['error_rate'],
+            token_ttl=options['token_ttl'],
+            webhook=options['webhook_url'],
+            webhook_delay=options['webhook_delay'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Fake PayPal API listening on {server.url}; run the site with '
+            f'PAYPAL_API_BASE_URL={server.url} PAYPAL_TEST_MODE=False'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(', '.join(f'{name}: {count}' for name, count in sorted(server.stats.items())))
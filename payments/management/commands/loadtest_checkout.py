@@ -0,0 +1,237 @@
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import translation
+
+from booking.models import Booking
+from payments import paypal
+from payments.fake_paypal import FakePayPalServer
+from tour.models import Tour, TourDate
+
+STEPS = ('tour_detail', 'booking_form', 'create_paypal_order', 'capture', 'webhook')
+
+
+def site_url(name, **kwargs):
+    """URL of a view under the default language prefix, as a browser would request it."""
+    with translation.override(translation.get_supported_language_variant(settings.LANGUAGE_CODE)):
+        return reverse(name, kwargs=kwargs)
+
+
+class CheckoutFailed(Exception):
+    """A step of a checkout returned an unexpected response."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent checkouts (tour detail, booking form, PayPal order, capture) '
+        'through the site against a local fake PayPal server and report throughput '
+        'and p50/p95/p99 latency per step'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=100,
+                            help='Checkouts to run in total')
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Checkouts running at the same time, one thread and user each')
+        parser.add_argument('--tour', help='Slug of the tour to book (default: the first active tour)')
+        parser.add_argument('--adults', type=int, default=2, help='Adults per booking')
+        parser.add_argument('--paypal-url',
+                            help='Use a PayPal server that is already running (see fake_paypal_server) '
+                                 'instead of starting one')
+        parser.add_argument('--latency', type=float, default=150.0,
+                            help='Milliseconds the started fake PayPal server takes per call')
+        parser.add_argument('--jitter', type=float, default=100.0,
+                            help='Up to this many extra milliseconds per call, at random')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Share of PayPal calls answered with 503, between 0 and 1')
+
+    def handle(self, *args, **options):
+        tours = Tour.objects.filter(is_active=True).order_by('pk')
+        tour = tours.filter(slug=options['tour']).first() if options['tour'] else tours.first()
+        if tour is None:
+            raise CommandError('No active tour found; create some tours first')
+
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.lock = threading.Lock()
+
+        server = None
+        if options['paypal_url']:
+            paypal_url = options['paypal_url'].rstrip('/')
+        else:
+            server = FakePayPalServer(
+                latency=options['latency'] / 1000,
+                jitter=options['jitter'] / 1000,
+                error_rate=options['error_rate'],
+                webhook=self.deliver_webhook,
+            ).start()
+            paypal_url = server.url
+
+        # A far-future date nobody books, with enough seats for every checkout;
+        # removed again with the load-test users and their bookings
+        tour_date = TourDate.objects.create(
+            tour=tour,
+            start_date=date(2999, 6, 1),
+            end_date=date(2999, 6, 1) + timedelta(days=tour.duration_days),
+            available_seats=options['checkouts'] * options['adults'],
+        )
+        run_id = uuid.uuid4().hex[:8]
+        users = [
+            get_user_model().objects.create_user(
+                username=f'loadtest-{run_id}-{n}', email=f'loadtest-{run_id}-{n}@example.com'
+            )
+            for n in range(options['concurrency'])
+        ]
+        paypal.metrics.reset()
+        self.stdout.write(
+            f'{options["checkouts"]} checkouts of "{tour.name}" with {options["concurrency"]} '
+            f'concurrent users against PayPal at {paypal_url}'
+        )
+        try:
+            with override_settings(
+                PAYPAL_TEST_MODE=False,
+                PAYPAL_API_BASE_URL=paypal_url,
+                ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+            ):
+                elapsed = self.run(users, tour, tour_date, options)
+                if server is not None:
+                    self.wait_for_webhooks(server)
+        finally:
+            Booking.objects.filter(user__in=users).delete()
+            get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+            tour_date.delete()
+            if server is not None:
+                server.stop()
+
+        self.report(options['checkouts'], elapsed, server)
+
+    def run(self, users, tour, tour_date, options):
+        checkouts = iter(range(options['checkouts']))
+        checkouts_lock = threading.Lock()
+
+        def worker(user):
+            client = Client()
+            client.force_login(user)
+            try:
+                while True:
+                    with checkouts_lock:
+                        if next(checkouts, None) is None:
+                            return
+                    try:
+                        self.checkout(client, tour, tour_date, options['adults'])
+                    except CheckoutFailed:
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def checkout(self, client, tour, tour_date, adults):
+        self.step('tour_detail', client.get, site_url('tour:tour_detail', slug=tour.slug))
+        response = self.step('booking_form', client.post, site_url('booking:booking_form', tour_id=tour.pk), {
+            'start_date': tour_date.start_date.isoformat(),
+            'num_adults': adults,
+            'num_children': 0,
+        }, headers={'X-Requested-With': 'XMLHttpRequest', 'Idempotency-Key': str(uuid.uuid4())})
+        booking_id = response.json()['booking_id']
+        response = self.step('create_paypal_order', client.post,
+                             site_url('booking:create_paypal_order', booking_id=booking_id),
+                             headers={'Idempotency-Key': str(uuid.uuid4())})
+        order_id = response.json()['id']
+        self.step('capture', client.post, site_url('booking:capture_paypal_payment', booking_id=booking_id),
+                  json.dumps({'order_id': order_id}),
+                  content_type='application/json', headers={'Idempotency-Key': str(uuid.uuid4())})
+
+    def step(self, name, send, *args, **kwargs):
+        """Send one request of a checkout and record its latency; raises CheckoutFailed on errors."""
+        started = time.perf_counter()
+        try:
+            response = send(*args, **kwargs)
+            failed = response.status_code != 200
+            detail = f'status {response.status_code}'
+            if not failed and response.get('Content-Type', '').startswith('application/json'):
+                data = response.json()
+                failed = data.get('success') is False or 'error' in data
+                detail = data.get('error', detail)
+        except Exception as e:
+            failed, detail = True, repr(e)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if failed:
+                self.errors[name] += 1
+                self.error_samples.setdefault(name, detail)
+        if failed:
+            raise CheckoutFailed(f'{name}: {detail}')
+        return response
+
+    def deliver_webhook(self, event):
+        try:
+            close_old_connections()
+            self.step('webhook', Client().post, site_url('payments:paypal_webhook'), json.dumps(event),
+                      content_type='application/json')
+        except CheckoutFailed:
+            pass
+        finally:
+            connection.close()
+
+    @staticmethod
+    def wait_for_webhooks(server, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.stats['webhooks'] + server.stats['failed_webhooks'] >= server.stats['captures']:
+                return
+            time.sleep(0.05)
+
+    @staticmethod
+    def percentile(latencies, fraction):
+        return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+    def report(self, checkouts, elapsed, server):
+        completed = len(self.latencies['capture']) - self.errors['capture']
+        style = self.style.SUCCESS if completed == checkouts else self.style.ERROR
+        self.stdout.write(style(
+            f'{completed}/{checkouts} checkouts completed in {elapsed:.2f}s '
+            f'({completed / elapsed:.1f} checkouts/s)'
+        ))
+        self.stdout.write(f'{"step":<22}{"requests":>9}{"errors":>8}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+        for name in STEPS:
+            latencies = sorted(self.latencies[name])
+            if not latencies:
+                continue
+            self.stdout.write(
+                f'{name:<22}{len(latencies):>9}{self.errors[name]:>8}{len(latencies) / elapsed:>8.1f}'
+                f'{self.percentile(latencies, 0.50):>9.1f}{self.percentile(latencies, 0.95):>9.1f}'
+                f'{self.percentile(latencies, 0.99):>9.1f}'
+            )
+        for name, detail in self.error_samples.items():
+            self.stdout.write(self.style.ERROR(f'  first {name} error: {detail}'))
+
+        self.stdout.write('PayPal calls made by the site:')
+        for operation, stats in sorted(paypal.call_metrics().items()):
+            self.stdout.write(
+                f'  {operation:<20}{stats["calls"]:>9}{stats["errors"]:>8}{"":>8}'
+                f'{stats["p50_ms"]:>9.1f}{stats["p95_ms"]:>9.1f}{stats["p99_ms"]:>9.1f}'
+            )
+        if server is not None:
+            self.stdout.write('Fake PayPal server: ' + ', '.join(
+                f'{name} {count}' for name, count in sorted(server.stats.items())
+            ))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.webhooks import process_all_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Apply the payment gateway webhook events queued by the webhook views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and process new events every --interval seconds')
+        parser.add_argument('--interval', type=float,
+                            default=getattr(settings, 'WEBHOOK_PROCESS_INTERVAL', 2),
+                            help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                close_old_connections()
+                handled = process_all_pending_events()
+                if handled or not options['loop']:
+                    self.stdout.write(f'Processed {handled} webhook events')
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Error processing webhook events: {e}'))
+                if not options['loop']:
+                    raise
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
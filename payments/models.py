@@ -44,4 +44,50 @@ class Payment(models.Model):
         except Booking.DoesNotExist:
             return f"Payment ID: {self.id} - Status: {self.get_status_display()}"
 
+
+class WebhookEvent(models.Model):
+    """
+    A gateway webhook event as received, applied later in batches
+    (see ``payments.webhooks``).
+
+    ``event_id`` is unique per provider, so a redelivered event is stored
+    only once. Events stay ``pending`` until applied, ``ignored`` when their
+    type needs no action, and ``failed`` once their payment still could not be
+    found after ``WEBHOOK_MAX_ATTEMPTS`` batches.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSED = 'processed'
+    STATUS_IGNORED = 'ignored'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_PROCESSED, _('Processed')),
+        (STATUS_IGNORED, _('Ignored')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    provider = models.CharField(max_length=20, default='paypal')
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100, blank=True)
+    payload = models.TextField(help_text=_("Raw request body"))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Webhook Event")
+        verbose_name_plural = _("Webhook Events")
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            # The worker picks up pending events, fewest attempts first
+            models.Index(fields=['status', 'attempts', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id} ({self.get_status_display()})"
+
 # Consider adding a PaymentAttempt model if you need to track multiple attempts for a single payment/booking.
@@ -1,14 +1,168 @@
-import requests
+"""
+PayPal REST API client.
+
+All clients in a process share one keep-alive ``requests.Session`` whose
+connection pool (``PAYPAL_POOL_SIZE`` connections) is reused across calls,
+with connect/read timeouts and bounded retries of connection errors and
+429/5xx responses. Orders are created and captured with a
+``PayPal-Request-Id`` header, so PayPal treats a retried POST as the same
+request.
+
+The OAuth access token is fetched once and shared: in memory within the
+process and through the ``SHARED_CACHE_ALIAS`` cache (Redis in production,
+see ``SHARED_CACHE_URL``) between workers. It is refreshed
+``PAYPAL_TOKEN_REFRESH_MARGIN`` seconds before it expires (halfway through
+for shorter-lived tokens), by one thread at a time, and dropped when PayPal
+answers 401.
+
+Every call is timed per operation; ``call_metrics()`` returns the counts,
+errors and latency percentiles of this process.
+"""
+import hashlib
 import json
-import uuid
 import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
 from django.conf import settings
-from django.urls import reverse
-from urllib.parse import urljoin
-from datetime import datetime, timedelta
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Responses retried by the session, on top of connection errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Latest latencies kept per operation for the percentiles
+METRICS_WINDOW = 1000
+
+
+def pool_size():
+    return getattr(settings, 'PAYPAL_POOL_SIZE', 10)
+
+
+def max_retries():
+    return getattr(settings, 'PAYPAL_MAX_RETRIES', 2)
+
+
+def request_timeout():
+    """``(connect, read)`` timeout in seconds for API calls."""
+    return (
+        getattr(settings, 'PAYPAL_CONNECT_TIMEOUT', 5),
+        getattr(settings, 'PAYPAL_READ_TIMEOUT', 30),
+    )
+
+
+def token_refresh_margin():
+    return getattr(settings, 'PAYPAL_TOKEN_REFRESH_MARGIN', 5 * 60)
+
+
+def shared_cache():
+    return caches[getattr(settings, 'SHARED_CACHE_ALIAS', 'default')]
+
+
+_session_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def get_session():
+    """The pooled session of this process (a forked worker builds its own)."""
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            retries = Retry(
+                total=max_retries(),
+                backoff_factor=0.3,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(['GET', 'POST']),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size(), max_retries=retries)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session, _session_pid = session, os.getpid()
+    return _session
+
+
+class CallMetrics:
+    """
+    Per-operation call counts, errors and latencies of this process.
+
+    ``record`` only appends to memory under a lock; ``snapshot`` computes the
+    percentiles over the latest ``METRICS_WINDOW`` calls of each operation.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def record(self, operation, seconds, error=False):
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = {
+                    'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0,
+                    'latencies': deque(maxlen=self.window),
+                }
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['latencies'].append(seconds)
+
+    def snapshot(self):
+        """``{operation: {calls, errors, avg_ms, p50_ms, p95_ms, p99_ms, max_ms}}``."""
+        with self._lock:
+            operations = {
+                operation: dict(stats, latencies=sorted(stats['latencies']))
+                for operation, stats in self._operations.items()
+            }
+        result = {}
+        for operation, stats in operations.items():
+            latencies = stats['latencies']
+
+            def percentile(fraction):
+                return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+            result[operation] = {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'avg_ms': stats['total'] / stats['calls'] * 1000,
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'p99_ms': percentile(0.99),
+                'max_ms': stats['max'] * 1000,
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
+metrics = CallMetrics()
+
+
+def call_metrics():
+    return metrics.snapshot()
+
+
+_token_lock = threading.Lock()
+# Access tokens of this process: {cache key: (token, refresh_at)}
+_tokens = {}
+
+
 class PayPalClient:
     """
     PayPal API client for handling payment operations.
@@ -19,23 +173,69 @@ class PayPalClient:
         self.mode = settings.PAYPAL_MODE
         self.test_mode = getattr(settings, 'PAYPAL_TEST_MODE', False)
 
-        # Set the base URL based on mode (sandbox or live)
-        if self.mode == 'sandbox':
+        # Set the base URL based on mode (sandbox or live), unless overridden
+        if getattr(settings, 'PAYPAL_API_BASE_URL', ''):
+            self.base_url = settings.PAYPAL_API_BASE_URL.rstrip('/')
+        elif self.mode == 'sandbox':
             self.base_url = 'https://api.sandbox.paypal.com'
         else:
             self.base_url = 'https://api.paypal.com'
 
         logger.info(f"PayPal client initialized. Mode: {self.mode}, Test mode: {self.test_mode}")
 
+    @property
+    def token_cache_key(self):
+        digest = hashlib.sha256(f"{self.base_url}|{self.client_id}".encode()).hexdigest()[:16]
+        return f"paypal:access_token:{digest}"
+
     def get_access_token(self):
         """
-        Get an access token from PayPal API.
+        Get an access token from PayPal API, shared until shortly before it expires.
         """
         # Return a fake token in test mode
         if self.test_mode:
             logger.info("Using test mode - returning fake access token")
             return "TEST_ACCESS_TOKEN"
 
+        key = self.token_cache_key
+        cached = _tokens.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+
+        with _token_lock:
+            # Another thread or worker may have refreshed it meanwhile
+            for cached in (_tokens.get(key), shared_cache().get(key)):
+                if cached is not None and cached[1] > time.time():
+                    _tokens[key] = cached
+                    return cached[0]
+
+            token, expires_in = self._request_access_token()
+            if expires_in is None:
+                return token
+            # Refresh ahead of expiry; short-lived tokens halfway through
+            lifetime = max(expires_in - token_refresh_margin(), expires_in / 2)
+            _tokens[key] = (token, time.time() + lifetime)
+            shared_cache().set(key, _tokens[key], timeout=max(int(lifetime), 1))
+            return token
+
+    def invalidate_access_token(self, token=None):
+        """
+        Forget the shared token, e.g. after PayPal rejected it. With ``token``,
+        only if that is still the shared one, so concurrent 401s refresh once.
+        """
+        key = self.token_cache_key
+        with _token_lock:
+            for cached in (_tokens.get(key), shared_cache().get(key)):
+                if cached is not None and token not in (None, cached[0]):
+                    return
+            _tokens.pop(key, None)
+            shared_cache().delete(key)
+
+    def _request_access_token(self):
+        """
+        Fetch a new token; returns ``(token, expires_in)``, with ``expires_in``
+        None for the fallback token, which is never shared.
+        """
         url = f"{self.base_url}/v1/oauth2/token"
         headers = {
             "Accept": "application/json",
@@ -47,12 +247,14 @@ class PayPalClient:
 
         try:
             logger.info(f"Requesting PayPal access token from {url}")
-            response = requests.post(
-                url,
+            response = self.request(
+                'get_access_token',
+                'POST',
+                '/v1/oauth2/token',
                 auth=(self.client_id, self.client_secret),
                 headers=headers,
                 data=data,
-                timeout=15  # Increased timeout to prevent hanging
+                timeout=(request_timeout()[0], 15)
             )
 
             logger.info(f"PayPal token response status: {response.status_code}")
@@ -60,7 +262,7 @@ class PayPalClient:
             if response.status_code == 200:
                 token_data = response.json()
                 logger.info("Successfully obtained PayPal access token")
-                return token_data['access_token']
+                return token_data['access_token'], int(token_data.get('expires_in', 0))
             else:
                 error_msg = f"Failed to get PayPal access token: Status {response.status_code}"
                 try:
@@ -75,7 +277,39 @@ class PayPalClient:
             logger.error(f"Network error when getting PayPal access token: {str(e)}")
             # Fall back to test mode if network error
             logger.warning("Falling back to test mode due to network error")
-            return "FALLBACK_TEST_TOKEN"
+            return "FALLBACK_TEST_TOKEN", None
+
+    def request(self, operation, method, path, **kwargs):
+        """Send a request through the pooled session and record its latency under ``operation``."""
+        kwargs.setdefault('timeout', request_timeout())
+        started = time.perf_counter()
+        try:
+            response = get_session().request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.exceptions.RequestException:
+            metrics.record(operation, time.perf_counter() - started, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        metrics.record(operation, elapsed, error=response.status_code >= 400)
+        logger.info(f"PayPal {operation}: status {response.status_code} in {elapsed * 1000:.0f} ms")
+        return response
+
+    def api_request(self, operation, method, path, json=None):
+        """
+        Authenticated API call. POSTs carry a ``PayPal-Request-Id`` so retries
+        are not applied twice; a rejected token is refreshed once.
+        """
+        headers = {"Content-Type": "application/json"}
+        if method == 'POST':
+            headers["PayPal-Request-Id"] = str(uuid.uuid4())
+        for attempt in range(2):
+            access_token = self.get_access_token()
+            headers["Authorization"] = f"Bearer {access_token}"
+            response = self.request(operation, method, path, headers=headers, json=json)
+            if response.status_code != 401 or attempt:
+                return response
+            logger.warning(f"PayPal rejected the access token for {operation}, refreshing it")
+            self.invalidate_access_token(access_token)
+        return response
 
     def create_order(self, booking):
         """
@@ -108,15 +342,6 @@ class PayPalClient:
             }
 
         try:
-            # Get access token
-            access_token = self.get_access_token()
-            url = f"{self.base_url}/v2/checkout/orders"
-
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}"
-            }
-
             # Format currency amounts with 2 decimal places
             amount = "{:.2f}".format(float(booking.total_price))
             subtotal = "{:.2f}".format(float(booking.subtotal))
@@ -206,12 +431,7 @@ class PayPalClient:
 
             # Make the API call
             logger.info(f"Creating PayPal order with payload: {json.dumps(payload)}")
-            response = requests.post(
-                url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            response = self.api_request('create_order', 'POST', '/v2/checkout/orders', json=payload)
 
             logger.info(f"PayPal create order response status: {response.status_code}")
 
@@ -278,22 +498,13 @@ class PayPalClient:
             }
 
         try:
-            # Get access token
-            access_token = self.get_access_token()
-            url = f"{self.base_url}/v2/checkout/orders/{order_id}/capture"
-
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}"
-            }
-
             # Make the API call
             logger.info(f"Capturing PayPal order: {order_id}")
-            response = requests.post(
-                url,
-                headers=headers,
-                json={},  # Empty body for capture
-                timeout=30
+            response = self.api_request(
+                'capture_order',
+                'POST',
+                f'/v2/checkout/orders/{order_id}/capture',
+                json={}  # Empty body for capture
             )
 
             logger.info(f"PayPal capture response status: {response.status_code}")
@@ -326,24 +537,10 @@ class PayPalClient:
         Returns:
             dict: PayPal order response
         """
-        # Get access token
-        access_token = self.get_access_token()
-        url = f"{self.base_url}/v2/checkout/orders"
-
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}"
-        }
-
         try:
             # Make the API call
             logger.info(f"Creating PayPal order with data: {json.dumps(order_data)}")
-            response = requests.post(
-                url,
-                headers=headers,
-                json=order_data,
-                timeout=30
-            )
+            response = self.api_request('create_order_api', 'POST', '/v2/checkout/orders', json=order_data)
 
             logger.info(f"PayPal create order response status: {response.status_code}")
 
@@ -387,22 +584,9 @@ class PayPalClient:
             }
 
         try:
-            # Get access token
-            access_token = self.get_access_token()
-            url = f"{self.base_url}/v2/checkout/orders/{order_id}"
-
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}"
-            }
-
             # Make the API call
             logger.info(f"Getting PayPal order details: {order_id}")
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=30
-            )
+            response = self.api_request('get_order_details', 'GET', f'/v2/checkout/orders/{order_id}')
 
             logger.info(f"PayPal get order details response status: {response.status_code}")
 
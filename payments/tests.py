@@ -0,0 +1,90 @@
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from payments import paypal
+from payments.fake_paypal import FakePayPalServer
+from payments.paypal import PayPalClient, call_metrics
+
+ORDER = {
+    'intent': 'CAPTURE',
+    'purchase_units': [{'reference_id': 'booking_1', 'amount': {'currency_code': 'USD', 'value': '120.00'}}],
+}
+
+
+class CountingPayPalServer(FakePayPalServer):
+    """``FakePayPalServer`` that also counts the TCP connections it accepts."""
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.stats['connections'] += 1
+        super().process_request(request, client_address)
+
+
+class PayPalClientTests(SimpleTestCase):
+    """``PayPalClient`` against a local fake PayPal server."""
+
+    def setUp(self):
+        self.server = CountingPayPalServer().start()
+        self.addCleanup(self.server.stop)
+        settings = override_settings(
+            PAYPAL_API_BASE_URL=self.server.url,
+            PAYPAL_TEST_MODE=False,
+            PAYPAL_CLIENT_ID='client-id',
+            PAYPAL_SECRET='secret',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Start every test like a freshly started worker
+        paypal._tokens.clear()
+        paypal.shared_cache().delete(PayPalClient().token_cache_key)
+        paypal._session = None
+        paypal.metrics.reset()
+
+    def checkout(self, client):
+        order = client.create_order_api(ORDER)
+        self.assertEqual(client.get_order_details(order['id'])['status'], 'APPROVED')
+        self.assertEqual(client.capture_order(order['id'])['status'], 'COMPLETED')
+
+    def test_token_and_connection_reused(self):
+        for _ in range(3):
+            self.checkout(PayPalClient())
+        self.assertEqual(self.server.stats['tokens'], 1)
+        self.assertEqual(self.server.stats['connections'], 1)
+        self.assertEqual(self.server.stats['requests'], 10)
+
+    def test_token_shared_between_workers(self):
+        token = PayPalClient().get_access_token()
+        # Another worker has nothing in memory, only the shared cache
+        paypal._tokens.clear()
+        self.assertEqual(PayPalClient().get_access_token(), token)
+        self.assertEqual(self.server.stats['tokens'], 1)
+
+    def test_token_refreshed_before_expiry(self):
+        self.server.token_ttl = 1
+        client = PayPalClient()
+        token = client.get_access_token()
+        # A token living 1 second is refreshed halfway through
+        time.sleep(0.6)
+        self.assertNotEqual(client.get_access_token(), token)
+        self.checkout(client)
+        self.assertEqual(self.server.stats['tokens'], 2)
+        self.assertEqual(self.server.stats['rejected_tokens'], 0)
+
+    def test_rejected_token_refreshed_once(self):
+        client = PayPalClient()
+        order = client.create_order_api(ORDER)
+        # PayPal revokes the token
+        self.server._tokens.clear()
+        self.assertEqual(client.get_order_details(order['id'])['id'], order['id'])
+        self.assertEqual(self.server.stats['rejected_tokens'], 1)
+        self.assertEqual(self.server.stats['tokens'], 2)
+
+    def test_call_metrics(self):
+        self.checkout(PayPalClient())
+        metrics = call_metrics()
+        self.assertEqual(metrics['get_access_token']['calls'], 1)
+        for operation in ('create_order_api', 'get_order_details', 'capture_order'):
+            self.assertEqual(metrics[operation]['calls'], 1)
+            self.assertEqual(metrics[operation]['errors'], 0)
+            self.assertGreater(metrics[operation]['max_ms'], 0)
@@ -13,8 +13,10 @@ import logging
 from datetime import datetime
 
 from booking.models import Booking
+from core.idempotency import idempotent
 from .models import Payment
 from .paypal import PayPalClient
+from .webhooks import InvalidEvent, store_event
 
 logger = logging.getLogger(__name__)
 
@@ -92,7 +94,7 @@ def process_payment(request, booking_id):
         'booking_date': booking.booking_date,
         'start_date': booking.start_date,
         'end_date': booking.end_date,
-        'booking_number': f"BK-{booking.id:06d}"
+        'booking_number': booking.booking_reference or f"BK-{booking.id:06d}"
     }
 
     # Log the values for debugging
@@ -101,6 +103,7 @@ def process_payment(request, booking_id):
     return render(request, 'payments/process.html', context)
 
 @login_required
+@idempotent
 def create_paypal_order(request, booking_id):
     """
     Create a PayPal order for a booking.
@@ -144,6 +147,7 @@ def create_paypal_order(request, booking_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 @login_required
+@idempotent
 def capture_paypal_payment(request):
     """
     Capture payment for an approved PayPal order.
@@ -262,40 +266,25 @@ def stripe_webhook(request):
 def paypal_webhook(request):
     """
     Handle PayPal webhook events.
+
+    Events are only stored here and applied in batches by
+    ``manage.py process_webhook_events`` (see ``payments.webhooks``).
     """
     if request.method != 'POST':
         return HttpResponse(status=405)
 
     try:
-        event_data = json.loads(request.body)
-        event_type = event_data.get('event_type')
-
-        # Log the event
-        logger.info(f"Received PayPal webhook: {event_type}")
-
-        # Process different event types
-        if event_type == 'PAYMENT.CAPTURE.COMPLETED':
-            # Payment capture completed
-            resource = event_data.get('resource', {})
-            transaction_id = resource.get('id')
-
-            # Find the payment by transaction ID
-            try:
-                payment = Payment.objects.get(transaction_id=transaction_id)
-                payment.status = 'completed'
-                payment.save()
-
-                # Update booking status
-                booking = payment.booking
-                booking.status = 'confirmed'
-                booking.save()
-            except Payment.DoesNotExist:
-                logger.error(f"Payment not found for transaction ID: {transaction_id}")
-
+        if store_event(request.body):
+            logger.info("Queued PayPal webhook")
+        else:
+            logger.info("Ignored redelivered PayPal webhook")
         return HttpResponse(status=200)
 
+    except InvalidEvent as e:
+        logger.error(f"Invalid PayPal webhook: {str(e)}")
+        return HttpResponse(status=400)
     except Exception as e:
-        logger.error(f"Error processing PayPal webhook: {str(e)}")
+        logger.error(f"Error storing PayPal webhook: {str(e)}")
         return HttpResponse(status=500)
 
 # Direct Payment Implementation (from views_direct.py)
@@ -344,6 +333,7 @@ def payment_page(request, booking_id):
 
 @login_required
 @require_POST
+@idempotent
 def create_paypal_order_direct(request, booking_id):
     """
     Direct API endpoint to create a PayPal order and return the approval URL.
@@ -538,6 +528,7 @@ def simple_payment_page(request, booking_id):
 
 @login_required
 @require_POST
+@idempotent
 def create_paypal_order_simple(request, booking_id):
     """
     Simple API endpoint to create a PayPal order and return the approval URL.
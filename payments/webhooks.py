@@ -0,0 +1,166 @@
+"""
+Webhook ingestion for payment gateways.
+
+``paypal_webhook`` only stores the raw event with ``store_event`` (a single
+``INSERT`` that is skipped for an event ID already stored) and answers 200,
+so retry storms from the gateway cost one write per delivery. Events are
+applied later by ``python manage.py process_webhook_events`` in batches of
+``WEBHOOK_BATCH_SIZE``: one query loads the payments of every event in the
+batch, the changed payments and bookings are written with ``bulk_update``,
+and the events are marked done in the same transaction.
+
+Applying an event is idempotent: a redelivered event is never stored twice,
+and an event whose payment is already completed changes nothing. An event
+whose payment does not exist yet (the webhook can arrive before the capture
+response is saved) is retried in later batches, up to
+``WEBHOOK_MAX_ATTEMPTS``.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from booking.inventory import commit_seats_for_bookings
+from booking.models import Booking
+from booking.signals import CONFIRMED_STATUSES
+from .models import Payment, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+# Event types that complete a payment
+CAPTURE_COMPLETED = ('PAYMENT.CAPTURE.COMPLETED',)
+
+
+def batch_size():
+    return getattr(settings, 'WEBHOOK_BATCH_SIZE', 100)
+
+
+def max_attempts():
+    return getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5)
+
+
+class InvalidEvent(ValueError):
+    """The request body is not a webhook event."""
+
+
+def store_event(body, provider='paypal'):
+    """
+    Store a raw webhook body for later processing. Returns False if the
+    event was already stored (a redelivery). Raises ``InvalidEvent``.
+    """
+    try:
+        event = json.loads(body)
+    except ValueError as e:
+        raise InvalidEvent(f"Invalid JSON: {e}")
+    if not isinstance(event, dict):
+        raise InvalidEvent("The event is not a JSON object")
+    # Events without an ID are deduplicated on their content
+    event_id = str(event.get('id') or hashlib.sha256(body).hexdigest())
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                provider=provider,
+                event_id=event_id[:255],
+                event_type=str(event.get('event_type') or '')[:100],
+                payload=body.decode('utf-8', errors='replace'),
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def transaction_ids(event):
+    """IDs a ``Payment.transaction_id`` may hold for an event: the capture's and its order's."""
+    resource = event.get('resource') or {}
+    ids = [resource.get('id')]
+    related = (resource.get('supplementary_data') or {}).get('related_ids') or {}
+    ids.append(related.get('order_id'))
+    return [str(id_) for id_ in ids if id_]
+
+
+def process_pending_events(limit=None, provider='paypal'):
+    """
+    Apply one batch of pending events. Returns the number of events handled
+    (processed, ignored or given up on).
+    """
+    limit = limit or batch_size()
+    now = timezone.now()
+    pending = WebhookEvent.objects.filter(provider=provider, status=WebhookEvent.STATUS_PENDING)
+    # Events still waiting for their payment go after new ones
+    pks = list(pending.order_by('attempts', 'received_at', 'pk').values_list('pk', flat=True)[:limit])
+    if not pks:
+        return 0
+    with transaction.atomic():
+        # The UPDATE comes first so the transaction takes the write lock right away
+        pending.filter(pk__in=pks).update(attempts=F('attempts') + 1)
+        # Events another worker applied meanwhile are no longer pending
+        events = list(pending.filter(pk__in=pks).order_by('attempts', 'received_at', 'pk'))
+
+        parsed = {}
+        for event in events:
+            try:
+                parsed[event.pk] = json.loads(event.payload)
+            except ValueError:
+                parsed[event.pk] = {}
+
+        wanted = {
+            id_
+            for event in events if event.event_type in CAPTURE_COMPLETED
+            for id_ in transaction_ids(parsed[event.pk])
+        }
+        payments = {
+            payment.transaction_id: payment
+            for payment in Payment.objects.filter(transaction_id__in=wanted).select_related('booking')
+        } if wanted else {}
+
+        changed_payments = {}
+        confirmed_bookings = {}
+        for event in events:
+            if event.event_type not in CAPTURE_COMPLETED:
+                event.status = WebhookEvent.STATUS_IGNORED
+                event.processed_at = now
+                continue
+            payment = next(
+                (payments[id_] for id_ in transaction_ids(parsed[event.pk]) if id_ in payments), None
+            )
+            if payment is None:
+                event.error = f"Payment not found for transaction IDs {transaction_ids(parsed[event.pk])}"
+                if event.attempts >= max_attempts():
+                    logger.error(f"Giving up on webhook event {event.event_id}: {event.error}")
+                    event.status = WebhookEvent.STATUS_FAILED
+                    event.processed_at = now
+                continue
+
+            if payment.status != 'completed':
+                payment.status = 'completed'
+                payment.updated_at = now
+                changed_payments[payment.pk] = payment
+            booking = payment.booking
+            if booking.status not in CONFIRMED_STATUSES:
+                booking.status = 'confirmed'
+                booking.updated_at = now
+                confirmed_bookings[booking.pk] = booking
+            event.status = WebhookEvent.STATUS_PROCESSED
+            event.error = ''
+            event.processed_at = now
+
+        Payment.objects.bulk_update(changed_payments.values(), ['status', 'updated_at'])
+        Booking.objects.bulk_update(confirmed_bookings.values(), ['status', 'updated_at'])
+        # bulk_update sends no post_save, so commit the seats as the signal would
+        commit_seats_for_bookings(list(confirmed_bookings.values()))
+        WebhookEvent.objects.bulk_update(events, ['status', 'error', 'processed_at'])
+    return sum(event.status != WebhookEvent.STATUS_PENDING for event in events)
+
+
+def process_all_pending_events(provider='paypal'):
+    """Apply pending events batch by batch until a batch leaves some of them pending."""
+    handled = 0
+    while True:
+        done = process_pending_events(provider=provider)
+        handled += done
+        if done < batch_size():
+            return handled
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Review
+from .models import Review, TourRatingSummary
 from django.utils.translation import gettext_lazy as _
 
 
@@ -11,9 +11,28 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews']
 
     def approve_reviews(self, request, queryset):
+        tour_ids = set(queryset.values_list('tour_id', flat=True))
         queryset.update(is_approved=True)
+        # QuerySet.update() skips the signals that maintain the summaries
+        TourRatingSummary.rebuild(tour_ids)
     approve_reviews.short_description = _("Approve selected reviews")
 
     def disapprove_reviews(self, request, queryset):
+        tour_ids = set(queryset.values_list('tour_id', flat=True))
         queryset.update(is_approved=False)
-    disapprove_reviews.short_description = _("Disapprove selected reviews")
\ No newline at end of file
+        TourRatingSummary.rebuild(tour_ids)
+    disapprove_reviews.short_description = _("Disapprove selected reviews")
+
+
+@admin.register(TourRatingSummary)
+class TourRatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ['tour', 'average_rating', 'review_count', 'updated_at']
+    search_fields = ['tour__name']
+    ordering = ['-average_rating', '-review_count']
+    readonly_fields = [
+        'tour', 'review_count', 'rating_sum', 'average_rating',
+        'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5', 'updated_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
@@ -1,5 +1,6 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from tour.api.pagination import CursorModePagination
 from ..models import Review
 from .serializers import ReviewSerializer
 
@@ -7,6 +8,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
     """ViewSet for managing reviews"""
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CursorModePagination
     
     def get_queryset(self):
         queryset = Review.objects.all()
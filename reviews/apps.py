@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class ReviewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reviews'
+
+    def ready(self):
+        # Connect signal handlers that maintain the tour rating summaries
+        import reviews.signals
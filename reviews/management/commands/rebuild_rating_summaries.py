@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from reviews.models import TourRatingSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating summary of every tour from its approved reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tour-id', type=int, action='append', dest='tour_ids',
+                            help='Only rebuild the given tour (may be repeated)')
+
+    def handle(self, *args, **options):
+        count = TourRatingSummary.rebuild(options['tour_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating summaries for {count} tours'))
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-18 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_summaries(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    TourRatingSummary = apps.get_model('reviews', 'TourRatingSummary')
+
+    histograms = {}
+    rows = (
+        Review.objects.filter(is_approved=True)
+        .order_by()
+        .values('tour_id', 'rating')
+        .annotate(count=models.Count('id'))
+    )
+    for row in rows:
+        histograms.setdefault(row['tour_id'], {})[row['rating']] = row['count']
+
+    summaries = []
+    for tour_id, histogram in histograms.items():
+        review_count = sum(histogram.values())
+        rating_sum = sum(rating * count for rating, count in histogram.items())
+        summaries.append(TourRatingSummary(
+            tour_id=tour_id,
+            review_count=review_count,
+            rating_sum=rating_sum,
+            average_rating=rating_sum / review_count,
+            **{f'rating_{rating}': histogram.get(rating, 0) for rating in range(1, 6)}
+        ))
+    TourRatingSummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_alter_review_is_approved'),
+        ('tour', '0006_tour_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TourRatingSummary',
+            fields=[
+                ('tour', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='tour.tour', verbose_name='Tour')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='Review Count')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Rating Sum')),
+                ('average_rating', models.FloatField(default=0, verbose_name='Average Rating')),
+                ('rating_1', models.PositiveIntegerField(default=0, verbose_name='1 Star Reviews')),
+                ('rating_2', models.PositiveIntegerField(default=0, verbose_name='2 Star Reviews')),
+                ('rating_3', models.PositiveIntegerField(default=0, verbose_name='3 Star Reviews')),
+                ('rating_4', models.PositiveIntegerField(default=0, verbose_name='4 Star Reviews')),
+                ('rating_5', models.PositiveIntegerField(default=0, verbose_name='5 Star Reviews')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Tour Rating Summary',
+                'verbose_name_plural': 'Tour Rating Summaries',
+                'indexes': [models.Index(fields=['-average_rating', '-review_count'], name='reviews_summary_rank_idx')],
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
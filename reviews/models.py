@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Cast
+from django.utils import timezone
 from tour.models import Tour
 from users.models import CustomUser
 
@@ -35,4 +37,142 @@ class Review(models.Model):
         unique_together = ['tour', 'user']
 
     def __str__(self):
-        return f"{self.user.get_full_name()} - {self.tour.name} - {self.rating}"
\ No newline at end of file
+        return f"{self.user.get_full_name()} - {self.tour.name} - {self.rating}"
+
+
+class TourRatingSummary(models.Model):
+    """
+    Review aggregates of a tour, kept in sync by ``reviews.signals``.
+
+    Only approved reviews are counted. Bulk changes that bypass the model
+    signals (``QuerySet.update``/``delete``) must call ``rebuild`` for the
+    affected tours; ``python manage.py rebuild_rating_summaries`` rebuilds
+    every tour.
+    """
+    RATINGS = range(1, 6)
+
+    tour = models.OneToOneField(
+        Tour,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rating_summary',
+        verbose_name=_("Tour")
+    )
+    review_count = models.PositiveIntegerField(_("Review Count"), default=0)
+    rating_sum = models.PositiveIntegerField(_("Rating Sum"), default=0)
+    average_rating = models.FloatField(_("Average Rating"), default=0)
+    rating_1 = models.PositiveIntegerField(_("1 Star Reviews"), default=0)
+    rating_2 = models.PositiveIntegerField(_("2 Star Reviews"), default=0)
+    rating_3 = models.PositiveIntegerField(_("3 Star Reviews"), default=0)
+    rating_4 = models.PositiveIntegerField(_("4 Star Reviews"), default=0)
+    rating_5 = models.PositiveIntegerField(_("5 Star Reviews"), default=0)
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Tour Rating Summary")
+        verbose_name_plural = _("Tour Rating Summaries")
+        indexes = [
+            models.Index(fields=['-average_rating', '-review_count'], name='reviews_summary_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tour_id} - {self.average_rating:.1f} ({self.review_count})"
+
+    @property
+    def histogram(self):
+        """List of ``(rating, percentage, count)`` tuples from 5 stars down to 1."""
+        result = []
+        for rating in reversed(self.RATINGS):
+            count = getattr(self, f'rating_{rating}')
+            percentage = round(count / self.review_count * 100) if self.review_count else 0
+            result.append((rating, percentage, count))
+        return result
+
+    @classmethod
+    def apply_change(cls, tour_id, removed=None, added=None):
+        """
+        Atomically remove and/or add one approved rating for a tour.
+
+        Runs a single UPDATE built from F() expressions, so concurrent review
+        changes never overwrite each other. Returns the number of rows
+        updated (0 if the tour has no summary yet).
+        """
+        count = 0
+        total = 0
+        per_rating = {}
+        if removed is not None:
+            count -= 1
+            total -= removed
+            per_rating[removed] = per_rating.get(removed, 0) - 1
+        if added is not None:
+            count += 1
+            total += added
+            per_rating[added] = per_rating.get(added, 0) + 1
+        if not count and not any(per_rating.values()):
+            return 1
+
+        new_count = models.F('review_count') + count
+        new_sum = models.F('rating_sum') + total
+        updates = {
+            'review_count': new_count,
+            'rating_sum': new_sum,
+            # SET expressions read the old column values, so check the old count
+            'average_rating': models.Case(
+                models.When(review_count=-count, then=models.Value(0.0)),
+                default=models.ExpressionWrapper(
+                    Cast(new_sum, models.FloatField()) / new_count,
+                    output_field=models.FloatField()
+                ),
+                output_field=models.FloatField()
+            ),
+            'updated_at': timezone.now(),
+        }
+        for rating, delta in per_rating.items():
+            if delta:
+                updates[f'rating_{rating}'] = models.F(f'rating_{rating}') + delta
+        return cls.objects.filter(tour_id=tour_id).update(**updates)
+
+    @classmethod
+    def rebuild(cls, tour_ids=None):
+        """Recompute the summaries of the given tours (all tours if None) from scratch."""
+        tours = Tour.objects.all()
+        if tour_ids is not None:
+            tours = tours.filter(pk__in=tour_ids)
+        tour_ids = list(tours.values_list('pk', flat=True))
+
+        counts = {}
+        rows = (
+            Review.objects.filter(tour_id__in=tour_ids, is_approved=True)
+            .order_by()
+            .values('tour_id', 'rating')
+            .annotate(count=models.Count('id'))
+        )
+        for row in rows:
+            counts.setdefault(row['tour_id'], {})[row['rating']] = row['count']
+
+        summaries = []
+        for tour_id in tour_ids:
+            histogram = counts.get(tour_id, {})
+            review_count = sum(histogram.values())
+            rating_sum = sum(rating * count for rating, count in histogram.items())
+            summaries.append(cls(
+                tour_id=tour_id,
+                review_count=review_count,
+                rating_sum=rating_sum,
+                average_rating=rating_sum / review_count if review_count else 0,
+                **{f'rating_{rating}': histogram.get(rating, 0) for rating in cls.RATINGS}
+            ))
+
+        update_fields = ['review_count', 'rating_sum', 'average_rating', 'updated_at']
+        update_fields += [f'rating_{rating}' for rating in cls.RATINGS]
+        now = timezone.now()
+        for summary in summaries:
+            summary.updated_at = now
+        cls.objects.bulk_create(
+            summaries,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['tour'],
+            update_fields=update_fields
+        )
+        return len(summaries)
@@ -0,0 +1,70 @@
+"""
+Signal handlers that keep ``TourRatingSummary`` in sync with reviews.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from tour.models import Tour
+from .models import Review, TourRatingSummary
+
+logger = logging.getLogger(__name__)
+
+
+def _update_summary(tour_id, removed=None, added=None):
+    """Apply one rating change, creating or repairing the summary if needed."""
+    try:
+        with transaction.atomic():
+            updated = TourRatingSummary.apply_change(tour_id, removed=removed, added=added)
+    except IntegrityError:
+        # The stored counts drifted (e.g. after a bulk update); recompute them
+        TourRatingSummary.rebuild([tour_id])
+        return
+    if not updated and added is not None:
+        # First review of the tour; the review row is already saved
+        TourRatingSummary.rebuild([tour_id])
+
+
+@receiver(pre_save, sender=Review, dispatch_uid='reviews.summary.review_pre_save')
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_rating = (
+        Review.objects.filter(pk=instance.pk)
+        .values_list('tour_id', 'rating', 'is_approved')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Review, dispatch_uid='reviews.summary.review_saved')
+def review_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        previous = getattr(instance, '_previous_rating', None)
+        removed_from = removed = None
+        if previous and previous[2]:
+            removed_from, removed = previous[0], previous[1]
+        added = instance.rating if instance.is_approved else None
+
+        if removed_from is not None and removed_from != instance.tour_id:
+            # The review was moved to another tour
+            _update_summary(removed_from, removed=removed)
+            removed = None
+        _update_summary(instance.tour_id, removed=removed, added=added)
+    except Exception as e:
+        logger.error(f"Error updating rating summary for tour {instance.tour_id}: {e}")
+
+
+@receiver(post_delete, sender=Review, dispatch_uid='reviews.summary.review_deleted')
+def review_deleted(sender, instance, origin=None, **kwargs):
+    # The summary goes away with the tour itself
+    if isinstance(origin, Tour) or not instance.is_approved:
+        return
+    try:
+        _update_summary(instance.tour_id, removed=instance.rating)
+    except Exception as e:
+        logger.error(f"Error updating rating summary for tour {instance.tour_id}: {e}")
@@ -66,6 +66,21 @@ if [ ! -d "/data" ] || [ ! -f "db.sqlite3" ]; then
     python manage.py setup_tours
 fi
 
+# Make sure the tour search index matches the catalog
+python manage.py rebuild_search_index
+
+# Precompute related tours (kept current by refresh_related_tours afterwards)
+python manage.py rebuild_related_tours
+
+# Drop stored Idempotency-Key responses past their TTL
+python manage.py clear_idempotency_keys
+
+# Start the request latency histograms from zero for this deployment
+python manage.py reset_metrics
+
+# Start the background workers
+bash workers.sh &
+
 # Start the server
 echo "Starting server..."
 gunicorn tourism_project.wsgi:application --bind 0.0.0.0:8080 --log-file -
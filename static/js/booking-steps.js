@@ -93,7 +93,7 @@ function initializePaymentMethods(bookingFormEl) {
         if (paypalContainer) {
             paypal.Buttons({
                 createOrder: async function() {
-                    const response = await fetch(`/booking/${bookingId}/payment/paypal/create/`, {
+                    const response = await IdempotencyKeys.fetch('paypal-order-' + bookingId, `/booking/${bookingId}/payment/paypal/create/`, {
                         method: 'POST',
                         headers: {
                             'Content-Type': 'application/json',
@@ -106,7 +106,7 @@ function initializePaymentMethods(bookingFormEl) {
                 onApprove: async function(data) {
                     bookingFormEl.__x.$data.isProcessing = true;
                     try {
-                        const response = await fetch(`/booking/${bookingId}/payment/paypal/capture/`, {
+                        const response = await IdempotencyKeys.fetch('paypal-capture-' + data.orderID, `/booking/${bookingId}/payment/paypal/capture/`, {
                             method: 'POST',
                             headers: {
                                 'Content-Type': 'application/json',
@@ -0,0 +1,44 @@
+/**
+ * Idempotency keys for checkout requests
+ * Each attempt (booking submission, PayPal order, capture) sends one
+ * Idempotency-Key and reuses it until the server answers successfully, so a
+ * retry after a lost response replays the first result instead of booking
+ * or charging again.
+ */
+const IdempotencyKeys = {
+    keys: {},
+
+    generate: function() {
+        if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+            return window.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    },
+
+    // Key of the current attempt for a scope
+    get: function(scope) {
+        if (!this.keys[scope]) {
+            this.keys[scope] = this.generate();
+        }
+        return this.keys[scope];
+    },
+
+    // Start a new attempt for a scope
+    reset: function(scope) {
+        delete this.keys[scope];
+    },
+
+    // fetch() with the scope's key; the key is kept until a successful response
+    fetch: function(scope, url, options) {
+        options = options || {};
+        options.headers = Object.assign({}, options.headers, {'Idempotency-Key': this.get(scope)});
+        return fetch(url, options).then(response => {
+            if (response.ok) {
+                this.reset(scope);
+            }
+            return response;
+        });
+    }
+};
+
+window.IdempotencyKeys = IdempotencyKeys;
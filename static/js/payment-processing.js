@@ -37,7 +37,7 @@ function initPayPalButtons(bookingId, amount, currencyCode) {
             `;
 
             // Call your server to create the order
-            return fetch(`/booking/${bookingId}/payment/paypal/create/`, {
+            return IdempotencyKeys.fetch('paypal-order-' + bookingId, `/booking/${bookingId}/payment/paypal/create/`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -62,7 +62,7 @@ function initPayPalButtons(bookingId, amount, currencyCode) {
             document.getElementById('paypal-processing').classList.remove('hidden');
 
             // Call your server to capture the order
-            return fetch(`/booking/${bookingId}/payment/paypal/capture/`, {
+            return IdempotencyKeys.fetch('paypal-capture-' + data.orderID, `/booking/${bookingId}/payment/paypal/capture/`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -458,7 +458,7 @@ function processPayPalPayment(bookingId) {
     }
 
     // Create PayPal order
-    fetch(`/booking/${bookingId}/payment/paypal/create/`, {
+    IdempotencyKeys.fetch('paypal-order-' + bookingId, `/booking/${bookingId}/payment/paypal/create/`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -12,6 +12,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const sortBySelect = document.getElementById('sort-by');
     const categorySelect = document.getElementById('category');
     const destinationSelect = document.getElementById('destination');
+    const dateFromInput = document.getElementById('date-from');
+    const dateToInput = document.getElementById('date-to');
+    const partySizeInput = document.getElementById('party-size');
     const clearFiltersBtn = document.getElementById('clear-filters-btn');
     const tourResults = document.getElementById('tour-results');
     const filterStatus = document.getElementById('filter-status');
@@ -170,6 +173,9 @@ document.addEventListener('DOMContentLoaded', function() {
         if (sortBySelect) sortBySelect.selectedIndex = 0;
         if (categorySelect) categorySelect.selectedIndex = 0;
         if (destinationSelect) destinationSelect.selectedIndex = 0;
+        if (dateFromInput) dateFromInput.value = '';
+        if (dateToInput) dateToInput.value = '';
+        if (partySizeInput) partySizeInput.value = '';
 
         // Reset price range slider if it exists
         if (priceRangeSlider && priceRangeSlider.noUiSlider) {
@@ -187,7 +193,10 @@ document.addEventListener('DOMContentLoaded', function() {
         { element: sortBySelect, message: 'Sorting tours...' },
         { element: durationSelect, message: 'Filtering by duration...' },
         { element: categorySelect, message: 'Filtering by category...' },
-        { element: destinationSelect, message: 'Filtering by destination...' }
+        { element: destinationSelect, message: 'Filtering by destination...' },
+        { element: dateFromInput, message: 'Checking availability...' },
+        { element: dateToInput, message: 'Checking availability...' },
+        { element: partySizeInput, message: 'Checking availability...' }
     ];
 
     selectElements.forEach(item => {
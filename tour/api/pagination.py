@@ -1,7 +1,18 @@
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.response import Response
+import binascii
+import json
+from base64 import urlsafe_b64decode as b64decode, urlsafe_b64encode as b64encode
 from collections import OrderedDict
 
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.pagination import approximate_count
+
 class OptimizedPageNumberPagination(PageNumberPagination):
     """
     Optimized pagination class that reduces the amount of data returned
@@ -46,3 +57,185 @@ class SmallResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 50
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over a stable composite ordering.
+
+    Instead of ``OFFSET n``, each page continues after the sort key of the
+    last row of the previous one, e.g. ``WHERE created_at < %s OR
+    (created_at = %s AND id < %s)``, so every page costs the same and rows
+    inserted meanwhile don't shift the results. The primary key is always
+    appended to the ordering to break ties.
+
+    Cursors are opaque base64 tokens. No total is computed unless the client
+    asks for one with ``?include_total=1``, which adds an ``approximate_count``
+    from ``core.pagination.approximate_count``.
+
+    The ordering is taken from the queryset (e.g. set by ``OrderingFilter``)
+    when it only uses non-null model fields, otherwise ``ordering`` is used.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at',)
+    cursor_query_param = 'cursor'
+    include_total_query_param = 'include_total'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_keys(queryset)
+        self.total = None
+        if request.query_params.get(self.include_total_query_param) in ('1', 'true', 'True'):
+            self.total = approximate_count(queryset)
+
+        values, self.reverse = self.decode_cursor(request)
+        self.has_cursor = values is not None
+        if self.has_cursor:
+            queryset = queryset.filter(self.after(values))
+
+        # Walking backwards reads the previous page in reverse order
+        queryset = queryset.order_by(*[
+            f"{'-' if descending != self.reverse else ''}{field.name}"
+            for field, descending in self.keys
+        ])
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_keys(self, queryset):
+        """``[(field, descending), ...]`` of the sort key, ending with the primary key."""
+        ordering = list(queryset.query.order_by) or list(self.ordering)
+        keys = self._resolve(queryset.model, ordering)
+        if keys is None:
+            keys = self._resolve(queryset.model, list(self.ordering))
+        pk = queryset.model._meta.pk
+        if all(field != pk for field, _ in keys):
+            keys.append((pk, keys[0][1] if keys else True))
+        return keys
+
+    @staticmethod
+    def _resolve(model, ordering):
+        keys = []
+        for name in ordering:
+            if not isinstance(name, str):
+                return None
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            try:
+                field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null or field.many_to_many:
+                return None
+            keys.append((field, descending))
+        return keys
+
+    def after(self, values):
+        """Rows that come after ``values`` in the (possibly reversed) sort order."""
+        condition = Q()
+        equal = {}
+        for (field, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending != self.reverse else 'gt'
+            condition |= Q(**equal, **{f'{field.attname}__{lookup}': value})
+            equal[field.attname] = value
+        return condition
+
+    def encode_cursor(self, row, reverse):
+        payload = {
+            'k': [field.name for field, _ in self.keys],
+            'v': [field.value_to_string(row) for field, _ in self.keys],
+        }
+        if reverse:
+            payload['r'] = 1
+        token = b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(b64decode(token.encode()))
+            if payload['k'] != [field.name for field, _ in self.keys]:
+                raise ValueError('cursor was made for another ordering')
+            values = [field.to_python(value) for (field, _), value in zip(self.keys, payload['v'])]
+            if len(values) != len(self.keys):
+                raise ValueError('wrong number of values')
+            return values, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.page:
+            return None
+        # Going backwards, the page we came from always follows
+        if self.has_more or self.reverse:
+            return self.encode_cursor(self.page[-1], reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if not self.page:
+            return None
+        if (self.reverse and self.has_more) or (not self.reverse and self.has_cursor):
+            return self.encode_cursor(self.page[0], reverse=True)
+        return None
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.total is not None:
+            response['approximate_count'] = self.total[0]
+            response['count_is_exact'] = self.total[1]
+        response['results'] = data
+        return Response(response)
+
+
+class CursorModePagination(OptimizedPageNumberPagination):
+    """
+    Page-number pagination that switches to ``KeysetPagination`` when the
+    request has a ``cursor`` parameter; ``?cursor=`` starts at the first page.
+
+    Existing ``?page=`` clients keep working while large listings can be
+    walked with constant-cost pages.
+    """
+    cursor_ordering = ('-created_at',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            self.keyset.ordering = self.cursor_ordering
+            self.keyset.page_size = self.page_size
+            self.keyset.max_page_size = self.max_page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class BookingCursorPagination(CursorModePagination):
+    page_size = 10
+    max_page_size = 50
@@ -3,6 +3,8 @@ from ..models import (
     Destination, DestinationImage, Category, Activity, Tour, TourImage,
     TourDate, TourGuide, TourItinerary, TourFAQ, Promotion
 )
+from ..availability import bookable_dates, next_available_date
+from ..pricing import MAX_BATCH_SIZE
 from users.models import CustomUser
 
 
@@ -121,11 +123,32 @@ class TourListSerializer(serializers.ModelSerializer):
     destination_name = serializers.CharField(source='destination.name')
     destination_slug = serializers.CharField(source='destination.slug')
     destination_country = serializers.CharField(source='destination.country')
-    category_name = serializers.CharField(source='category.name')
-    category_slug = serializers.CharField(source='category.slug')
+    category_name = serializers.SerializerMethodField()
+    category_slug = serializers.SerializerMethodField()
     discount_percentage = serializers.IntegerField(read_only=True)
     avg_rating = serializers.FloatField(read_only=True)
     review_count = serializers.IntegerField(read_only=True)
+    distance_km = serializers.SerializerMethodField()
+    available_dates_count = serializers.IntegerField(read_only=True)
+    next_available_date = serializers.SerializerMethodField()
+
+    def get_category_name(self, obj):
+        # Tours have several categories; expose the first one (prefetched)
+        category = next(iter(obj.categories.all()), None)
+        return category.name if category else None
+
+    def get_category_slug(self, obj):
+        category = next(iter(obj.categories.all()), None)
+        return category.slug if category else None
+
+    def get_distance_km(self, obj):
+        # Only annotated by the near=lat,lng filter
+        distance = getattr(obj, 'distance', None)
+        return round(distance, 2) if distance is not None else None
+
+    def get_next_available_date(self, obj):
+        next_date = next_available_date(obj)
+        return TourDateSerializer(next_date).data if next_date else None
 
     class Meta:
         model = Tour
@@ -135,7 +158,8 @@ class TourListSerializer(serializers.ModelSerializer):
             'category_name', 'category_slug',
             'duration_days', 'duration_nights', 'price',
             'discount_price', 'cover_image', 'discount_percentage',
-            'avg_rating', 'review_count'
+            'avg_rating', 'review_count', 'distance_km',
+            'available_dates_count', 'next_available_date'
         ]
 
 
@@ -163,7 +187,6 @@ class TourSerializer(serializers.ModelSerializer):
     Uses annotations from the queryset to avoid additional database queries.
     """
     destination = DestinationSerializer(read_only=True)
-    category = CategorySerializer(read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
     activities = ActivitySerializer(many=True, read_only=True)
     images = TourImageSerializer(many=True, read_only=True)
@@ -184,9 +207,9 @@ class TourSerializer(serializers.ModelSerializer):
         model = Tour
         fields = [
             'id', 'name', 'slug', 'description', 'short_description',
-            'destination', 'category', 'categories', 'activities', 'duration_days',
+            'destination', 'categories', 'activities', 'duration_days',
             'duration_nights', 'price', 'discount_price', 'currency',
-            'max_people', 'min_age', 'difficulty', 'included_services',
+            'max_people', 'min_age', 'included_services',
             'excluded_services', 'meeting_point', 'cover_image',
             'highlight_video', 'map_location', 'latitude', 'longitude',
             'images', 'itinerary', 'faqs', 'dates', 'is_featured',
@@ -195,18 +218,18 @@ class TourSerializer(serializers.ModelSerializer):
         ]
 
     def get_available_dates_count(self, obj):
-        """Get count of available dates for this tour."""
-        return obj.dates.filter(is_active=True, available_seats__gt=0).count()
+        """Count of bookable dates, annotated by ``with_availability``."""
+        count = getattr(obj, 'available_dates_count', None)
+        if count is None:
+            count = bookable_dates().filter(tour=obj).count()
+        return count
 
     def get_next_available_date(self, obj):
-        """Get the next available date for this tour."""
-        from django.utils import timezone
-
-        next_date = obj.dates.filter(
-            is_active=True,
-            available_seats__gt=0,
-            start_date__gte=timezone.now().date()
-        ).order_by('start_date').first()
+        """First bookable date, annotated by ``with_availability``."""
+        if hasattr(obj, 'next_date_id'):
+            next_date = next_available_date(obj)
+        else:
+            next_date = bookable_dates().filter(tour=obj).order_by('start_date').first()
 
         if next_date:
             return TourDateSerializer(next_date).data
@@ -224,3 +247,36 @@ class PromotionSerializer(serializers.ModelSerializer):
             'id', 'title', 'code', 'tours', 'discount_percentage',
             'description', 'start_date', 'end_date', 'is_valid'
         ]
+
+
+class QuoteItemSerializer(serializers.Serializer):
+    """One party to price: a tour, its adults and children, a currency and a promo code"""
+    tour = serializers.IntegerField(min_value=1)
+    adults = serializers.IntegerField(min_value=1, max_value=100, default=1)
+    children = serializers.IntegerField(min_value=0, max_value=100, default=0)
+    currency = serializers.CharField(max_length=3, required=False, allow_blank=True)
+    promo = serializers.CharField(max_length=20, required=False, allow_blank=True)
+
+
+class QuoteRequestSerializer(serializers.Serializer):
+    """Batch of parties priced in one request"""
+    items = QuoteItemSerializer(many=True, allow_empty=False, max_length=MAX_BATCH_SIZE)
+
+
+class QuoteSerializer(serializers.Serializer):
+    """Serializer for a tour.pricing.Quote"""
+    tour = serializers.IntegerField(source='tour_id')
+    adults = serializers.IntegerField(source='num_adults')
+    children = serializers.IntegerField(source='num_children')
+    currency = serializers.CharField(source='currency_code')
+    exchange_rate = serializers.DecimalField(max_digits=12, decimal_places=6)
+    regular_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    adult_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    child_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tour_discount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    promo = serializers.CharField(source='promotion_code', allow_null=True)
+    promotion_discount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount_percentage = serializers.IntegerField()
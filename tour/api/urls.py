@@ -9,5 +9,6 @@ router.register(r'categories', views.CategoryViewSet, basename='category')
 router.register(r'activities', views.ActivityViewSet, basename='activity')
 
 urlpatterns = [
+    path('quote/', views.TourQuoteView.as_view(), name='tour-quote'),
     path('', include(router.urls)),
 ]
@@ -1,4 +1,6 @@
-from django.db.models import Prefetch, Count, Avg
+from django.db.models import Count, F
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_headers
@@ -7,17 +9,32 @@ from rest_framework import viewsets, permissions, filters
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 
 from tour.models import Tour, Destination, Category, Activity
+from tour.facets import facet_counts, filter_queryset as filter_by_facets, filter_by_range
+from tour.geo import filter_near, parse_near
+from tour.availability import filter_available, parse_availability, with_availability
+from tour.search import find_tour_ids, search_tours
+from tour.detail import related_tours
+from tour.pricing import PricingError, quote_many
 from .serializers import (
     TourSerializer, DestinationSerializer, CategorySerializer,
-    ActivitySerializer, TourListSerializer
+    ActivitySerializer, TourListSerializer, QuoteRequestSerializer, QuoteSerializer
 )
-from .pagination import OptimizedPageNumberPagination, LargeResultsSetPagination
+from .pagination import CursorModePagination, LargeResultsSetPagination
 from .decorators import method_cache, method_cache_per_user
 
 
+def with_rating_fields(queryset):
+    """Annotate review_count and avg_rating from the materialized review summary."""
+    return queryset.annotate(
+        review_count=Coalesce(F('rating_summary__review_count'), 0),
+        avg_rating=F('rating_summary__average_rating')
+    )
+
+
 @method_decorator(cache_page(60*5, cache='api'), name='list')  # Cache list for 5 minutes
 @method_decorator(cache_page(60*15, cache='api'), name='retrieve')  # Cache detail for 15 minutes
 class TourViewSet(viewsets.ReadOnlyModelViewSet):
@@ -26,11 +43,12 @@ class TourViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TourSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
-    pagination_class = OptimizedPageNumberPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'destination', 'duration', 'price_range']
-    search_fields = ['title', 'description', 'destination__name', 'category__name']
-    ordering_fields = ['price', 'duration', 'created_at', 'rating']
+    pagination_class = CursorModePagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    # Destination, category, activity, duration and price filters are the
+    # facet parameters, applied in get_queryset like on the HTML tour list
+    filterset_fields = ['is_featured']
+    ordering_fields = ['price', 'duration_days', 'created_at', 'avg_rating', 'view_count']
     ordering = ['-created_at']
 
     def get_queryset(self):
@@ -40,27 +58,50 @@ class TourViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = Tour.objects.filter(is_active=True)
 
         # Add select_related for foreign keys
-        queryset = queryset.select_related('destination', 'category')
+        queryset = queryset.select_related('destination')
 
         # Add prefetch_related for many-to-many relationships
-        queryset = queryset.prefetch_related(
-            'activities',
-            'images',
-            Prefetch('reviews', queryset=self.get_active_reviews())
-        )
-
-        # Add annotations for calculated fields
-        queryset = queryset.annotate(
-            review_count=Count('reviews', distinct=True),
-            avg_rating=Avg('reviews__rating')
-        )
+        queryset = queryset.prefetch_related('categories')
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(
+                'activities', 'images', 'itinerary', 'faqs', 'dates', 'destination__images'
+            )
+
+        queryset = with_rating_fields(queryset)
+
+        # Ranked full-text search, the same matches the facet counts use
+        self.search = self.request.query_params.get('search')
+        if self.search:
+            self.search_ids = find_tour_ids(self.search)
+            queryset = search_tours(queryset, self.search, tour_ids=self.search_ids)
+
+        # Apply facet selections (destination, category, activity, duration_range, price_range)
+        queryset = filter_by_facets(queryset, self.request.query_params)
+        queryset = filter_by_range(queryset, self.request.query_params)
+
+        # Proximity filter: near=lat,lng&radius_km=, annotates distance in km
+        self.near = parse_near(self.request.query_params)
+        if self.near:
+            queryset = filter_near(queryset, *self.near)
+
+        # Availability filter: date_from, date_to, party_size
+        window = parse_availability(self.request.query_params) or {}
+        if window:
+            queryset = filter_available(queryset, **window)
+        queryset = with_availability(queryset, **window)
 
         return queryset
 
-    def get_active_reviews(self):
-        """Get only approved reviews."""
-        from reviews.models import Review
-        return Review.objects.filter(is_approved=True)
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # Without an explicit ordering, searches are listed by relevance and
+        # nearby tours closest first
+        ordering = self.request.query_params.get('ordering')
+        if getattr(self, 'search', None) and self.search_ids and ordering in (None, 'relevance'):
+            queryset = queryset.order_by('search_rank', 'pk')
+        elif getattr(self, 'near', None) and ordering in (None, 'distance'):
+            queryset = queryset.order_by('distance', 'pk')
+        return queryset
 
     def get_serializer_class(self):
         """
@@ -92,13 +133,45 @@ class TourViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = TourListSerializer(featured_tours, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Return facet counts for destination, category, activity, duration
+        and price buckets under the current filters, computed in memory.
+        """
+        search = request.query_params.get('search')
+        search_ids = None
+        if search:
+            search_ids = find_tour_ids(search)
+            if search_ids is None:
+                # No search index: count the tours the list's fallback filters match
+                search_ids = list(search_tours(Tour.objects.all(), search, tour_ids=search_ids).values_list('pk', flat=True))
+        counts = facet_counts(request.query_params, search_ids)
+        if counts is None:
+            return Response({'detail': 'Facets are not available yet.'}, status=503)
+        return Response(counts)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, slug=None):
+        """
+        Return the most similar tours from the precomputed related-tours index.
+        """
+        tour = get_object_or_404(Tour, slug=slug, is_active=True)
+        queryset = with_availability(
+            with_rating_fields(related_tours(tour)).prefetch_related('categories')
+        )
+        serializer = TourListSerializer(queryset, many=True, context={'request': request})
+        return Response(serializer.data)
+
     @method_decorator(cache_page(60*30, cache='api'))  # Cache for 30 minutes
     @action(detail=False, methods=['get'])
     def popular(self, request):
         """
         Return popular tours based on booking count.
         """
-        popular_tours = self.get_queryset().order_by('-booking_count')[:6]
+        popular_tours = self.get_queryset().annotate(
+            booking_count=Count('bookings', distinct=True)
+        ).order_by('-booking_count')[:6]
         serializer = TourListSerializer(popular_tours, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -148,4 +221,26 @@ class ActivityViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
     permission_classes = [permissions.AllowAny]
-    pagination_class = LargeResultsSetPagination
\ No newline at end of file
+    pagination_class = LargeResultsSetPagination
+
+
+class TourQuoteView(APIView):
+    """
+    Price a batch of parties at once, e.g. for the comparison and cart
+    widgets: ``{"items": [{"tour": 1, "adults": 2, "children": 1,
+    "currency": "EUR", "promo": "SUMMER"}, ...]}``. Items that cannot be
+    priced get an ``error`` instead of a quote.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        serializer = QuoteRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+        quotes = []
+        for item, result in zip(items, quote_many(items)):
+            if isinstance(result, PricingError):
+                quotes.append({'tour': item['tour'], 'error': str(result)})
+            else:
+                quotes.append(QuoteSerializer(result).data)
+        return Response({'quotes': quotes})
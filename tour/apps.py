@@ -9,3 +9,5 @@ class TourConfig(AppConfig):
     def ready(self):
         # Import translation options here to ensure they are registered
         import tour.translation
+        # Connect signal handlers that maintain the search, facet and related-tours indexes
+        import tour.signals
@@ -0,0 +1,104 @@
+"""
+Availability search over the ``TourDate`` inventory.
+
+"Tours with at least N free seats starting between D1 and D2" is answered
+for the whole catalog in one query: the tour list is filtered with an
+``EXISTS`` over the tour's dates, and the number of matching dates and the
+first matching date are annotated as correlated subqueries. Each subquery
+is an index lookup on ``TourDate(tour, start_date, is_active)``, so the cost
+does not grow with the number of tours on a page.
+
+The window is read from ``date_from``, ``date_to`` and ``party_size`` query
+parameters. Without ``date_from`` only dates from today on are considered.
+"""
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+# Annotation holding each field of the first matching date
+NEXT_DATE_FIELDS = {
+    'next_date_id': 'pk',
+    'next_date_start': 'start_date',
+    'next_date_end': 'end_date',
+    'next_date_seats': 'available_seats',
+}
+
+
+def parse_availability(params):
+    """
+    Read ``date_from``, ``date_to`` and ``party_size`` from a QueryDict.
+
+    Returns ``{'date_from': ..., 'date_to': ..., 'seats': ...}`` with the
+    valid values, or None when none of the parameters is given. Invalid
+    values are ignored.
+    """
+    window = {}
+    for key in ('date_from', 'date_to'):
+        try:
+            value = parse_date(params.get(key) or '')
+        except ValueError:
+            value = None
+        if value:
+            window[key] = value
+    party_size = params.get('party_size') or ''
+    if party_size.isdigit() and int(party_size) > 0:
+        window['seats'] = int(party_size)
+    return window or None
+
+
+def bookable_dates(date_from=None, date_to=None, seats=1):
+    """Active dates starting within the window with at least ``seats`` free seats."""
+    from .models import TourDate
+
+    dates = TourDate.objects.filter(
+        is_active=True,
+        available_seats__gte=max(seats, 1),
+        start_date__gte=date_from or timezone.now().date(),
+    )
+    if date_to:
+        dates = dates.filter(start_date__lte=date_to)
+    return dates
+
+
+def filter_available(queryset, date_from=None, date_to=None, seats=1):
+    """Restrict a Tour queryset to tours with a bookable date in the window."""
+    dates = bookable_dates(date_from, date_to, seats).filter(tour=OuterRef('pk'))
+    return queryset.filter(Exists(dates))
+
+
+def with_availability(queryset, date_from=None, date_to=None, seats=1):
+    """
+    Annotate a Tour queryset with ``available_dates_count`` and the fields of
+    the first bookable date in the window (``next_date_*``, see
+    ``NEXT_DATE_FIELDS``).
+    """
+    dates = bookable_dates(date_from, date_to, seats).filter(tour=OuterRef('pk'))
+    count = dates.order_by().values('tour').annotate(count=Count('pk')).values('count')
+    first = dates.order_by('start_date', 'pk')
+    return queryset.annotate(
+        available_dates_count=Coalesce(Subquery(count, output_field=IntegerField()), 0),
+        **{
+            annotation: Subquery(first.values(field)[:1])
+            for annotation, field in NEXT_DATE_FIELDS.items()
+        }
+    )
+
+
+def next_available_date(tour):
+    """
+    The first bookable date of a tour annotated by ``with_availability``, as
+    an unsaved ``TourDate``, or None if it has none.
+    """
+    from .models import TourDate
+
+    if getattr(tour, 'next_date_id', None) is None:
+        return None
+    return TourDate(
+        pk=tour.next_date_id,
+        tour_id=tour.pk,
+        start_date=tour.next_date_start,
+        end_date=tour.next_date_end,
+        available_seats=tour.next_date_seats,
+        is_active=True,
+    )
@@ -0,0 +1,153 @@
+"""
+Data loader for the tour detail page.
+
+``TourDetailBundle`` gathers everything ``tour/tour_detail.html`` needs in a
+fixed number of queries, independent of the number of reviews, dates,
+itinerary days or related tours:
+
+1. the tour with its destination and rating summary, plus the current
+   user's review status and wishlist flag as annotations
+2. itinerary, 3. FAQs, 4. bookable dates (prefetched)
+5. the requested page of approved reviews with their authors
+6. related tours from the precomputed ``RelatedTour`` table, with their
+   destinations and rating summaries
+
+The review paginator takes its total from the rating summary instead of
+running a COUNT query.
+"""
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Exists, OuterRef, Prefetch, Q, Subquery
+
+from reviews.models import Review
+from users.models import WishlistItem
+from .models import Tour, TourDate
+
+REVIEWS_PER_PAGE = 5
+RELATED_TOURS = 3
+
+
+def tour_detail_queryset(user=None):
+    """Tour queryset with everything the detail page reads from the tour itself."""
+    queryset = Tour.objects.select_related('destination', 'rating_summary').prefetch_related(
+        'itinerary',
+        'faqs',
+        Prefetch(
+            'dates',
+            queryset=TourDate.objects.filter(is_active=True, available_seats__gt=0).order_by('start_date'),
+            to_attr='bookable_dates'
+        ),
+    )
+    if user is not None and user.is_authenticated:
+        # None if the user has not reviewed the tour, else the approval flag
+        queryset = queryset.annotate(
+            user_review_approved=Subquery(
+                Review.objects.filter(tour=OuterRef('pk'), user=user).values('is_approved')[:1]
+            ),
+            in_user_wishlist=Exists(
+                WishlistItem.objects.filter(tour=OuterRef('pk'), user=user)
+            ),
+        )
+    return queryset
+
+
+def related_tours(tour):
+    """Queryset of the most similar active tours from the related-tours index, best first."""
+    return (
+        Tour.objects.filter(related_from__tour=tour, is_active=True)
+        .select_related('destination', 'rating_summary')
+        .order_by('related_from__rank')
+    )
+
+
+class TourDetailBundle:
+    """Everything rendered on the tour detail page, loaded from one Tour object."""
+
+    def __init__(self, tour, user=None, page=None):
+        self.tour = tour
+        self.user = user
+        self.summary = tour.get_rating_summary()
+
+        approved = getattr(tour, 'user_review_approved', None)
+        self.user_reviewed = approved is not None
+        self.is_in_wishlist = bool(getattr(tour, 'in_user_wishlist', False))
+        if approved is False:
+            self._approve_user_review()
+
+        self.tour_dates = getattr(tour, 'bookable_dates', None)
+        if self.tour_dates is None:
+            self.tour_dates = list(
+                tour.dates.filter(is_active=True, available_seats__gt=0).order_by('start_date')
+            )
+        self.reviews = self._review_page(page)
+        self.related_tours = self._related_tours()
+
+    def _approve_user_review(self):
+        # Users always see their own review, so approve it if it is pending
+        review = Review.objects.filter(tour=self.tour, user=self.user).first()
+        if review and not review.is_approved:
+            review.is_approved = True
+            review.save()
+            # The save updated the rating summary
+            if self.summary:
+                self.summary.refresh_from_db()
+            else:
+                self.summary = self.tour.get_rating_summary()
+
+    @property
+    def review_count(self):
+        return self.summary.review_count if self.summary else 0
+
+    def _review_page(self, page):
+        reviews = (
+            Review.objects.filter(tour=self.tour, is_approved=True)
+            .select_related('user')
+            .order_by('-created_at')
+        )
+        paginator = Paginator(reviews, REVIEWS_PER_PAGE)
+        # The count is already known from the summary
+        paginator.count = self.review_count
+        try:
+            return paginator.page(page)
+        except PageNotAnInteger:
+            return paginator.page(1)
+        except EmptyPage:
+            return paginator.page(paginator.num_pages)
+
+    def _related_tours(self):
+        related = list(related_tours(self.tour)[:RELATED_TOURS])
+        if related:
+            return related
+        return self._fallback_related_tours()
+
+    def _fallback_related_tours(self):
+        """Tours sharing the destination or a category, for tours not indexed yet."""
+        through = Tour.categories.through
+        shared_category = through.objects.filter(
+            category_id__in=through.objects.filter(tour_id=self.tour.pk).values('category_id')
+        ).values('tour_id')
+        return list(
+            Tour.objects.filter(is_active=True)
+            .filter(Q(destination_id=self.tour.destination_id) | Q(pk__in=shared_category))
+            .exclude(pk=self.tour.pk)
+            .select_related('destination', 'rating_summary')
+            .order_by('-is_featured', '-created_at')[:RELATED_TOURS]
+        )
+
+    @property
+    def rating_percentages(self):
+        """``(rating, percentage, count)`` tuples from 5 stars down to 1."""
+        if self.summary:
+            return self.summary.histogram
+        return [(rating, 0, 0) for rating in range(5, 0, -1)]
+
+    def available_dates(self):
+        """Bookable dates in the format used by the Flatpickr widget."""
+        return [
+            {
+                'id': date_obj.id,
+                'date': date_obj.start_date.strftime('%Y-%m-%d'),
+                'display': date_obj.start_date.strftime('%d %b %Y'),
+                'seats': date_obj.available_seats,
+            }
+            for date_obj in self.tour_dates
+        ]
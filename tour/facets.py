@@ -0,0 +1,397 @@
+"""
+In-memory faceting engine for the tour catalog.
+
+The index holds every active tour once, in ascending ID order, and represents
+each facet value (a destination, a category, a duration bucket, ...) as a
+bitset over those positions. Python integers serve as the bitsets, so
+combining filters is a handful of ``&``/``|`` operations and counting is
+``int.bit_count()``; no SQL runs per facet value or per filter combination.
+
+Counts are disjunctive: the counts of one facet are computed with the
+selections of every *other* facet applied, so users can see how many tours
+they would get by switching to a different value.
+
+The index is built with three queries, kept per worker, and rebuilt after
+tours change (see ``tour.signals``), after another worker bumps the version
+key in the ``SHARED_CACHE_ALIAS`` cache, or at the latest after
+``FACET_INDEX_TTL`` seconds.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from core.schema import tables_ready
+from .availability import filter_available, parse_availability
+from .geo import filter_near, parse_near
+
+logger = logging.getLogger(__name__)
+
+FACET_INDEX_TTL = 60 * 5
+FACET_VERSION_CACHE_KEY = 'tour_facets_version'
+
+# (key, lower bound inclusive, upper bound exclusive or None)
+DURATION_BUCKETS = (
+    ('1', 1, 2),
+    ('2-3', 2, 4),
+    ('4-7', 4, 8),
+    ('8-14', 8, 15),
+    ('15+', 15, None),
+)
+
+PRICE_BUCKETS = (
+    ('0-100', Decimal('0'), Decimal('100')),
+    ('100-250', Decimal('100'), Decimal('250')),
+    ('250-500', Decimal('250'), Decimal('500')),
+    ('500-1000', Decimal('500'), Decimal('1000')),
+    ('1000+', Decimal('1000'), None),
+)
+
+FACETS = ('destination', 'category', 'activity', 'duration', 'price')
+
+# Query string parameter for each facet, shared by TourListView and the API
+FACET_PARAMS = {
+    'destination': 'destination',
+    'category': 'category',
+    'activity': 'activity',
+    'duration': 'duration_range',
+    'price': 'price_range',
+}
+
+
+def bucket_for(value, buckets):
+    """Return the key of the bucket containing ``value``, or None."""
+    for key, lower, upper in buckets:
+        if value >= lower and (upper is None or value < upper):
+            return key
+    return None
+
+
+def bucket_bounds(key, buckets):
+    """Return the ``(lower, upper)`` bounds of a bucket key, or None."""
+    for bucket_key, lower, upper in buckets:
+        if bucket_key == key:
+            return lower, upper
+    return None
+
+
+def _bitset(positions, size):
+    """Build an int bitset from an iterable of bit positions in O(size)."""
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+class FacetIndex:
+    """Immutable snapshot of the active tours and their facet bitsets."""
+
+    def __init__(self, tour_ids, prices, durations, facet_positions):
+        self.tour_ids = tour_ids
+        self.size = len(tour_ids)
+        self.prices = prices
+        self.durations = durations
+        self.all = (1 << self.size) - 1
+        self.facets = {
+            facet: {value: _bitset(positions, self.size) for value, positions in values.items()}
+            for facet, values in facet_positions.items()
+        }
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls):
+        from .models import Tour
+
+        rows = list(
+            Tour.objects.filter(is_active=True)
+            .order_by('pk')
+            .values_list('pk', 'destination__slug', 'duration_days', 'price')
+        )
+        tour_ids = [row[0] for row in rows]
+        position = {pk: i for i, pk in enumerate(tour_ids)}
+
+        facet_positions = {facet: defaultdict(list) for facet in FACETS}
+        prices = []
+        durations = []
+        for i, (pk, destination_slug, duration_days, price) in enumerate(rows):
+            prices.append(price)
+            durations.append(duration_days)
+            facet_positions['destination'][destination_slug].append(i)
+            duration_key = bucket_for(duration_days, DURATION_BUCKETS)
+            if duration_key:
+                facet_positions['duration'][duration_key].append(i)
+            price_key = bucket_for(price, PRICE_BUCKETS)
+            if price_key:
+                facet_positions['price'][price_key].append(i)
+
+        category_links = Tour.categories.through.objects.filter(
+            tour__is_active=True
+        ).values_list('tour_id', 'category__slug')
+        for tour_id, category_slug in category_links:
+            if tour_id in position:
+                facet_positions['category'][category_slug].append(position[tour_id])
+
+        activity_links = Tour.activities.through.objects.filter(
+            tour__is_active=True
+        ).values_list('tour_id', 'activity_id')
+        for tour_id, activity_id in activity_links:
+            if tour_id in position:
+                facet_positions['activity'][str(activity_id)].append(position[tour_id])
+
+        return cls(tour_ids, prices, durations, facet_positions)
+
+    # Universe restrictions for filters that are not facets
+
+    def ids_mask(self, tour_ids):
+        """Bitset of the given tour IDs (e.g. full-text search matches)."""
+        positions = []
+        for pk in tour_ids:
+            i = bisect.bisect_left(self.tour_ids, pk)
+            if i < self.size and self.tour_ids[i] == pk:
+                positions.append(i)
+        return _bitset(positions, self.size)
+
+    def range_mask(self, values, lower=None, upper=None):
+        """Bitset of positions whose value is within ``[lower, upper]``."""
+        return _bitset(
+            (i for i, value in enumerate(values)
+             if (lower is None or value >= lower) and (upper is None or value <= upper)),
+            self.size
+        )
+
+    def selection_mask(self, facet, values):
+        """Union of the bitsets of the selected values of one facet."""
+        mask = 0
+        for value in values:
+            mask |= self.facets[facet].get(value, 0)
+        return mask
+
+    def match(self, selections, universe=None):
+        """Bitset of tours matching every facet selection."""
+        result = self.all if universe is None else universe
+        for facet, values in selections.items():
+            if values:
+                result &= self.selection_mask(facet, values)
+        return result
+
+    def matching_ids(self, selections, universe=None):
+        """Tour IDs matching the selections, in ascending order."""
+        data = self.match(selections, universe).to_bytes((self.size + 7) // 8, 'little')
+        ids = []
+        for byte_index, byte in enumerate(data):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    ids.append(self.tour_ids[(byte_index << 3) + bit])
+        return ids
+
+    def counts(self, selections, universe=None):
+        """
+        Return ``{'total': n, 'facets': {facet: {value: count}}}``.
+
+        Each facet's counts apply the selections of all other facets, so a
+        selected value does not zero out its siblings.
+        """
+        base = self.all if universe is None else universe
+        masks = {
+            facet: self.selection_mask(facet, values)
+            for facet, values in selections.items() if values
+        }
+
+        total = base
+        for mask in masks.values():
+            total &= mask
+
+        result = {}
+        for facet in FACETS:
+            others = base
+            for other, mask in masks.items():
+                if other != facet:
+                    others &= mask
+            result[facet] = {
+                value: (bits & others).bit_count()
+                for value, bits in self.facets[facet].items()
+            }
+        return {'total': total.bit_count(), 'facets': result}
+
+
+def shared_cache():
+    return caches[getattr(settings, 'SHARED_CACHE_ALIAS', 'default')]
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_facet_index():
+    """Return the current index, rebuilding it if it is stale."""
+    global _index, _index_version
+
+    version = shared_cache().get(FACET_VERSION_CACHE_KEY)
+    index = _index
+    if (index is not None and version == _index_version
+            and time.monotonic() - index.built_at < FACET_INDEX_TTL):
+        return index
+
+    with _lock:
+        if _index is not index and _index is not None:
+            # Another thread rebuilt it while we were waiting
+            return _index
+        _index = FacetIndex.build()
+        _index_version = version
+        return _index
+
+
+def invalidate_facet_index():
+    """Drop this worker's index and tell other workers to rebuild theirs."""
+    global _index
+    _index = None
+    cache = shared_cache()
+    try:
+        cache.incr(FACET_VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(FACET_VERSION_CACHE_KEY, 1, None)
+
+
+def selections_from_query(params):
+    """Read facet selections from a QueryDict (multiple values allowed)."""
+    return {
+        facet: [value for value in params.getlist(param) if value]
+        for facet, param in FACET_PARAMS.items()
+    }
+
+
+def _decimal(value):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _ranges(params):
+    """``(min_price, max_price, duration)`` from ``params``, None where unset or invalid."""
+    duration = params.get('duration')
+    return (
+        _decimal(params.get('min_price')),
+        _decimal(params.get('max_price')),
+        int(duration) if duration and duration.isdigit() else None,
+    )
+
+
+def facet_counts(params, search_ids=None):
+    """
+    Compute facet counts for a tour list request.
+
+    ``params`` is the request's QueryDict: besides the facet selections, its
+    price, duration, ``near`` and availability filters restrict the tours
+    counted. ``search_ids`` are the tour IDs matched by the full-text
+    search, if a search is active. Returns None when the tour tables are not
+    ready.
+    """
+    from .models import Tour
+
+    if not tables_ready(Tour):
+        return None
+
+    try:
+        index = get_facet_index()
+        universe = index.all
+        if search_ids is not None:
+            universe &= index.ids_mask(search_ids)
+
+        min_price, max_price, duration = _ranges(params)
+        if min_price is not None or max_price is not None:
+            universe &= index.range_mask(index.prices, min_price, max_price)
+        if duration is not None:
+            universe &= index.range_mask(index.durations, duration, duration)
+
+        restricted_ids = _near_and_available_ids(params)
+        if restricted_ids is not None:
+            universe &= index.ids_mask(restricted_ids)
+
+        return index.counts(selections_from_query(params), universe)
+    except Exception as e:
+        logger.error(f"Error computing tour facets: {e}")
+        return None
+
+
+def _near_and_available_ids(params):
+    """
+    IDs of the active tours passing the ``near`` and availability filters in
+    ``params``, or None if neither is set. Like the search matches, they only
+    restrict the universe; facet selections are left to ``counts`` so the
+    counts stay disjunctive.
+    """
+    from .models import Tour
+
+    near = parse_near(params)
+    window = parse_availability(params)
+    if not near and not window:
+        return None
+    queryset = Tour.objects.filter(is_active=True)
+    if near:
+        queryset = filter_near(queryset, *near)
+    if window:
+        queryset = filter_available(queryset, **window)
+    return queryset.values_list('pk', flat=True)
+
+
+def _bucket_q(field, keys, buckets):
+    q = Q()
+    for key in keys:
+        bounds = bucket_bounds(key, buckets)
+        if bounds is None:
+            continue
+        lower, upper = bounds
+        condition = Q(**{f'{field}__gte': lower})
+        if upper is not None:
+            condition &= Q(**{f'{field}__lt': upper})
+        q |= condition
+    return q
+
+
+def filter_queryset(queryset, params):
+    """
+    Apply the facet selections in ``params`` to a Tour queryset in SQL.
+
+    Values within one facet are ORed, facets are ANDed, matching the
+    semantics of ``FacetIndex.match``.
+    """
+    selections = selections_from_query(params)
+    needs_distinct = False
+
+    if selections['destination']:
+        queryset = queryset.filter(destination__slug__in=selections['destination'])
+    if selections['category']:
+        queryset = queryset.filter(categories__slug__in=selections['category'])
+        needs_distinct = True
+    activity_ids = [value for value in selections['activity'] if value.isdigit()]
+    if activity_ids:
+        queryset = queryset.filter(activities__id__in=activity_ids)
+        needs_distinct = True
+    if selections['duration']:
+        queryset = queryset.filter(_bucket_q('duration_days', selections['duration'], DURATION_BUCKETS))
+    if selections['price']:
+        queryset = queryset.filter(_bucket_q('price', selections['price'], PRICE_BUCKETS))
+
+    return queryset.distinct() if needs_distinct else queryset
+
+
+def filter_by_range(queryset, params):
+    """Apply ``min_price``, ``max_price`` and an exact ``duration`` in days, as ``facet_counts`` does."""
+    min_price, max_price, duration = _ranges(params)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    if duration is not None:
+        queryset = queryset.filter(duration_days=duration)
+    return queryset
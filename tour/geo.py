@@ -0,0 +1,205 @@
+"""
+Proximity search over tour coordinates without a spatial database.
+
+Each tour stores the geohash of its coordinates (``Tour.geohash``, kept up to
+date by ``Tour.save``). A geohash cell of precision ``p`` is a fixed lat/lng
+rectangle and all points inside it share the same ``p``-character prefix, so
+"tours within r km of a point" becomes:
+
+1. the bounding box of the circle,
+2. the few geohash cells of the finest precision that cover the box with at
+   most ``MAX_CELLS`` cells, queried as index range scans on ``geohash``
+   (adjacent cells are merged into one range),
+3. the exact bounding box on ``latitude``/``longitude``,
+4. the great-circle (haversine) distance, annotated as ``distance`` in km and
+   used to drop the corners of the box and to sort by distance.
+
+Only the rows in the covering cells are ever read, which keeps a search in
+the low milliseconds for tens of thousands of tours.
+"""
+import math
+
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Upper bound on the geohash cells scanned per search
+MAX_CELLS = 16
+
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 1000
+
+
+def _cell_bits(precision):
+    """``(latitude bits, longitude bits)`` of a geohash; longitude gets the odd bit."""
+    bits = 5 * precision
+    return bits // 2, bits - bits // 2
+
+
+def _cell_index(value, low, high, bits):
+    index = int((value - low) / (high - low) * (1 << bits))
+    return min(max(index, 0), (1 << bits) - 1)
+
+
+def _code(lat_index, lng_index, precision):
+    """Interleave the cell indices (longitude first) into the geohash as an integer."""
+    lat_bits, lng_bits = _cell_bits(precision)
+    code = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lng_bits -= 1
+            code = (code << 1) | ((lng_index >> lng_bits) & 1)
+        else:
+            lat_bits -= 1
+            code = (code << 1) | ((lat_index >> lat_bits) & 1)
+    return code
+
+
+def _to_string(code, precision):
+    return ''.join(
+        GEOHASH_ALPHABET[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision)
+    )
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Return the geohash of a point."""
+    lat_bits, lng_bits = _cell_bits(precision)
+    return _to_string(
+        _code(
+            _cell_index(float(latitude), -90.0, 90.0, lat_bits),
+            _cell_index(float(longitude), -180.0, 180.0, lng_bits),
+            precision
+        ),
+        precision
+    )
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    ``(south, west, north, east)`` of the circle around a point.
+
+    ``west > east`` when the box crosses the antimeridian; the box spans all
+    longitudes when it reaches a pole.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    south, north = latitude - dlat, latitude + dlat
+    if south <= -90 or north >= 90:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    # The circle's widest longitudes are where its meridians are tangent to
+    # it, not on the parallel through the centre
+    ratio = math.sin(angle) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return south, -180.0, north, 180.0
+    dlng = math.degrees(math.asin(ratio))
+    west, east = longitude - dlng, longitude + dlng
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, west, north, east
+
+
+def covering_cells(south, west, north, east):
+    """
+    Geohash ranges ``[(low, high), ...]`` (high exclusive, None for no upper
+    bound) covering a bounding box, using the finest precision that needs at
+    most ``MAX_CELLS`` cells.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_bits, lng_bits = _cell_bits(precision)
+        lat_range = range(
+            _cell_index(south, -90.0, 90.0, lat_bits),
+            _cell_index(north, -90.0, 90.0, lat_bits) + 1
+        )
+        first = _cell_index(west, -180.0, 180.0, lng_bits)
+        last = _cell_index(east, -180.0, 180.0, lng_bits)
+        columns = 1 << lng_bits
+        # Across the antimeridian the columns wrap around
+        lng_count = (last - first) % columns + 1
+        if west > east and lng_count == 1:
+            lng_count = columns
+        if len(lat_range) * lng_count <= MAX_CELLS or precision == 1:
+            break
+
+    codes = sorted(
+        _code(i, (first + j) % columns, precision)
+        for i in lat_range for j in range(lng_count)
+    )
+    ranges = []
+    for code in codes:
+        if ranges and ranges[-1][1] == code:
+            ranges[-1][1] = code + 1
+        else:
+            ranges.append([code, code + 1])
+
+    limit = 1 << (5 * precision)
+    return [
+        (_to_string(low, precision), _to_string(high, precision) if high < limit else None)
+        for low, high in ranges
+    ]
+
+
+def distance_expression(latitude, longitude):
+    """Haversine distance in km from a point to each row's coordinates."""
+    lat = Radians(Cast('latitude', FloatField()))
+    lng = Radians(Cast('longitude', FloatField()))
+    origin_lat = math.radians(latitude)
+    origin_lng = math.radians(longitude)
+    half_chord = (
+        Power(Sin((lat - Value(origin_lat)) / 2), 2)
+        + Value(math.cos(origin_lat)) * Cos(lat) * Power(Sin((lng - Value(origin_lng)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(half_chord))
+
+
+def filter_near(queryset, latitude, longitude, radius_km):
+    """
+    Restrict a Tour queryset to the tours within ``radius_km`` of a point and
+    annotate each with its ``distance`` in km. Tours without coordinates are
+    excluded.
+    """
+    south, west, north, east = bounding_box(latitude, longitude, radius_km)
+
+    cells = Q()
+    for low, high in covering_cells(south, west, north, east):
+        cell = Q(geohash__gte=low)
+        if high is not None:
+            cell &= Q(geohash__lt=high)
+        cells |= cell
+
+    box = Q(latitude__gte=south, latitude__lte=north)
+    if west <= east:
+        box &= Q(longitude__gte=west, longitude__lte=east)
+    else:
+        box &= Q(longitude__gte=west) | Q(longitude__lte=east)
+
+    return (
+        queryset.filter(cells, box)
+        .annotate(distance=distance_expression(latitude, longitude))
+        .filter(distance__lte=radius_km)
+    )
+
+
+def parse_near(params):
+    """
+    Read ``near=lat,lng`` and ``radius_km`` from a QueryDict.
+
+    Returns ``(latitude, longitude, radius_km)``, or None when the parameters
+    are missing or invalid.
+    """
+    near = params.get('near')
+    if not near:
+        return None
+    try:
+        latitude, longitude = (float(part) for part in near.split(','))
+        radius_km = float(params.get('radius_km') or DEFAULT_RADIUS_KM)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or not 0 < radius_km:
+        return None
+    return latitude, longitude, min(radius_km, MAX_RADIUS_KM)
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from tour import similarity
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-tours similarity index for all active tours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=similarity.TOP_K,
+                            help='Number of related tours stored per tour')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = similarity.rebuild_related_tours(k=options['top_k'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Indexed related tours for {count} tours in {elapsed:.1f}s'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from tour import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all tours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of tours indexed per batch')
+
+    def handle(self, *args, **options):
+        if not search.index_available():
+            self.stdout.write(self.style.ERROR(
+                'Search index table is not available; run migrations first '
+                '(only SQLite and PostgreSQL are supported)'
+            ))
+            return
+
+        count = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} tours'))
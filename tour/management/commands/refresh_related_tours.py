@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tour.similarity import process_queued_refreshes
+
+
+class Command(BaseCommand):
+    help = 'Refresh the related tours of the tours queued by catalog changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and refresh newly queued tours every --interval seconds')
+        parser.add_argument('--interval', type=float,
+                            default=getattr(settings, 'RELATED_TOURS_REFRESH_INTERVAL', 10),
+                            help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                close_old_connections()
+                refreshed = process_queued_refreshes()
+                if refreshed or not options['loop']:
+                    self.stdout.write(f'Refreshed related tours of {refreshed} tours')
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Error refreshing related tours: {e}'))
+                if not options['loop']:
+                    raise
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tour_search_index USING fts5(
+    ar, en, fr, de,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE IF NOT EXISTS tour_search_index (
+        tour_id bigint PRIMARY KEY REFERENCES tour_tour (id) ON DELETE CASCADE,
+        ar tsvector NOT NULL,
+        en tsvector NOT NULL,
+        fr tsvector NOT NULL,
+        de tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS tour_search_index_ar ON tour_search_index USING gin (ar)",
+    "CREATE INDEX IF NOT EXISTS tour_search_index_en ON tour_search_index USING gin (en)",
+    "CREATE INDEX IF NOT EXISTS tour_search_index_fr ON tour_search_index USING gin (fr)",
+    "CREATE INDEX IF NOT EXISTS tour_search_index_de ON tour_search_index USING gin (de)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS tour_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tour', '0005_remove_difficulty_field'),
+    ]
+
+    operations = [
+        # The index is not a Django model: SQLite stores it in an FTS5
+        # virtual table and PostgreSQL in per-language tsvector columns.
+        # Populate it with `python manage.py rebuild_search_index`.
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 03:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tour', '0006_tour_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedTour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rank')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_from', to='tour.tour', verbose_name='Related Tour')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='tour.tour', verbose_name='Tour')),
+            ],
+            options={
+                'verbose_name': 'Related Tour',
+                'verbose_name_plural': 'Related Tours',
+                'ordering': ['tour', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('tour', 'rank'), name='tour_relatedtour_unique_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 03:24
+
+from django.db import migrations, models
+
+from tour.geo import encode
+
+
+def populate_geohashes(apps, schema_editor):
+    Tour = apps.get_model('tour', 'Tour')
+    tours = list(
+        Tour.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        .only('pk', 'latitude', 'longitude')
+    )
+    for tour in tours:
+        tour.geohash = encode(tour.latitude, tour.longitude)
+    Tour.objects.bulk_update(tours, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tour', '0007_relatedtour'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, verbose_name='Geohash'),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tour', '0008_tour_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tourdate',
+            index=models.Index(fields=['tour', 'start_date', 'is_active'], name='tour_tourdate_avail_idx'),
+        ),
+    ]
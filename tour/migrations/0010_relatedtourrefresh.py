@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tour', '0009_tourdate_availability_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedTourRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tour_id', models.PositiveIntegerField(verbose_name='Tour ID')),
+                ('queued_at', models.DateTimeField(auto_now_add=True, verbose_name='Queued At')),
+            ],
+            options={
+                'verbose_name': 'Related Tours Refresh',
+                'verbose_name_plural': 'Related Tours Refreshes',
+            },
+        ),
+    ]
@@ -1,9 +1,12 @@
 from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
 from django.urls import reverse  # Import reverse
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
 from users.models import CustomUser
 from core.models import Currency
+from core.counters import increment_counter
+from . import geo
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -120,6 +123,8 @@ class Tour(models.Model):
                                   blank=True, null=True)
     longitude = models.DecimalField(_("Longitude"), max_digits=9, decimal_places=6,
                                    blank=True, null=True)
+    # Geohash of latitude/longitude for proximity search (see tour.geo)
+    geohash = models.CharField(_("Geohash"), max_length=12, blank=True, editable=False, db_index=True)
     is_featured = models.BooleanField(_("Is Featured"), default=False)
     is_active = models.BooleanField(_("Is Active"), default=True)
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
@@ -137,6 +142,13 @@ class Tour(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
         super().save(*args, **kwargs)
 
     @property
@@ -158,19 +170,26 @@ class Tour(models.Model):
             return self.price - self.discount_price
         return 0
 
+    def get_rating_summary(self):
+        """Return the tour's ``TourRatingSummary``, or None if it has none yet."""
+        try:
+            return self.rating_summary
+        except ObjectDoesNotExist:
+            return None
+
     def get_review_count(self):
-        return self.tour_reviews.filter(is_approved=True).count()
+        summary = self.get_rating_summary()
+        return summary.review_count if summary else 0
 
     def get_average_rating(self):
-        reviews = self.tour_reviews.filter(is_approved=True)
-        if not reviews.exists():
+        summary = self.get_rating_summary()
+        if not summary or not summary.review_count:
             return 0
-        return round(reviews.aggregate(models.Avg('rating'))['rating__avg'], 1)
+        return round(summary.average_rating, 1)
 
     def increment_view_count(self):
-        """Increment the view count"""
-        self.view_count = models.F('view_count') + 1
-        self.save(update_fields=['view_count'])
+        """Increment the view count (buffered, see ``core.counters``)"""
+        increment_counter(Tour, self.pk, 'view_count')
 
     def get_absolute_url(self):
         """Returns the URL to access a detail record for this tour."""
@@ -206,6 +225,10 @@ class TourDate(models.Model):
         verbose_name = _("Tour Date")
         verbose_name_plural = _("Tour Dates")
         ordering = ['start_date']
+        indexes = [
+            # Availability lookups per tour (see tour.availability)
+            models.Index(fields=['tour', 'start_date', 'is_active'], name='tour_tourdate_avail_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tour.name} - {self.start_date}"
@@ -268,6 +291,49 @@ class TourFAQ(models.Model):
         return f"{self.tour.name} - {self.question}"
 
 
+class RelatedTour(models.Model):
+    """
+    Precomputed top-k similar tours, maintained by ``tour.similarity``.
+    """
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE,
+                           related_name='related_entries', verbose_name=_("Tour"))
+    related = models.ForeignKey(Tour, on_delete=models.CASCADE,
+                              related_name='related_from', verbose_name=_("Related Tour"))
+    rank = models.PositiveSmallIntegerField(_("Rank"))
+    score = models.FloatField(_("Score"))
+
+    class Meta:
+        verbose_name = _("Related Tour")
+        verbose_name_plural = _("Related Tours")
+        ordering = ['tour', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['tour', 'rank'], name='tour_relatedtour_unique_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.tour_id} -> {self.related_id} ({self.score:.2f})"
+
+
+class RelatedTourRefresh(models.Model):
+    """
+    A tour whose related tours must be recomputed, queued by ``tour.signals``
+    in the transaction that changed it and drained in batches by
+    ``python manage.py refresh_related_tours`` (see ``tour.similarity``).
+
+    Not a foreign key: deleted tours stay queued so the tours that listed
+    them get new neighbours.
+    """
+    tour_id = models.PositiveIntegerField(_("Tour ID"))
+    queued_at = models.DateTimeField(_("Queued At"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Related Tours Refresh")
+        verbose_name_plural = _("Related Tours Refreshes")
+
+    def __str__(self):
+        return f"{self.tour_id} ({self.queued_at})"
+
+
 class Promotion(models.Model):
     """Model for tour promotions and offers"""
     title = models.CharField(_("Title"), max_length=200)
@@ -0,0 +1,214 @@
+"""
+Tour pricing.
+
+Every price shown or charged for a tour comes from ``quote``: a tour, the
+party (adults and children), an optional promotion and a currency in, a
+``Quote`` out. The rules are:
+
+* adults pay the tour price, children ``CHILD_RATE`` of it,
+* the tour's discount price, when lower, is the tour discount,
+* a valid promotion for the tour takes its percentage off what is left,
+* amounts are converted with the currency's exchange rate and rounded to
+  cents; all arithmetic is done in ``Decimal``.
+
+Prices are stored in ``settings.DEFAULT_CURRENCY_CODE``. The arithmetic is a
+pure function of the tour's prices, the party, the promotion percentage and
+the exchange rate, and is memoized on exactly those values, so a changed
+tour price or rate is simply a new cache entry.
+
+``quote_many`` prices a batch of requests with one query each for the
+tours, the promotions and the exchange rates, whatever the batch size.
+"""
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+
+CHILD_RATE = Decimal('0.5')
+CENT = Decimal('0.01')
+
+# Requests accepted by quote_many in one batch
+MAX_BATCH_SIZE = 50
+
+# Distinct (prices, party, promotion, rate) combinations kept in memory
+QUOTE_CACHE_SIZE = 4096
+
+Quote = namedtuple('Quote', [
+    'tour_id', 'num_adults', 'num_children', 'currency_code', 'exchange_rate',
+    'regular_price', 'adult_price', 'child_price',
+    'adult_amount', 'child_amount',
+    'subtotal', 'tour_discount', 'promotion_code', 'promotion_discount',
+    'discount_amount', 'total_price', 'discount_percentage',
+])
+Quote.__doc__ = """
+Price of a party on a tour, in ``currency_code``.
+
+``regular_price`` is the adult list price and ``adult_price``/``child_price``
+what each adult/child pays after the tour discount. ``subtotal`` is at
+list prices, ``discount_amount`` is ``tour_discount + promotion_discount``
+and ``total_price = subtotal - discount_amount``.
+"""
+
+
+class PricingError(ValueError):
+    """A quote request that cannot be priced (unknown tour, promotion or currency)."""
+
+
+def base_currency_code():
+    return getattr(settings, 'DEFAULT_CURRENCY_CODE', 'USD')
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@lru_cache(maxsize=QUOTE_CACHE_SIZE)
+def _price(price, discount_price, num_adults, num_children, promotion_percentage, exchange_rate):
+    """The amounts of a ``Quote``, from hashable inputs only."""
+    regular_price = price * exchange_rate
+    if discount_price is not None and discount_price < price:
+        adult_price = discount_price * exchange_rate
+    else:
+        adult_price = regular_price
+    child_price = adult_price * CHILD_RATE
+
+    adult_amount = adult_price * num_adults
+    child_amount = child_price * num_children
+    promotion_discount = (adult_amount + child_amount) * promotion_percentage / 100
+
+    # Round what is charged and what it is compared with; the discounts are
+    # the differences, so subtotal - discount_amount == total_price exactly
+    subtotal = _money(regular_price * num_adults + regular_price * CHILD_RATE * num_children)
+    promotion_discount = _money(promotion_discount)
+    total_price = _money(adult_amount + child_amount) - promotion_discount
+    discount_amount = subtotal - total_price
+    return {
+        'regular_price': _money(regular_price),
+        'adult_price': _money(adult_price),
+        'child_price': _money(child_price),
+        'adult_amount': _money(adult_amount),
+        'child_amount': _money(child_amount),
+        'subtotal': subtotal,
+        'tour_discount': discount_amount - promotion_discount,
+        'promotion_discount': promotion_discount,
+        'discount_amount': discount_amount,
+        'total_price': total_price,
+        'discount_percentage': int(discount_amount / subtotal * 100) if subtotal else 0,
+    }
+
+
+def promotion_applies(promotion, tour_id, tour_ids=None, today=None):
+    """
+    Whether ``promotion`` is valid today and covers the tour. ``tour_ids`` is
+    the promotion's set of tour IDs when already loaded.
+    """
+    today = today or timezone.now().date()
+    if not (promotion.is_active and promotion.start_date <= today <= promotion.end_date):
+        return False
+    if promotion.usage_limit is not None and promotion.current_usage >= promotion.usage_limit:
+        return False
+    if tour_ids is None:
+        return promotion.tours.filter(pk=tour_id).exists()
+    return tour_id in tour_ids
+
+
+def quote(tour, num_adults, num_children=0, promotion=None, currency_code=None, exchange_rate=None):
+    """
+    Price a party on ``tour``.
+
+    ``promotion`` must already be checked with ``promotion_applies``.
+    Without ``currency_code`` the quote is in the base currency; otherwise
+    ``exchange_rate`` is looked up unless given.
+    """
+    num_adults = max(int(num_adults or 0), 0)
+    num_children = max(int(num_children or 0), 0)
+    currency_code = (currency_code or base_currency_code()).upper()
+    if exchange_rate is None:
+        exchange_rate = exchange_rates([currency_code]).get(currency_code)
+        if exchange_rate is None:
+            raise PricingError(f"Unknown currency {currency_code}")
+
+    amounts = _price(
+        tour.price,
+        tour.discount_price,
+        num_adults,
+        num_children,
+        Decimal(promotion.discount_percentage) if promotion else Decimal('0'),
+        Decimal(exchange_rate),
+    )
+    return Quote(
+        tour_id=tour.pk,
+        num_adults=num_adults,
+        num_children=num_children,
+        currency_code=currency_code,
+        exchange_rate=Decimal(exchange_rate),
+        promotion_code=promotion.code if promotion else None,
+        **amounts
+    )
+
+
+def exchange_rates(codes):
+    """``{code: rate}`` of the active currencies among ``codes``; the base currency is always 1."""
+    from core.models import Currency
+
+    base = base_currency_code()
+    rates = {base: Decimal('1')}
+    others = set(codes) - {base}
+    if others:
+        rates.update(
+            Currency.objects.filter(code__in=others, is_active=True).values_list('code', 'exchange_rate')
+        )
+    return rates
+
+
+def quote_many(requests):
+    """
+    Price a batch of requests with a constant number of queries.
+
+    Each request is a dict with ``tour`` (ID), ``adults``, ``children``,
+    ``currency`` and ``promo`` (code). Returns one ``Quote`` or
+    ``PricingError`` per request, in order.
+    """
+    from .models import Promotion, Tour
+
+    tour_ids = {request['tour'] for request in requests}
+    codes = {request['promo'] for request in requests if request.get('promo')}
+    currencies = {(request.get('currency') or base_currency_code()).upper() for request in requests}
+
+    tours = Tour.objects.filter(pk__in=tour_ids, is_active=True).only('pk', 'price', 'discount_price').in_bulk()
+    promotions = Promotion.objects.in_bulk(codes, field_name='code') if codes else {}
+    promotion_tours = {}
+    if promotions:
+        links = Promotion.tours.through.objects.filter(
+            promotion_id__in=[promotion.pk for promotion in promotions.values()], tour_id__in=tour_ids
+        ).values_list('promotion_id', 'tour_id')
+        for promotion_id, tour_id in links:
+            promotion_tours.setdefault(promotion_id, set()).add(tour_id)
+    rates = exchange_rates(currencies)
+
+    today = timezone.now().date()
+    results = []
+    for request in requests:
+        tour = tours.get(request['tour'])
+        currency_code = (request.get('currency') or base_currency_code()).upper()
+        code = request.get('promo') or ''
+        promotion = promotions.get(code)
+        if tour is None:
+            results.append(PricingError(f"Unknown tour {request['tour']}"))
+        elif currency_code not in rates:
+            results.append(PricingError(f"Unknown currency {currency_code}"))
+        elif code and not (promotion and promotion_applies(
+                promotion, tour.pk, promotion_tours.get(promotion.pk, set()), today)):
+            results.append(PricingError(f"Promotion {code} does not apply to this tour"))
+        else:
+            results.append(quote(
+                tour,
+                request.get('adults', 1),
+                request.get('children', 0),
+                promotion=promotion,
+                currency_code=currency_code,
+                exchange_rate=rates[currency_code],
+            ))
+    return results
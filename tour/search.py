@@ -0,0 +1,262 @@
+"""
+Full-text search index for the tour catalog.
+
+Every tour gets one search document per language (ar/en/fr/de) built from the
+translated ``TourTranslationOptions`` fields plus the destination's name, city
+and country. On SQLite the documents live in an FTS5 virtual table with one
+column per language; on PostgreSQL they are stored as per-language
+``tsvector`` columns with GIN indexes. Matches in the active language are
+ranked above matches in the other languages.
+
+The index is kept up to date by the signal handlers in ``tour.signals`` and
+can be rebuilt with ``python manage.py rebuild_search_index``. When the index
+table does not exist (e.g. before migrations ran) searches fall back to the
+old ``icontains`` filters.
+"""
+import logging
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import strip_tags
+from django.utils.translation import get_language
+
+from core.schema import tables_ready
+from .translation import TourTranslationOptions
+
+logger = logging.getLogger(__name__)
+
+INDEX_TABLE = 'tour_search_index'
+
+# Column order of the index table; must match migration 0006.
+SEARCH_LANGUAGES = ('ar', 'en', 'fr', 'de')
+
+# PostgreSQL text search configuration used for each language column
+POSTGRES_CONFIGS = {
+    'ar': 'arabic',
+    'en': 'english',
+    'fr': 'french',
+    'de': 'german',
+}
+
+# Weight applied to the active language's column when ranking
+ACTIVE_LANGUAGE_WEIGHT = 4.0
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def index_available():
+    """Return True if the search index can be used on this database."""
+    return connection.vendor in ('sqlite', 'postgresql') and tables_ready(INDEX_TABLE)
+
+
+def build_documents(tour):
+    """Return a ``{language: text}`` mapping of search documents for a tour."""
+    destination = tour.destination
+    documents = {}
+    for language in SEARCH_LANGUAGES:
+        parts = [
+            getattr(tour, f'{field}_{language}', None)
+            for field in TourTranslationOptions.fields
+        ]
+        parts += [
+            getattr(destination, f'name_{language}', None) or destination.name,
+            destination.city,
+            destination.country,
+        ]
+        documents[language] = ' '.join(strip_tags(part) for part in parts if part)
+    return documents
+
+
+def index_tours(tours):
+    """Add or replace the search documents of the given tours."""
+    if not index_available():
+        return 0
+
+    rows = [(tour.pk, build_documents(tour)) for tour in tours]
+    if not rows:
+        return 0
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s",
+                [(pk,) for pk, _ in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {INDEX_TABLE} (rowid, ar, en, fr, de) VALUES (%s, %s, %s, %s, %s)",
+                [(pk, *(docs[lang] for lang in SEARCH_LANGUAGES)) for pk, docs in rows]
+            )
+        else:
+            vectors = ', '.join(
+                f"to_tsvector('{POSTGRES_CONFIGS[lang]}', %s)" for lang in SEARCH_LANGUAGES
+            )
+            cursor.executemany(
+                f"INSERT INTO {INDEX_TABLE} (tour_id, ar, en, fr, de) VALUES (%s, {vectors}) "
+                "ON CONFLICT (tour_id) DO UPDATE SET "
+                "ar = EXCLUDED.ar, en = EXCLUDED.en, fr = EXCLUDED.fr, de = EXCLUDED.de",
+                [(pk, *(docs[lang] for lang in SEARCH_LANGUAGES)) for pk, docs in rows]
+            )
+    return len(rows)
+
+
+def remove_tours(tour_ids):
+    """Drop the search documents of the given tour IDs."""
+    if not index_available() or not tour_ids:
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'tour_id'
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {INDEX_TABLE} WHERE {column} = %s",
+            [(pk,) for pk in tour_ids]
+        )
+
+
+def rebuild_index(batch_size=500):
+    """Rebuild the whole index from the Tour table. Returns the tour count."""
+    from .models import Tour
+
+    if not index_available():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+
+    total = 0
+    batch = []
+    for tour in Tour.objects.select_related('destination').iterator(chunk_size=batch_size):
+        batch.append(tour)
+        if len(batch) >= batch_size:
+            total += index_tours(batch)
+            batch = []
+    total += index_tours(batch)
+    return total
+
+
+def _language_weights(language):
+    return [
+        ACTIVE_LANGUAGE_WEIGHT if lang == language else 1.0
+        for lang in SEARCH_LANGUAGES
+    ]
+
+
+def _terms(query):
+    return TERM_PATTERN.findall(query.lower())
+
+
+def _key_column():
+    """Column of the index table holding the tour ID."""
+    return 'rowid' if connection.vendor == 'sqlite' else 'tour_id'
+
+
+def _match_condition(terms):
+    """``(sql, params)`` of the condition on the index table matching all ``terms``."""
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return f"{INDEX_TABLE} MATCH %s", [match]
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    matches = ' OR '.join(
+        f"{lang} @@ to_tsquery('{POSTGRES_CONFIGS[lang]}', %s)" for lang in SEARCH_LANGUAGES
+    )
+    return f"({matches})", [tsquery] * len(SEARCH_LANGUAGES)
+
+
+def _rank_expression(terms, language):
+    """``(sql, params)`` ranking a matched index row, lower is better."""
+    weights = _language_weights(language)
+    if connection.vendor == 'sqlite':
+        return f"bm25({INDEX_TABLE}, %s, %s, %s, %s)", weights
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    rank = ' + '.join(
+        f"%s * ts_rank({lang}, to_tsquery('{POSTGRES_CONFIGS[lang]}', %s))" for lang in SEARCH_LANGUAGES
+    )
+    params = []
+    for weight in weights:
+        params += [weight, tsquery]
+    return f"-({rank})", params
+
+
+def search_tour_ids(query):
+    """
+    Return the IDs of all tours matching ``query``, in no particular order.
+
+    Every word of the query must appear in the tour's documents (in any
+    language); the last characters of each word are treated as a prefix so
+    partial words still match. Returns None if the index is not available.
+    ``search_tours`` ranks the matches.
+    """
+    if not index_available():
+        return None
+
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    condition, params = _match_condition(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {_key_column()} FROM {INDEX_TABLE} WHERE {condition}", params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def find_tour_ids(query):
+    """Like ``search_tour_ids`` but logs errors and returns None for them."""
+    try:
+        return search_tour_ids(query)
+    except Exception as e:
+        logger.error(f"Error querying the tour search index: {e}")
+        return None
+
+
+def search_tours(queryset, query, language=None, tour_ids=None):
+    """
+    Filter a Tour queryset down to matches for ``query``.
+
+    The result is annotated with ``search_rank`` (lower is better) and
+    ordered by it; callers may re-order it afterwards. Matching and ranking
+    run in the database, so filters, counts and pagination applied later see
+    every match. ``tour_ids`` from an earlier ``find_tour_ids`` call saves
+    looking up whether the index is available and anything matches.
+
+    The join repeats the MATCH of ``find_tour_ids`` on purpose. The IDs are
+    only read from the index and feed the facet counts, which count every
+    match whatever the other filters. The ranking, on the other hand, has to
+    stay in SQL for pagination, and on SQLite ``bm25()`` is only available
+    inside the MATCH query that found the row. Passing the IDs back in as a
+    ``pk__in`` list would leave the ranking nothing to work with.
+    """
+    if tour_ids is None:
+        tour_ids = find_tour_ids(query)
+
+    if tour_ids is None:
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(short_description__icontains=query) |
+            Q(destination__name__icontains=query) |
+            Q(destination__country__icontains=query) |
+            Q(destination__city__icontains=query)
+        )
+
+    if not tour_ids:
+        return queryset.none()
+
+    terms = _terms(query)
+    language = (language or get_language() or 'en')[:2]
+    condition, params = _match_condition(terms)
+    rank, rank_params = _rank_expression(terms, language)
+    quote = connection.ops.quote_name
+    tour_id = f"{quote(queryset.model._meta.db_table)}.{quote(queryset.model._meta.pk.column)}"
+    join = f"{INDEX_TABLE}.{_key_column()} = {tour_id}"
+    if connection.vendor == 'sqlite':
+        # Without the unary plus SQLite may look the index table up by rowid
+        # for each tour, re-running the MATCH every time
+        join = f"+{join}"
+    # Joined rather than filtered with a subquery: the FTS engine then
+    # finds the matches once and ranks each of them as it goes
+    return queryset.extra(
+        tables=[INDEX_TABLE],
+        where=[condition, join],
+        params=params,
+        select={'search_rank': rank},
+        select_params=rank_params,
+    ).order_by('search_rank', 'pk')
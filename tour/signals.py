@@ -0,0 +1,95 @@
+"""
+Signal handlers that keep derived tour data in sync with the catalog.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Category, Destination, RelatedTour, Tour
+from . import search
+from .facets import invalidate_facet_index
+from .similarity import queue_refresh
+
+logger = logging.getLogger(__name__)
+
+
+def _reindex(tour_ids):
+    """Re-index the given tours once the surrounding transaction commits."""
+    def update():
+        try:
+            tours = Tour.objects.filter(pk__in=tour_ids).select_related('destination')
+            search.index_tours(tours)
+        except Exception as e:
+            logger.error(f"Error updating the tour search index: {e}")
+    transaction.on_commit(update)
+
+
+def _refresh_related(tour_ids):
+    """
+    Queue the tours for the related-tours index; ``refresh_related_tours``
+    refreshes them, so the request does not.
+    """
+    try:
+        # A savepoint, so a failed INSERT does not break the caller's transaction
+        with transaction.atomic():
+            queue_refresh(tour_ids)
+    except Exception as e:
+        logger.error(f"Error queueing related tours refresh: {e}")
+
+
+@receiver(post_save, sender=Tour, dispatch_uid='tour.search.tour_saved')
+def tour_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # View count bumps and similar single-column updates don't touch the text
+    if update_fields and not set(update_fields) - {'view_count', 'updated_at'}:
+        return
+    _reindex([instance.pk])
+    _refresh_related([instance.pk])
+    transaction.on_commit(invalidate_facet_index)
+
+
+@receiver(pre_delete, sender=Tour, dispatch_uid='tour.similarity.tour_deleting')
+def tour_deleting(sender, instance, **kwargs):
+    # The rows pointing at this tour are cascaded away before post_delete
+    instance._related_referrers = list(
+        RelatedTour.objects.filter(related=instance).values_list('tour_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tour, dispatch_uid='tour.search.tour_deleted')
+def tour_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_facet_index)
+    # The tours that listed the deleted one need new neighbours
+    _refresh_related([instance.pk, *getattr(instance, '_related_referrers', ())])
+    try:
+        search.remove_tours([instance.pk])
+    except Exception as e:
+        logger.error(f"Error removing tour {instance.pk} from the search index: {e}")
+
+
+@receiver(post_save, sender=Destination, dispatch_uid='tour.search.destination_saved')
+def destination_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _reindex(list(instance.tours.values_list('pk', flat=True)))
+    transaction.on_commit(invalidate_facet_index)
+
+
+@receiver(post_save, sender=Category, dispatch_uid='tour.facets.category_saved')
+def category_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(invalidate_facet_index)
+
+
+@receiver(m2m_changed, sender=Tour.categories.through, dispatch_uid='tour.facets.tour_categories_changed')
+@receiver(m2m_changed, sender=Tour.activities.through, dispatch_uid='tour.facets.tour_activities_changed')
+def tour_facets_changed(sender, instance, action, reverse=False, pk_set=None, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidate_facet_index)
+        # Reverse changes (from the category/activity side) list the tours in pk_set
+        tour_ids = list(pk_set or []) if reverse else [instance.pk]
+        if tour_ids:
+            _refresh_related(tour_ids)
@@ -0,0 +1,274 @@
+"""
+Related-tours similarity index.
+
+Every pair of active tours is scored from the features they share:
+
+* same destination
+* cosine similarity of their categories
+* cosine similarity of their activities
+* same price band and same duration band (the facet buckets)
+
+Features are loaded once into a single NumPy matrix of one-hot encodings
+(destination, price band, duration band) and L2-normalised multi-hot
+encodings (categories, activities), each scaled by the square root of its
+weight, so the scores of a block of tours against all others are one matrix
+product. The encodings have few columns, so the matrix is kept dense (SciPy
+is not a dependency) and scores are computed in blocks of rows to bound
+memory.
+
+The best ``TOP_K`` neighbours of each tour are stored in ``RelatedTour`` so
+the detail page and the API read them with one indexed query. The table is
+rebuilt with ``python manage.py rebuild_related_tours`` and refreshed
+incrementally when a tour's attributes change: ``tour.signals`` queues the
+tour in ``RelatedTourRefresh`` and ``python manage.py refresh_related_tours``
+refreshes everything queued at once, so saving a tour and its categories
+and activities costs the request one INSERT per change instead of loading
+the feature matrix each time.
+"""
+import logging
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .facets import DURATION_BUCKETS, PRICE_BUCKETS, bucket_for
+
+logger = logging.getLogger(__name__)
+
+# Neighbours stored per tour
+TOP_K = 6
+
+# Rows scored per block; each block allocates BLOCK_SIZE x tours floats
+BLOCK_SIZE = 256
+
+# Queued tours refreshed together by process_queued_refreshes
+REFRESH_BATCH_SIZE = 1000
+
+DESTINATION_WEIGHT = 3.0
+CATEGORY_WEIGHT = 2.0
+ACTIVITY_WEIGHT = 1.0
+PRICE_BAND_WEIGHT = 1.0
+DURATION_BAND_WEIGHT = 1.0
+
+
+def _one_hot(values, weight):
+    """One-hot matrix of a single-valued feature, scaled so that ``X @ X.T`` is ``weight`` on a match."""
+    columns = {}
+    rows, cols = [], []
+    for i, value in enumerate(values):
+        if value is not None:
+            rows.append(i)
+            cols.append(columns.setdefault(value, len(columns)))
+    matrix = np.zeros((len(values), max(len(columns), 1)), dtype=np.float32)
+    matrix[rows, cols] = np.sqrt(weight)
+    return matrix
+
+
+def _multi_hot(links, position, size, weight):
+    """Row-normalised multi-hot matrix from ``(tour_id, value_id)`` pairs, scaled so
+    that ``X @ X.T`` is ``weight`` times the cosine similarity."""
+    columns = {}
+    rows, cols = [], []
+    for tour_id, value_id in links:
+        if tour_id in position:
+            rows.append(position[tour_id])
+            cols.append(columns.setdefault(value_id, len(columns)))
+    matrix = np.zeros((size, max(len(columns), 1)), dtype=np.float32)
+    matrix[rows, cols] = 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True) / np.sqrt(weight)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class SimilarityFeatures:
+    """
+    Weighted feature matrix of all active tours, one row per tour in ``tour_ids``.
+
+    The columns are the one-hot encodings of destination, price band and
+    duration band followed by the normalised category and activity
+    encodings, each scaled by the square root of its weight. The score of
+    two tours is then simply the dot product of their rows.
+    """
+
+    def __init__(self, tour_ids, matrix):
+        self.tour_ids = np.asarray(tour_ids, dtype=np.int64)
+        self.position = {pk: i for i, pk in enumerate(tour_ids)}
+        self.size = len(tour_ids)
+        self.matrix = matrix
+
+    @classmethod
+    def load(cls):
+        from .models import Tour
+
+        rows = list(
+            Tour.objects.filter(is_active=True)
+            .order_by('pk')
+            .values_list('pk', 'destination_id', 'price', 'duration_days')
+        )
+        tour_ids = [row[0] for row in rows]
+        position = {pk: i for i, pk in enumerate(tour_ids)}
+
+        categories = Tour.categories.through.objects.filter(
+            tour__is_active=True
+        ).values_list('tour_id', 'category_id')
+        activities = Tour.activities.through.objects.filter(
+            tour__is_active=True
+        ).values_list('tour_id', 'activity_id')
+
+        matrix = np.hstack([
+            _one_hot([row[1] for row in rows], DESTINATION_WEIGHT),
+            _one_hot([bucket_for(row[2], PRICE_BUCKETS) for row in rows], PRICE_BAND_WEIGHT),
+            _one_hot([bucket_for(row[3], DURATION_BUCKETS) for row in rows], DURATION_BAND_WEIGHT),
+            _multi_hot(categories, position, len(rows), CATEGORY_WEIGHT),
+            _multi_hot(activities, position, len(rows), ACTIVITY_WEIGHT),
+        ])
+        return cls(tour_ids, matrix)
+
+    def scores(self, rows):
+        """Score matrix of shape ``(len(rows), size)``; a tour never matches itself."""
+        rows = np.asarray(rows, dtype=np.int64)
+        result = self.matrix[rows] @ self.matrix.T
+        result[np.arange(len(rows)), rows] = 0
+        return result
+
+    def top_k(self, rows, k=TOP_K):
+        """Yield ``(tour_id, [(related_id, score), ...])`` for the given rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        for start in range(0, len(rows), BLOCK_SIZE):
+            block_rows = rows[start:start + BLOCK_SIZE]
+            scores = self.scores(block_rows)
+            kk = min(k, self.size)
+            if kk <= 0:
+                for row in block_rows:
+                    yield int(self.tour_ids[row]), []
+                continue
+            if kk < self.size:
+                candidates = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            else:
+                candidates = np.tile(np.arange(self.size), (len(block_rows), 1))
+            # Round away float32 noise so equal feature overlaps tie exactly
+            candidate_scores = np.round(np.take_along_axis(scores, candidates, axis=1), 4)
+            for i, row in enumerate(block_rows):
+                # Best score first, newer tours (higher ID) break ties
+                order = np.lexsort((-self.tour_ids[candidates[i]], -candidate_scores[i]))
+                neighbours = [
+                    (int(self.tour_ids[candidates[i][j]]), float(candidate_scores[i][j]))
+                    for j in order if candidate_scores[i][j] > 0
+                ]
+                yield int(self.tour_ids[row]), neighbours
+
+
+def _store(results, replace=True):
+    """Write the neighbours in ``results``, replacing the tours' old ones."""
+    from .models import RelatedTour
+
+    results = list(results)
+    if replace:
+        RelatedTour.objects.filter(tour_id__in=[tour_id for tour_id, _ in results]).delete()
+    RelatedTour.objects.bulk_create(
+        [
+            RelatedTour(tour_id=tour_id, related_id=related_id, rank=rank, score=score)
+            for tour_id, neighbours in results
+            for rank, (related_id, score) in enumerate(neighbours, start=1)
+        ],
+        batch_size=1000
+    )
+
+
+def rebuild_related_tours(k=TOP_K):
+    """Recompute the neighbours of every active tour. Returns the tour count."""
+    from .models import RelatedTour
+
+    features = SimilarityFeatures.load()
+    with transaction.atomic():
+        RelatedTour.objects.all().delete()
+        rows = np.arange(features.size)
+        for start in range(0, features.size, BLOCK_SIZE):
+            _store(features.top_k(rows[start:start + BLOCK_SIZE], k), replace=False)
+    return features.size
+
+
+def refresh_related_tours(tour_ids, referrers=(), k=TOP_K):
+    """
+    Update the index after the attributes of ``tour_ids`` changed.
+
+    Recomputes the neighbours of the changed tours and of every tour whose
+    list they are in, or could now enter because they beat its weakest
+    stored neighbour. ``referrers`` are extra tours to recompute, e.g. those
+    that pointed at a tour that has since been deleted.
+    """
+    from .models import RelatedTour
+
+    tour_ids = set(tour_ids)
+    features = SimilarityFeatures.load()
+    changed_rows = [features.position[pk] for pk in tour_ids if pk in features.position]
+
+    affected = set(referrers)
+    affected.update(
+        RelatedTour.objects.filter(related_id__in=tour_ids).values_list('tour_id', flat=True)
+    )
+
+    if changed_rows and features.size:
+        # Scores are symmetric: column j is how well each changed tour fits tour j
+        best = features.scores(changed_rows).max(axis=0)
+        count = np.zeros(features.size, dtype=np.int32)
+        weakest = np.zeros(features.size, dtype=np.float32)
+        stats = (
+            RelatedTour.objects.order_by().values('tour_id')
+            .annotate(n=Count('id'), low=Min('score'))
+        )
+        for row in stats:
+            i = features.position.get(row['tour_id'])
+            if i is not None:
+                count[i] = row['n']
+                weakest[i] = row['low']
+        candidates = (best > 0) & ((count < k) | (best > weakest))
+        affected.update(int(pk) for pk in features.tour_ids[candidates])
+
+    rows = set(changed_rows)
+    rows.update(features.position[pk] for pk in affected if pk in features.position)
+
+    with transaction.atomic():
+        # Tours that are gone or inactive keep no neighbours
+        RelatedTour.objects.filter(
+            tour_id__in=[pk for pk in tour_ids | affected if pk not in features.position]
+        ).delete()
+        _store(features.top_k(sorted(rows), k))
+    return len(rows)
+
+
+def queue_refresh(tour_ids):
+    """
+    Queue tours for ``process_queued_refreshes``. Call it in the transaction
+    that changes them, so the queue entries commit or roll back with it.
+    """
+    from .models import RelatedTourRefresh
+
+    RelatedTourRefresh.objects.bulk_create(
+        [RelatedTourRefresh(tour_id=pk) for pk in set(tour_ids)]
+    )
+
+
+def process_queued_refreshes(batch_size=REFRESH_BATCH_SIZE, k=TOP_K):
+    """
+    Refresh the related tours of everything queued, up to ``batch_size``
+    queue entries per ``refresh_related_tours`` call. Returns the number of
+    distinct tours refreshed.
+    """
+    from .models import RelatedTourRefresh
+
+    refreshed = 0
+    while True:
+        entries = list(
+            RelatedTourRefresh.objects.order_by('pk').values_list('pk', 'tour_id')[:batch_size]
+        )
+        if not entries:
+            return refreshed
+        tour_ids = {tour_id for _, tour_id in entries}
+        with transaction.atomic():
+            refresh_related_tours(tour_ids, k=k)
+            # Only the entries read above: a tour queued again meanwhile keeps its newer entry
+            RelatedTourRefresh.objects.filter(pk__in=[pk for pk, _ in entries]).delete()
+        refreshed += len(tour_ids)
+        if len(entries) < batch_size:
+            return refreshed
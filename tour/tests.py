@@ -0,0 +1,162 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import translation
+
+from core.currency_rates import rate_tables
+from core.schema import schema_registry
+from reviews.models import Review
+from users.models import WishlistItem
+from .facets import invalidate_facet_index
+from .models import Category, Destination, RelatedTour, Tour, TourDate, TourFAQ, TourItinerary
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TourDetailQueryTests(TestCase):
+    """
+    The detail page loads in a fixed number of queries (see ``tour.detail``),
+    however many reviews, dates, itinerary days and related tours there are.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        destination = Destination.objects.create(
+            name='Aswan', description='Nubia', cover_image='destinations/aswan.jpg',
+            country='Egypt', city='Aswan',
+        )
+        category = Category.objects.create(name='Cruises', description='Cruises')
+        tours = []
+        for number in range(5):
+            tour = Tour.objects.create(
+                name=f'Aswan Cruise {number}', description='Cruise', short_description='Cruise',
+                destination=destination, duration_days=4, duration_nights=3, price=250,
+                max_people=12, cover_image='tours/aswan.jpg',
+            )
+            tour.categories.add(category)
+            tours.append(tour)
+        cls.tour = tours[0]
+        RelatedTour.objects.bulk_create([
+            RelatedTour(tour=cls.tour, related=related, rank=rank, score=1.0 / rank)
+            for rank, related in enumerate(tours[1:], start=1)
+        ])
+        start = datetime.date.today() + datetime.timedelta(days=14)
+        for week in range(4):
+            TourDate.objects.create(
+                tour=cls.tour, start_date=start + datetime.timedelta(weeks=week),
+                end_date=start + datetime.timedelta(weeks=week, days=3), available_seats=8,
+            )
+        for day in range(1, 5):
+            TourItinerary.objects.create(tour=cls.tour, day=day, title=f'Day {day}', description='Sail')
+            TourFAQ.objects.create(tour=cls.tour, question=f'Question {day}?', answer='Yes', order=day)
+
+        User = get_user_model()
+        for number in range(8):
+            reviewer = User.objects.create_user(username=f'reviewer{number}', email=f'reviewer{number}@example.com')
+            Review.objects.create(tour=cls.tour, user=reviewer, rating=number % 5 + 1, comment='Lovely')
+        cls.user = User.objects.create_user(username='traveller', email='traveller@example.com')
+        Review.objects.create(tour=cls.tour, user=cls.user, rating=4, comment='Calm')
+        WishlistItem.objects.create(user=cls.user, tour=cls.tour)
+
+    def setUp(self):
+        # Loaded once per worker; load them here so the counts are per request
+        schema_registry.refresh()
+        rate_tables.load()
+        with translation.override('en'):
+            self.url = reverse('tour:tour_detail', args=[self.tour.slug])
+
+    def test_anonymous(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['related_tours']), 3)
+        self.assertEqual(len(response.context['reviews']), 5)
+        self.assertEqual(len(response.context['tour_dates']), 4)
+        self.assertFalse(response.context['user_reviewed'])
+
+    def test_authenticated(self):
+        self.client.force_login(self.user)
+        with self.assertNumQueries(8):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['user_reviewed'])
+        self.assertTrue(response.context['is_in_wishlist'])
+        self.assertEqual(response.context['total_reviews'], 9)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class FacetRestrictionTests(TestCase):
+    """
+    ``near`` and the availability window restrict the tours counted, but the
+    counts of a facet still ignore that facet's own selection.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        places = {
+            'cairo': (30.04, 31.24, 3),
+            'giza': (29.98, 31.13, 2),
+            'aswan': (24.09, 32.90, 1),
+        }
+        start = datetime.date.today() + datetime.timedelta(days=10)
+        for slug, (latitude, longitude, tours) in places.items():
+            destination = Destination.objects.create(
+                name=slug.title(), slug=slug, description=slug, cover_image=f'destinations/{slug}.jpg',
+                country='Egypt', city=slug.title(),
+            )
+            for number in range(tours):
+                tour = Tour.objects.create(
+                    name=f'{slug.title()} Tour {number}', description='Tour', short_description='Tour',
+                    destination=destination, duration_days=2, duration_nights=1, price=80, max_people=10,
+                    cover_image='tours/tour.jpg', latitude=latitude, longitude=longitude,
+                )
+                TourDate.objects.create(
+                    tour=tour, start_date=start, end_date=start + datetime.timedelta(days=1), available_seats=6,
+                )
+
+    def setUp(self):
+        schema_registry.refresh()
+        rate_tables.load()
+        # The signals invalidate it on commit, which never happens inside a TestCase
+        invalidate_facet_index()
+        with translation.override('en'):
+            self.list_url = reverse('tour:tour_list')
+
+    def destination_counts(self, query):
+        response = self.client.get(f'{self.list_url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.context['facets']['total'], response.context['facets']['facets']['destination']
+
+    def test_near_with_destination_selected(self):
+        near = 'near=30,31.2&radius_km=50'
+        self.assertEqual(self.destination_counts(near), (5, {'cairo': 3, 'giza': 2, 'aswan': 0}))
+        self.assertEqual(
+            self.destination_counts(f'{near}&destination=cairo'),
+            (3, {'cairo': 3, 'giza': 2, 'aswan': 0}),
+        )
+
+    def test_availability_with_destination_selected(self):
+        TourDate.objects.filter(tour__destination__slug='giza').update(available_seats=2)
+        window = f'date_from={datetime.date.today().isoformat()}&party_size=4'
+        self.assertEqual(
+            self.destination_counts(f'{window}&destination=cairo'),
+            (3, {'cairo': 3, 'giza': 0, 'aswan': 1}),
+        )
+        self.assertEqual(
+            self.destination_counts(f'{window}&destination=aswan'),
+            (1, {'cairo': 3, 'giza': 0, 'aswan': 1}),
+        )
+
+    def test_api_facets_apply_near_and_availability(self):
+        response = self.client.get(
+            '/api/tours/tours/facets/',
+            {'near': '30,31.2', 'radius_km': '50', 'party_size': '2', 'destination': 'giza'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 2)
+        self.assertEqual(response.json()['facets']['destination'], {'cairo': 3, 'giza': 2, 'aswan': 0})
+        listed = self.client.get(
+            '/api/tours/tours/', {'near': '30,31.2', 'radius_km': '50', 'party_size': '2', 'destination': 'giza'},
+        )
+        self.assertEqual(len(listed.json()['results']), 2)
@@ -4,21 +4,32 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 import json # Import json
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q, Avg, F, Count, Min, Max # Import Count, Min, Max
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import F, Min, Max # Import Min, Max
 from django.urls import reverse_lazy
-from users.models import WishlistItem # Import WishlistItem
+from core.pagination import EstimatedCountPaginator
+from core.schema import tables_ready
 
 from .models import (
     Destination, Category, Tour, Promotion
 )
 from reviews.models import Review
 from .forms import TourSearchForm
+from .search import find_tour_ids, search_tours
+from .facets import facet_counts, filter_queryset as filter_by_facets
+from .geo import filter_near, parse_near
+from .availability import filter_available, parse_availability, with_availability
+from .detail import TourDetailBundle, tour_detail_queryset
 from reviews.forms import ReviewForm # Import ReviewForm from reviews app
 
 # Constants
 TOURS_PER_PAGE = 9
 
+# Best rated first, served by the index on TourRatingSummary
+RATING_ORDERING = (
+    F('rating_summary__average_rating').desc(nulls_last=True),
+    F('rating_summary__review_count').desc(nulls_last=True),
+)
+
 
 class TourListView(ListView):
     """View to display all tours"""
@@ -26,18 +37,13 @@ class TourListView(ListView):
     template_name = 'tour/tour_list.html'
     context_object_name = 'tours'
     paginate_by = TOURS_PER_PAGE
+    paginator_class = EstimatedCountPaginator
 
     def get_queryset(self):
         """Check if the tour_tour table exists before querying"""
         try:
             # Check if the Tour table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
+            tour_table_exists = tables_ready(Tour)
 
             if not tour_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -49,27 +55,18 @@ class TourListView(ListView):
             # Apply filters if provided
             filters = {}
 
-            # Search filter
+            # Search filter - ranked full-text search across all languages
             search = self.request.GET.get('search')
+            self.search_ids = None
             if search:
-                queryset = queryset.filter(
-                    Q(name__icontains=search) |
-                    Q(description__icontains=search) |
-                    Q(short_description__icontains=search) |
-                    Q(destination__name__icontains=search) |
-                    Q(destination__country__icontains=search) |
-                    Q(destination__city__icontains=search)
-                )
-
-            # Destination filter
-            destination = self.request.GET.get('destination')
-            if destination:
-                filters['destination__slug'] = destination
-
-            # Category filter
-            category = self.request.GET.get('category')
-            if category:
-                filters['categories__slug'] = category
+                self.search_ids = find_tour_ids(search)
+                queryset = search_tours(queryset, search, tour_ids=self.search_ids)
+                if self.search_ids is None:
+                    # Index unavailable: remember the fallback matches for the facets
+                    self.search_ids = list(queryset.values_list('pk', flat=True))
+
+            # Facet filters - destination, category, activity, duration and price buckets
+            queryset = filter_by_facets(queryset, self.request.GET)
 
             # Price range filter
             min_price = self.request.GET.get('min_price')
@@ -93,21 +90,38 @@ class TourListView(ListView):
             if filters:
                 queryset = queryset.filter(**filters).distinct()
 
-            # Sorting
-            sort_by = self.request.GET.get('sort', 'created_at')
-            if sort_by == 'price_low':
+            # Proximity filter - near=lat,lng&radius_km=, annotates distance in km
+            near = parse_near(self.request.GET)
+            if near:
+                queryset = filter_near(queryset, *near)
+
+            # Availability filter - date_from, date_to and party_size
+            window = parse_availability(self.request.GET)
+            if window:
+                queryset = filter_available(queryset, **window)
+                # Tour cards show the first matching date
+                queryset = with_availability(queryset, **window)
+
+            # Sorting - search results default to relevance order, nearby tours to distance
+            default_sort = 'relevance' if search else 'distance' if near else 'created_at'
+            sort_by = self.request.GET.get('sort', default_sort)
+            if sort_by == 'relevance' and search:
+                pass
+            elif sort_by == 'distance' and near:
+                queryset = queryset.order_by('distance', 'pk')
+            elif sort_by == 'price_low':
                 queryset = queryset.order_by('price')
             elif sort_by == 'price_high':
                 queryset = queryset.order_by('-price')
             elif sort_by == 'name':
                 queryset = queryset.order_by('name')
             elif sort_by == 'popularity':
-                # Corrected related name for reviews
-                queryset = queryset.annotate(avg_rating=Avg('tour_reviews__rating')).order_by('-avg_rating')
+                queryset = queryset.order_by(*RATING_ORDERING)
             else:
                 queryset = queryset.order_by('-created_at')
 
-            return queryset
+            # Tour cards show each tour's categories and prices in its currency
+            return queryset.select_related('currency').prefetch_related('categories')
 
         except Exception as e:
             import logging
@@ -121,27 +135,11 @@ class TourListView(ListView):
         # Check if tables exist before querying
         try:
             # Check if the Destination table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_destination LIMIT 1")
-                    destination_table_exists = True
-                except Exception:
-                    destination_table_exists = False
-
-                # Check if the Category table exists
-                try:
-                    cursor.execute("SELECT 1 FROM tour_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
-
-                # Check if the Tour table exists
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
+            destination_table_exists = tables_ready(Destination)
+            # Check if the Category table exists
+            category_table_exists = tables_ready(Category)
+            # Check if the Tour table exists
+            tour_table_exists = tables_ready(Tour)
 
             # Only query if tables exist
             if destination_table_exists:
@@ -160,8 +158,12 @@ class TourListView(ListView):
             context['selected_min_price'] = self.request.GET.get('min_price', '0')
             context['selected_max_price'] = self.request.GET.get('max_price', '10000')
             context['selected_duration'] = self.request.GET.get('duration', '')
-            context['selected_sort'] = self.request.GET.get('sort', 'created_at')
             context['search_query'] = self.request.GET.get('search', '')
+            default_sort = 'relevance' if context['search_query'] else 'distance' if parse_near(self.request.GET) else 'created_at'
+            context['selected_sort'] = self.request.GET.get('sort', default_sort)
+
+            # Facet counts for the sidebar, computed in memory in a single pass
+            context['facets'] = facet_counts(self.request.GET, getattr(self, 'search_ids', None))
 
             # Get min and max price for the price range slider
             if tour_table_exists:
@@ -186,6 +188,7 @@ class TourListView(ListView):
             # Set default values
             context['destinations'] = []
             context['categories'] = []
+            context['facets'] = None
             context['selected_destination'] = ''
             context['selected_category'] = ''
             context['selected_min_price'] = '0'
@@ -209,13 +212,7 @@ class TourDetailView(DetailView):
         """Check if the tour_tour table exists before processing the request"""
         try:
             # Check if the Tour table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
+            tour_table_exists = tables_ready(Tour)
 
             if not tour_table_exists:
                 # Redirect to home page if the table doesn't exist
@@ -237,14 +234,13 @@ class TourDetailView(DetailView):
         self.object.increment_view_count()
         return response
 
+    def get_queryset(self):
+        return tour_detail_queryset(self.request.user)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        tour = self.get_object()
-
-        # Get related tours (same destination or categories)
-        related_tours = Tour.objects.filter(
-            Q(destination=tour.destination) | Q(categories__in=tour.categories.all())
-        ).exclude(id=tour.id).distinct()[:3]
+        # Reuse the object fetched by DetailView.get() instead of a second get_object()
+        bundle = TourDetailBundle(self.object, self.request.user, self.request.GET.get('page'))
 
         # Get participants from query parameters or set default to 1
         participants = self.request.GET.get('participants', '1')
@@ -258,106 +254,21 @@ class TourDetailView(DetailView):
         # Add participants to context
         context['participants'] = participants
 
-        # Get tour reviews - Show all reviews for now (remove is_approved filter temporarily)
-        reviews_list = tour.tour_reviews.all().order_by('-created_at')
-
-        # Paginate reviews
-        paginator = Paginator(reviews_list, 5)  # Show 5 reviews per page
-        page = self.request.GET.get('page')
-        try:
-            reviews = paginator.page(page)
-        except PageNotAnInteger:
-            # If page is not an integer, deliver first page
-            reviews = paginator.page(1)
-        except EmptyPage:
-            # If page is out of range, deliver last page of results
-            reviews = paginator.page(paginator.num_pages)
-
-        # Get tour dates
-        tour_dates = tour.dates.filter(is_active=True, available_seats__gt=0).order_by('start_date')
-
-        # Check if user has already reviewed this tour - Corrected related name
-        user_reviewed = False
-        # Check if the tour is in the user's wishlist
-        is_in_wishlist = False
-        if self.request.user.is_authenticated:
-            # Check if user has already reviewed this tour (regardless of approval status)
-            user_reviewed = tour.tour_reviews.filter(user=self.request.user).exists()
-            is_in_wishlist = WishlistItem.objects.filter(user=self.request.user, tour=tour).exists()
-
-            # If the user has a review, make sure it's approved
-            if user_reviewed:
-                # Approve the user's review if it exists but is not approved
-                user_review = tour.tour_reviews.filter(user=self.request.user).first()
-                if user_review and not user_review.is_approved:
-                    user_review.is_approved = True
-                    user_review.save()
-
         # Add to context
-        context['related_tours'] = related_tours
-        context['reviews'] = reviews
-        context['tour_dates'] = tour_dates
-        context['user_reviewed'] = user_reviewed
-        context['is_in_wishlist'] = is_in_wishlist # Add wishlist status to context
+        context['related_tours'] = bundle.related_tours
+        context['reviews'] = bundle.reviews
+        context['tour_dates'] = bundle.tour_dates
+        context['user_reviewed'] = bundle.user_reviewed
+        context['is_in_wishlist'] = bundle.is_in_wishlist # Add wishlist status to context
         context['review_form'] = ReviewForm() # Use ReviewForm from reviews.forms
 
-        # Calculate rating percentages and counts
-        # Check if reviews_list is a QuerySet or a list
-        if hasattr(reviews_list, 'count') and callable(reviews_list.count) and not isinstance(reviews_list, list):
-            # It's a QuerySet
-            total_reviews = reviews_list.count()
-            rating_counts_data = reviews_list.values('rating').annotate(count=Count('id')).order_by('-rating')
-        else:
-            # It's a list (sample reviews)
-            total_reviews = len(reviews_list)
-            # We can't use values() and annotate() on a list, so we'll count manually
-            rating_counts = {}
-            for review in reviews_list:
-                rating = review.rating
-                if rating not in rating_counts:
-                    rating_counts[rating] = 0
-                rating_counts[rating] += 1
-
-            # Convert to a format similar to what values().annotate() would return
-            rating_counts_data = [{'rating': rating, 'count': count} for rating, count in rating_counts.items()]
-            # Sort by rating in descending order
-            rating_counts_data = sorted(rating_counts_data, key=lambda x: x['rating'], reverse=True)
-
-        # Initialize dictionaries for all ratings (1-5)
-        rating_data = {i: (i, 0, 0) for i in range(1, 6)}  # (rating, percentage, count)
-
-        # Process review data
-        if total_reviews > 0:
-            for item in rating_counts_data:
-                rating = item['rating']
-                count = item['count']
-                percentage = round((count / total_reviews) * 100)
-                rating_data[rating] = (rating, percentage, count)
-
-        # Convert to list of tuples for easier template iteration [(5, perc, count), (4, perc, count), ...]
-        context['rating_percentages'] = sorted(rating_data.values(), key=lambda x: x[0], reverse=True)
-        context['total_reviews'] = total_reviews
-
-        # Add debug info
-        context['rating_data_debug'] = {
-            'total_reviews': total_reviews,
-            'rating_counts_data': list(rating_counts_data),
-            'rating_data': rating_data,
-        }
-
-        # Calculate average rating
-        context['avg_rating'] = tour.get_average_rating()
+        # Rating breakdown from the materialized summary (approved reviews only)
+        context['rating_percentages'] = bundle.rating_percentages
+        context['total_reviews'] = bundle.review_count
+        context['avg_rating'] = self.object.get_average_rating()
 
         # Prepare available dates for Flatpickr
-        available_dates_list = []
-        for date_obj in tour_dates:
-            available_dates_list.append({
-                'id': date_obj.id,
-                'date': date_obj.start_date.strftime('%Y-%m-%d'), # Format needed by flatpickr
-                'display': date_obj.start_date.strftime('%d %b %Y'), # Optional display format
-                'seats': date_obj.available_seats
-            })
-        context['available_dates_json'] = json.dumps(available_dates_list)
+        context['available_dates_json'] = json.dumps(bundle.available_dates())
 
         return context
 
@@ -373,13 +284,7 @@ class DestinationListView(ListView):
         """Check if the tour_destination table exists before querying"""
         try:
             # Check if the Destination table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_destination LIMIT 1")
-                    destination_table_exists = True
-                except Exception:
-                    destination_table_exists = False
+            destination_table_exists = tables_ready(Destination)
 
             if not destination_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -405,13 +310,7 @@ class DestinationDetailView(DetailView):
         """Check if the tour_destination table exists before processing the request"""
         try:
             # Check if the Destination table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_destination LIMIT 1")
-                    destination_table_exists = True
-                except Exception:
-                    destination_table_exists = False
+            destination_table_exists = tables_ready(Destination)
 
             if not destination_table_exists:
                 # Redirect to home page if the table doesn't exist
@@ -433,25 +332,14 @@ class DestinationDetailView(DetailView):
 
         try:
             # Check if the Tour table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
-
-                # Check if the Category table exists
-                try:
-                    cursor.execute("SELECT 1 FROM tour_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
+            tour_table_exists = tables_ready(Tour)
+            # Check if the Category table exists
+            category_table_exists = tables_ready(Category)
 
             # Only query if tables exist
             if tour_table_exists:
                 # Get tours for this destination
-                tours = destination.tours.filter(is_active=True)
+                tours = destination.tours.filter(is_active=True).select_related('rating_summary')
                 context['tours'] = tours
             else:
                 context['tours'] = []
@@ -485,13 +373,7 @@ class CategoryListView(ListView):
         """Check if the tour_category table exists before querying"""
         try:
             # Check if the Category table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
+            category_table_exists = tables_ready(Category)
 
             if not category_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -517,13 +399,7 @@ class CategoryDetailView(DetailView):
         """Check if the tour_category table exists before processing the request"""
         try:
             # Check if the Category table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_category LIMIT 1")
-                    category_table_exists = True
-                except Exception:
-                    category_table_exists = False
+            category_table_exists = tables_ready(Category)
 
             if not category_table_exists:
                 # Redirect to home page if the table doesn't exist
@@ -545,20 +421,9 @@ class CategoryDetailView(DetailView):
 
         try:
             # Check if the Tour table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
-
-                # Check if the Destination table exists
-                try:
-                    cursor.execute("SELECT 1 FROM tour_destination LIMIT 1")
-                    destination_table_exists = True
-                except Exception:
-                    destination_table_exists = False
+            tour_table_exists = tables_ready(Tour)
+            # Check if the Destination table exists
+            destination_table_exists = tables_ready(Destination)
 
             # Only query if tables exist
             if tour_table_exists:
@@ -599,13 +464,7 @@ class TourSearchView(ListView):
         """Check if the tour_tour table exists before querying"""
         try:
             # Check if the Tour table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
+            tour_table_exists = tables_ready(Tour)
 
             if not tour_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -617,16 +476,9 @@ class TourSearchView(ListView):
             # Get the keyword from the request
             keyword = self.request.GET.get('keyword', '')
 
-            # If keyword exists, filter the queryset
+            # If keyword exists, filter the queryset by relevance
             if keyword:
-                queryset = queryset.filter(
-                    Q(name__icontains=keyword) |
-                    Q(description__icontains=keyword) |
-                    Q(short_description__icontains=keyword) |
-                    Q(destination__name__icontains=keyword) |
-                    Q(destination__country__icontains=keyword) |
-                    Q(destination__city__icontains=keyword)
-                )
+                queryset = search_tours(queryset, keyword)
 
             return queryset
 
@@ -690,8 +542,7 @@ class TourFilterView(TemplateView):
         elif sort_by == 'name':
             tours = tours.order_by('name')
         elif sort_by == 'popularity':
-            # Corrected related name for reviews
-            tours = tours.annotate(avg_rating=Avg('tour_reviews__rating')).order_by('-avg_rating')
+            tours = tours.order_by(*RATING_ORDERING)
         else:
             tours = tours.order_by('-created_at')
 
@@ -710,13 +561,7 @@ class FeaturedToursView(ListView):
         """Check if the tour_tour table exists before querying"""
         try:
             # Check if the Tour table exists
-            from django.db import connection
-            with connection.cursor() as cursor:
-                try:
-                    cursor.execute("SELECT 1 FROM tour_tour LIMIT 1")
-                    tour_table_exists = True
-                except Exception:
-                    tour_table_exists = False
+            tour_table_exists = tables_ready(Tour)
 
             if not tour_table_exists:
                 # Return an empty queryset if the table doesn't exist
@@ -1,5 +1,7 @@
 import os
 import secrets
+import sys
+import tempfile
 from pathlib import Path
 
 # Django imports
@@ -133,6 +135,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request latency histograms (first, so they include the other middleware)
+    'core.middleware.metrics.RequestMetricsMiddleware',
+    # Per-request SQL statistics and N+1 detection (early, to see every query)
+    'core.middleware.querystats.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     # Session middleware must come before CSRF middleware
@@ -154,12 +160,13 @@ MIDDLEWARE = [
     'core.middleware.csrf_middleware.CSRFFixMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    # Rate limits shared by all workers (after authentication for per-user policies)
+    'core.middleware.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # Performance middleware removed
     # API performance middleware - temporarily disabled for initial deployment
     # 'core.middleware.APIPerformanceMiddleware',
-    # 'core.middleware.APIRequestThrottleMiddleware',
     # 'core.middleware.APIResponseCompressionMiddleware',
     # Login speedup middleware
     # 'core.middleware.LoginSpeedupMiddleware',
@@ -167,6 +174,8 @@ MIDDLEWARE = [
     # 'analytics.middleware.AnalyticsMiddleware',
     # Error handling middleware
     # 'core.middleware.SocialAccountErrorMiddleware',
+    # On-demand profiling of the view (last, so it wraps only the view)
+    'core.middleware.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'tourism_project.urls'
@@ -202,6 +211,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            # Wait for the write lock instead of failing under concurrent checkouts
+            'timeout': 20,
+        },
     }
 }
 
@@ -404,11 +417,31 @@ AVAILABLE_CURRENCIES = {
     'CHF': {'symbol': 'CHF', 'name': 'Swiss Franc'},
     'EGP': {'symbol': 'E£', 'name': 'Egyptian Pound'},
 }
+# Seconds a worker serves its exchange-rate snapshot before checking whether
+# the Currency table changed in another process (see core.currency_rates)
+CURRENCY_RATES_CHECK_INTERVAL = 30
 
 # PayPal settings for local development
 PAYPAL_MODE = 'sandbox'  # Always use sandbox for local development
 PAYPAL_CLIENT_ID = ''  # Add your sandbox client ID here for testing
 PAYPAL_SECRET = ''  # Add your sandbox secret here for testing
+# API host override, e.g. a local stand-in server; empty uses the PAYPAL_MODE host
+PAYPAL_API_BASE_URL = config('PAYPAL_API_BASE_URL', default='')
+
+# Gateway connections (see payments.paypal): pooled keep-alive connections per
+# worker, retries of connection errors and 429/5xx, and timeouts in seconds
+PAYPAL_POOL_SIZE = 10
+PAYPAL_MAX_RETRIES = 2
+PAYPAL_CONNECT_TIMEOUT = 5
+PAYPAL_READ_TIMEOUT = 30
+# Seconds before expiry at which the shared OAuth token is refreshed
+PAYPAL_TOKEN_REFRESH_MARGIN = 5 * 60
+
+# Queued gateway webhooks (see payments.webhooks): events applied per batch,
+# batches an event waits for its payment, and seconds between worker runs
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_PROCESS_INTERVAL = 2
 
 # Use SITE_URL for building PayPal URLs
 PAYPAL_RETURN_URL = f"{SITE_URL}/en/payments/confirm/"
@@ -417,7 +450,8 @@ PAYPAL_CANCEL_URL = f"{SITE_URL}/en/payments/cancel/"
 # Enable test mode for offline development
 # When True, PayPal integration will use fake responses instead of making real API calls
 # This is useful for development without internet connection or when PayPal sandbox is down
-PAYPAL_TEST_MODE = True  # Always use test mode for local development
+# Set it to False with PAYPAL_API_BASE_URL to use `manage.py fake_paypal_server` instead
+PAYPAL_TEST_MODE = config('PAYPAL_TEST_MODE', default=True, cast=bool)
 
 # Celery settings
 # In production, use environment variables for broker URL
@@ -460,21 +494,123 @@ if DEBUG:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-        }
+        },
+        # Responses cached by the tour API views (cache_page(cache='api'))
+        'api': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        },
     }
 else:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
             'LOCATION': 'unique-snowflake',
-        }
+        },
+        'api': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'api',
+        },
+    }
+
+# State every worker must agree on (rate limit counters, the PayPal access
+# token, the facet index version) lives in the 'shared' cache, so in production
+# point SHARED_CACHE_URL at Redis (e.g. redis://localhost:6379/1). Without it the
+# cache falls back to per-process memory and each worker keeps its own copy:
+# its own rate limits, its own PayPal token, and facet indexes that only notice
+# other workers' tour changes after FACET_INDEX_TTL. RATELIMIT_CACHE_URL is still
+# read for existing deployments.
+SHARED_CACHE_URL = config('SHARED_CACHE_URL', default=config('RATELIMIT_CACHE_URL', default=''))
+if SHARED_CACHE_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SHARED_CACHE_URL,
     }
+else:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    }
+SHARED_CACHE_ALIAS = 'shared'
+RATELIMIT_CACHE_ALIAS = SHARED_CACHE_ALIAS
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+# Proxies in front of the app that append to X-Forwarded-For (1 behind a single
+# load balancer). With 0, clients are told apart by REMOTE_ADDR and the header,
+# which clients can set to anything, is ignored.
+RATELIMIT_TRUSTED_PROXIES = config('RATELIMIT_TRUSTED_PROXIES', default=0, cast=int)
+# Limits per route (path regex, optionally methods) and per client IP or
+# signed-in user; a request is counted against every policy it matches
+RATELIMIT_POLICIES = [
+    {'name': 'api', 'path': r'^/api/', 'rate': '60/m', 'key': 'ip'},
+    {'name': 'login', 'path': r'^/[\w-]+/accounts/(login|signup|password/reset)/$', 'methods': ['POST'],
+     'rate': '10/m', 'key': 'ip'},
+    {'name': 'booking', 'path': r'^/[\w-]+/bookings/', 'methods': ['POST'], 'rate': '30/m', 'key': 'user',
+     'exempt_staff': True},
+]
 
 # Cache middleware
 CACHE_MIDDLEWARE_ALIAS = 'default'
 CACHE_MIDDLEWARE_SECONDS = 600
 CACHE_MIDDLEWARE_KEY_PREFIX = 'tourism'
 
+# Seconds between bulk flushes of buffered view counters (see core.counters)
+VIEW_COUNTER_FLUSH_INTERVAL = 10
+
+# Seconds between refreshes of the related tours queued by tour.signals
+# (python manage.py refresh_related_tours --loop, see tour.similarity)
+RELATED_TOURS_REFRESH_INTERVAL = 10
+
+# Buffered site visits (see analytics.buffer): visits kept in memory per worker
+# before new ones are dropped, and a flush every N visits or T milliseconds
+ANALYTICS_BUFFER_SIZE = 10000
+ANALYTICS_FLUSH_SIZE = 500
+ANALYTICS_FLUSH_INTERVAL = 1000
+# No background flusher under manage.py test: it would write outside the test
+# transactions. Tests write the visits with analytics.buffer.flush_visits()
+ANALYTICS_BUFFER_AUTOFLUSH = sys.argv[1:2] != ['test']
+
+# Analytics rollup tables (see analytics.rollups): seconds between updates, and
+# how long changed rows are re-read to catch transactions that committed late
+ANALYTICS_ROLLUP_INTERVAL = 300
+ANALYTICS_ROLLUP_OVERLAP = 60
+# Rows read per query by the streaming CSV/XLSX exports (see analytics.exports)
+ANALYTICS_EXPORT_CHUNK_SIZE = 2000
+
+# Seconds a new booking holds its seats before payment (see booking.inventory)
+SEAT_HOLD_TTL = 60 * 15
+# Seconds between runs of the expired-hold sweeper
+SEAT_HOLD_SWEEP_INTERVAL = 60
+
+# Booking reference numbers each worker reserves at a time (see booking.references)
+BOOKING_REFERENCE_BLOCK_SIZE = 20
+
+# Seconds a stored Idempotency-Key response is replayed (see core.idempotency)
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+# Seconds after which a request that never finished no longer blocks its key
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Request latency histograms (see core.metrics): where each worker writes its
+# totals, seconds between writes, when a request is also logged as slow, and
+# a bearer token letting a Prometheus scraper read /metrics without signing in
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'tourism-metrics'))
+METRICS_FLUSH_INTERVAL = 5
+METRICS_SLOW_REQUEST_SECONDS = 2.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Per-request SQL statistics (see core.querystats): share of requests
+# instrumented, executions of one SELECT in a request that flag a suspected
+# N+1 query, and queries per request that get a request logged regardless
+QUERY_STATS_SAMPLE_RATE = float(os.environ.get('QUERY_STATS_SAMPLE_RATE', '1.0'))
+QUERY_STATS_N_PLUS_ONE_THRESHOLD = 5
+QUERY_STATS_LOG_THRESHOLD = 50
+
+# On-demand profiling (see core.profiling): where captures are kept and how
+# many, profile about 1 in N requests (0 = only on request), and how long a
+# token from `manage.py profile_token` stays valid
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'tourism-profiles'))
+PROFILING_MAX_CAPTURES = 100
+PROFILING_SAMPLE_EVERY = int(os.environ.get('PROFILING_SAMPLE_EVERY', '0'))
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
 # Logging for local development
 LOGGING = {
     'version': 1,
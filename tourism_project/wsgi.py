@@ -4,3 +4,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tourism_project.settings')
 
 application = get_wsgi_application()
+
+# Load the table readiness registry once per worker rather than on first request
+from core.schema import schema_registry  # noqa: E402
+schema_registry.refresh()
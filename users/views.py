@@ -12,6 +12,7 @@ from booking.models import Booking
 from payments.models import Payment
 from reviews.models import Review
 from core.models import Notification
+from core.pagination import EstimatedCountPaginator
 from tour.models import Tour
 from .models import WishlistItem
 from django.contrib.auth.decorators import login_required
@@ -168,6 +169,7 @@ class UserBookingListView(LoginRequiredMixin, ListView):
     template_name = 'users/booking_list.html'
     context_object_name = 'bookings'
     paginate_by = 10
+    paginator_class = EstimatedCountPaginator
 
     def get_queryset(self):
         return Booking.objects.filter(user=self.request.user).order_by('-created_at')
@@ -262,7 +264,9 @@ class UserWishlistView(LoginRequiredMixin, ListView):
     context_object_name = 'wishlist_items'
 
     def get_queryset(self):
-        return WishlistItem.objects.filter(user=self.request.user)
+        return WishlistItem.objects.filter(user=self.request.user).select_related(
+            'tour__destination', 'tour__rating_summary'
+        )
 
 
 def user_dashboard(request):
@@ -0,0 +1,20 @@
+#!/bin/bash
+
+# Background workers, one loop each. Every deployment runs them next to the
+# web server: start.sh and the Docker image start them alongside gunicorn,
+# docker-compose and render.yaml run them as a worker service of their own.
+# The loops retry after errors, so they can start before the migrations ran.
+
+# Release expired seat holds
+python manage.py release_expired_holds --loop &
+
+# Apply queued payment webhooks
+python manage.py process_webhook_events --loop &
+
+# Keep the analytics rollup tables current
+python manage.py update_analytics_rollups --loop &
+
+# Refresh the related tours of changed tours
+python manage.py refresh_related_tours --loop &
+
+wait